@@ -0,0 +1,107 @@
+"""
+Compares the time it takes to judge exercises using a new pytest process per judgment
+with the time it takes using the pool of warm pytest workers and with batch judging.
+
+    python -m benchmarks.judging --exercises 20 --batch-size 10
+"""
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import click
+from rich.console import Console
+from rich.table import Table
+
+from progtool import settings
+from progtool.judging.judgment import Judgment
+from progtool.judging.pytest import PytestJudge
+from progtool.judging.runner import PoolRunner, PytestRunner, SubprocessRunner
+
+
+def generate_exercises(root: Path, count: int) -> list[Path]:
+    """
+    Generates count directories containing a tests.py, every third of which fails.
+    """
+    directories = []
+    for index in range(count):
+        directory = root / f'exercise-{index}'
+        directory.mkdir(parents=True)
+        expected = 'False' if index % 3 == 0 else 'True'
+        (directory / 'tests.py').write_text(
+            'import pytest\n'
+            '\n'
+            '@pytest.mark.parametrize("value", range(5))\n'
+            'def test_value(value):\n'
+            f'    assert {expected}\n'
+        )
+        directories.append(directory)
+    return directories
+
+
+async def judge_all(runner: PytestRunner, directories: list[Path], concurrency: int) -> tuple[float, list[int]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def judge(directory: Path) -> int:
+        async with semaphore:
+            result = await runner.run(directory, ['-x', 'tests.py'])
+            return result.exit_code
+
+    start = time.perf_counter()
+    exit_codes = await asyncio.gather(*(judge(directory) for directory in directories))
+    return (time.perf_counter() - start, exit_codes)
+
+
+async def judge_in_batches(directories: list[Path], concurrency: int, batch_size: int) -> tuple[float, list[Judgment]]:
+    semaphore = asyncio.Semaphore(concurrency)
+    judges = [PytestJudge(directory / 'tests.py') for directory in directories]
+    batches = [judges[index:index + batch_size] for index in range(0, len(judges), batch_size)]
+
+    async def judge(batch: list[PytestJudge]) -> list[Judgment]:
+        async with semaphore:
+            return await PytestJudge.judge_batch(batch)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(judge(batch) for batch in batches))
+    return (time.perf_counter() - start, [result for batch_results in results for result in batch_results])
+
+
+async def compare(directories: list[Path], concurrency: int, batch_size: int) -> Table:
+    table = Table(title=f'Judging {len(directories)} exercises, {concurrency} at a time')
+    table.add_column('Runner')
+    table.add_column('Total', justify='right')
+    table.add_column('Per judgment', justify='right')
+
+    subprocess_time, subprocess_exit_codes = await judge_all(SubprocessRunner(), directories, concurrency)
+    table.add_row('subprocess', f'{subprocess_time * 1000:.0f} ms', f'{subprocess_time / len(directories) * 1000:.0f} ms')
+
+    pool = PoolRunner(concurrency)
+    # Warm up the pool so that worker startup is not measured
+    await judge_all(pool, directories[:concurrency], concurrency)
+    pool_time, pool_exit_codes = await judge_all(pool, directories, concurrency)
+    await pool.stop()
+    table.add_row('pool', f'{pool_time * 1000:.0f} ms', f'{pool_time / len(directories) * 1000:.0f} ms')
+
+    assert subprocess_exit_codes == pool_exit_codes, 'Runners disagree on judgments'
+
+    batch_time, batch_results = await judge_in_batches(directories, concurrency, batch_size)
+    table.add_row(f'subprocess, batches of {batch_size}', f'{batch_time * 1000:.0f} ms', f'{batch_time / len(directories) * 1000:.0f} ms')
+    expected = [Judgment.PASS if exit_code == 0 else Judgment.FAIL for exit_code in subprocess_exit_codes]
+    assert batch_results == expected, 'Batch judging disagrees on judgments'
+    return table
+
+
+@click.command()
+@click.option('--exercises', default=20, help='Number of exercises to judge')
+@click.option('--concurrency', default=1, help='Number of exercises (or batches) judged simultaneously')
+@click.option('--batch-size', default=10, help='Number of exercises per batch')
+def benchmark(exercises: int, concurrency: int, batch_size: int) -> None:
+    settings._settings = settings.create_default_settings()
+    with tempfile.TemporaryDirectory() as directory:
+        directories = generate_exercises(Path(directory), exercises)
+        table = asyncio.run(compare(directories, concurrency, batch_size))
+        Console().print(table)
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,73 @@
+"""
+Compares eager and lazy loading of a large synthetic course: how long it takes until a single exercise can be served,
+and how long the server's background initialization (caching, judging, events), which needs every exercise, takes on top.
+
+    python -m benchmarks.lazy_loading --chapters 50 --exercises 40
+"""
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import click
+from rich.console import Console
+from rich.table import Table
+
+from benchmarks.synthetic import generate_course
+from progtool import settings
+from progtool.content.metadata import load_everything, load_metadata
+from progtool.content.tree import ContentNode, build_lazy_tree, build_tree
+from progtool.content.treepath import TreePath
+
+
+def measure(load: Callable[[], ContentNode], repetitions: int) -> tuple[float, float]:
+    """
+    Returns the best times until the first exercise was found and until all exercises were enumerated.
+    """
+    best_first, best_all = float('inf'), float('inf')
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        root = load()
+        root.descend(TreePath.parse('chapter-0/exercise-0'))
+        first = time.perf_counter() - start
+        # What initializing the caching service and the event logs does
+        list(root.exercises)
+        best_first = min(best_first, first)
+        best_all = min(best_all, time.perf_counter() - start)
+    return best_first, best_all
+
+
+@click.command()
+@click.option('--chapters', default=50, help='Number of chapters')
+@click.option('--exercises', default=40, help='Number of exercises per chapter')
+@click.option('--repetitions', default=3, help='Number of times each measurement is repeated; the best time is reported')
+def benchmark(chapters: int, exercises: int, repetitions: int) -> None:
+    settings._settings = settings.create_default_settings()
+
+    with tempfile.TemporaryDirectory() as directory:
+        root_path = Path(directory) / 'exercises'
+        generate_course(root_path, chapter_count=chapters, exercise_count=exercises)
+        link_predicate = load_everything(force_all=True)
+
+        def load_eagerly() -> ContentNode:
+            metadata = load_metadata(root_path, link_predicate=link_predicate)
+            assert metadata is not None
+            return build_tree(metadata)
+
+        def load_lazily() -> ContentNode:
+            root = build_lazy_tree(root_path, link_predicate=link_predicate)
+            assert root is not None
+            return root
+
+        table = Table(title=f'{chapters} chapters x {exercises} exercises')
+        table.add_column('Mode')
+        table.add_column('First exercise (ms)', justify='right')
+        table.add_column('All exercises (ms)', justify='right')
+        for name, load in [('eager', load_eagerly), ('lazy', load_lazily)]:
+            first, everything = measure(load, repetitions)
+            table.add_row(name, f'{first * 1000:.1f}', f'{everything * 1000:.1f}')
+        Console().print(table)
+
+
+if __name__ == '__main__':
+    benchmark()
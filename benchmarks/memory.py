@@ -0,0 +1,46 @@
+"""
+Measures how much memory the content tree takes per node for a large synthetic course.
+
+    python -m benchmarks.memory --chapters 100 --exercises 99
+"""
+import gc
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import click
+
+from benchmarks.synthetic import generate_course
+from progtool import settings
+from progtool.content.metadata import load_everything, load_metadata
+from progtool.content.tree import build_tree
+
+
+@click.command()
+@click.option('--chapters', default=100, help='Number of chapters')
+@click.option('--exercises', default=99, help='Number of exercises per chapter')
+def benchmark(chapters: int, exercises: int) -> None:
+    settings._settings = settings.create_default_settings()
+
+    with tempfile.TemporaryDirectory() as directory:
+        root = Path(directory) / 'exercises'
+        generate_course(root, chapter_count=chapters, exercise_count=exercises)
+        metadata = load_metadata(root, link_predicate=load_everything(force_all=True))
+        assert metadata is not None
+
+        gc.collect()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        tree = build_tree(metadata)
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        node_count = sum(1 for _ in tree.preorder_traversal())
+        print(f'Nodes: {node_count}')
+        print(f'Total: {(after - before) / 1024:.0f} KiB')
+        print(f'Per node: {(after - before) / node_count:.0f} bytes')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,73 @@
+"""
+Compares the time it takes to load the metadata of a large synthetic course in the different loading modes,
+and breaks down where the time of a cold load goes.
+
+    python -m benchmarks.metadata_loading --chapters 50 --exercises 40
+"""
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import click
+from rich.console import Console
+from rich.table import Table
+
+import yaml
+
+from benchmarks.synthetic import generate_course
+from progtool.content.metadata import (ExerciseMetadata, MetadataSnapshot,
+                                       load_everything, load_metadata)
+
+
+def measure(function: Callable[[], object], repetitions: int) -> float:
+    best = float('inf')
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@click.command()
+@click.option('--chapters', default=50, help='Number of chapters')
+@click.option('--exercises', default=40, help='Number of exercises per chapter')
+@click.option('--repetitions', default=3, help='Number of times each measurement is repeated; the best time is reported')
+def benchmark(chapters: int, exercises: int, repetitions: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        root = Path(directory) / 'exercises'
+        generate_course(root, chapter_count=chapters, exercise_count=exercises)
+        link_predicate = load_everything(force_all=True)
+
+        snapshot_path = Path(directory) / 'snapshot.pickle'
+        load_metadata(root, link_predicate=link_predicate, snapshot=MetadataSnapshot(snapshot_path))
+
+        contents = [path.read_bytes() for path in root.glob('**/metadata.yaml')]
+        exercise_data = [
+            {**data, 'path': root}
+            for data in (yaml.safe_load(file_contents) for file_contents in contents)
+            if data['type'] == 'exercise'
+        ]
+
+        measurements = {
+            'serial': lambda: load_metadata(root, link_predicate=link_predicate),
+            'parallel': lambda: load_metadata(root, link_predicate=link_predicate, mode='parallel'),
+            'warm snapshot': lambda: load_metadata(root, link_predicate=link_predicate, snapshot=MetadataSnapshot(snapshot_path)),
+            'YAML only, pure Python loader': lambda: [yaml.load(file_contents, Loader=yaml.SafeLoader) for file_contents in contents],
+            'exercises only, model_validate': lambda: [ExerciseMetadata.model_validate(data) for data in exercise_data],
+            'exercises only, model_construct': lambda: [ExerciseMetadata.model_construct(**data) for data in exercise_data],
+        }
+
+        if hasattr(yaml, 'CSafeLoader'):
+            measurements['YAML only, libyaml loader'] = lambda: [yaml.load(file_contents, Loader=yaml.CSafeLoader) for file_contents in contents]
+
+        table = Table(title=f'{chapters} chapters x {exercises} exercises')
+        table.add_column('Mode')
+        table.add_column('Time (ms)', justify='right')
+        for name, function in measurements.items():
+            table.add_row(name, f'{measure(function, repetitions) * 1000:.1f}')
+        Console().print(table)
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,59 @@
+from pathlib import Path
+
+import yaml
+
+
+def write_metadata(directory: Path, data: dict) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    with (directory / 'metadata.yaml').open('w') as file:
+        yaml.dump(data, file)
+
+
+def generate_course(root: Path, *, chapter_count: int, exercise_count: int) -> None:
+    """
+    Generates a course with chapter_count chapters, each containing exercise_count exercises and one explanation.
+    Every chapter and every exercise lives in its own directory and is linked to from its parent.
+    """
+    write_metadata(root, {
+        'type': 'section',
+        'id': 'root',
+        'name': 'Root',
+        'contents': [
+            {'type': 'link', 'location': f'chapter-{chapter_index}'}
+            for chapter_index in range(chapter_count)
+        ]
+    })
+    for chapter_index in range(chapter_count):
+        chapter_path = root / f'chapter-{chapter_index}'
+        write_metadata(chapter_path, {
+            'type': 'section',
+            'id': f'chapter-{chapter_index}',
+            'name': f'Chapter {chapter_index}',
+            'contents': [
+                {
+                    'type': 'explanation',
+                    'id': 'introduction',
+                    'name': 'Introduction',
+                    'documentation': {'en': 'introduction.md'},
+                    'topics': {'introduces': [f'topic-{chapter_index}']},
+                },
+                *(
+                    {'type': 'link', 'location': f'exercise-{exercise_index}'}
+                    for exercise_index in range(exercise_count)
+                ),
+            ]
+        })
+        (chapter_path / 'introduction.md').write_text(f'# Chapter {chapter_index}\n')
+        for exercise_index in range(exercise_count):
+            exercise_path = chapter_path / f'exercise-{exercise_index}'
+            write_metadata(exercise_path, {
+                'type': 'exercise',
+                'id': f'exercise-{exercise_index}',
+                'name': f'Exercise {chapter_index}.{exercise_index}',
+                'difficulty': 1 + exercise_index % 5,
+                'documentation': {'en': 'assignment.md'},
+                'judge': {'type': 'pytest', 'file': 'tests.py'},
+                'topics': {'must_come_after': [f'topic-{chapter_index}']},
+            })
+            (exercise_path / 'assignment.md').write_text(f'# Exercise {chapter_index}.{exercise_index}\n')
+            (exercise_path / 'tests.py').write_text('def test_nothing():\n    pass\n')
@@ -1,7 +1,9 @@
+from .bundle import bundle
 from .cache import cache
 from .check import check
 from .html import html
 from .index import index
+from .judge import judge
 from .relocate import relocate
 from .server import server
 from .settings import settings
@@ -0,0 +1,29 @@
+import sys
+from pathlib import Path
+from typing import Optional
+
+import click
+
+from progtool import constants, settings
+from progtool.cli.util import needs_settings
+from progtool.content.bundle import write_bundle
+from progtool.content.metadata import load_everything, load_repository_metadata
+
+
+@click.command()
+@click.option('-o', '--output', 'output_path', default=None, help='Where to write the bundle (defaults to bundle path in settings)')
+def bundle(output_path: Optional[str]) -> None:
+    """
+    Compiles all content into a single file the server can start from
+    """
+    needs_settings() # type: ignore[call-arg]
+
+    metadata = load_repository_metadata(link_predicate=load_everything(force_all=True))
+
+    if metadata is None:
+        print("Unable to load course material")
+        sys.exit(constants.ERROR_CODE_FAILED_TO_LOAD_METADATA)
+
+    path = Path(output_path).absolute() if output_path else settings.bundle_path()
+    write_bundle(metadata, settings.repository_exercise_root(), path)
+    print(f'Bundle written to {path}')
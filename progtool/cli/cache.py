@@ -1,6 +1,11 @@
+import datetime
+
 import click
+from rich.console import Console
+from rich.table import Table
+
 from progtool.cli.util import needs_settings
-import progtool.settings as settings
+from progtool.judging.judgmentstore import create_judgment_store
 
 
 @click.group()
@@ -17,8 +22,9 @@ def clear() -> None:
     Clears the judgment cache
     """
     needs_settings()  # type: ignore[call-arg]
-    path = settings.judgment_cache()
-    path.unlink()
+    store = create_judgment_store()
+    store.clear()
+    store.close()
 
 
 @cache.command
@@ -27,5 +33,48 @@ def path() -> None:
     Prints path of judgment cache
     """
     needs_settings()  # type: ignore[call-arg]
-    path = settings.judgment_cache()
-    print(path)
+    store = create_judgment_store()
+    print(store.path)
+    store.close()
+
+
+@cache.command()
+@click.argument('prefix', default='')
+@click.option('--judgment', type=click.Choice(['PASS', 'FAIL', 'TIMEOUT'], case_sensitive=False), help='Show only exercises with this judgment')
+def show(prefix: str, judgment: str) -> None:
+    """
+    Lists cached judgments of exercises whose tree path starts with PREFIX
+    """
+    needs_settings()  # type: ignore[call-arg]
+    store = create_judgment_store()
+    data = store.load()
+    store.close()
+
+    table = Table()
+    table.add_column('Exercise')
+    table.add_column('Judgment')
+    table.add_column('Verified')
+    table.add_column('Fingerprint')
+    for tree_path, entry in sorted(data.entries.items()):
+        if tree_path.startswith(prefix) and (judgment is None or entry.judgment == judgment.upper()):
+            table.add_row(tree_path, entry.judgment, 'yes' if entry.verified else 'no', (entry.fingerprint or '')[:12])
+    Console().print(table)
+
+
+@cache.command()
+@click.argument('tree_path')
+def history(tree_path: str) -> None:
+    """
+    Lists the judgments an exercise has received over time
+    """
+    needs_settings()  # type: ignore[call-arg]
+    store = create_judgment_store()
+    entries = store.history(tree_path)
+    store.close()
+
+    table = Table(title=tree_path)
+    table.add_column('Time')
+    table.add_column('Judgment')
+    for entry in entries:
+        table.add_row(datetime.datetime.fromtimestamp(entry.timestamp).strftime('%Y-%m-%d %H:%M:%S'), entry.judgment)
+    Console().print(table)
@@ -8,7 +8,7 @@ from progtool import settings
 from progtool.cli.util import needs_settings
 from progtool.content.metadata import (ContentNodeMetadata, ExerciseMetadata,
                                        ExplanationMetadata, SectionMetadata,
-                                       load_everything, load_metadata)
+                                       load_everything, load_repository_metadata)
 from progtool.content.navigator import ContentNavigator
 from progtool.content.tree import ContentNode, build_tree
 
@@ -62,7 +62,7 @@ class Checker:
 
     def __init__(self):
         self.__root_path = settings.repository_exercise_root()
-        metadata = load_metadata(self.__root_path, link_predicate=load_everything(force_all=True))
+        metadata = load_repository_metadata(link_predicate=load_everything(force_all=True))
         if metadata is None:
             raise CheckerError("No nodes loaded")
         self.__metadata = metadata
@@ -0,0 +1,75 @@
+import json
+import sys
+import urllib.error
+import urllib.request
+from typing import Optional
+
+import click
+from rich.console import Console
+from rich.table import Table
+
+from progtool import settings
+from progtool.cli.util import needs_settings
+from progtool.constants import ERROR_CODE_SERVER_UNREACHABLE
+
+
+@click.group()
+def judge() -> None:
+    """
+    Inspects judging
+    """
+    pass
+
+
+@judge.command()
+@click.option('--url', default=None, help='Address of the running progtool server; defaults to the one in the settings')
+@click.option('--sort', 'sort_by', type=click.Choice(['wall', 'cpu', 'rss', 'runs']), default='wall', help='Column to sort on (descending)')
+@click.argument('node_path', default='')
+def stats(url: Optional[str], sort_by: str, node_path: str) -> None:
+    """
+    Shows resource usage of judges, as measured by a running server
+    """
+    if url is None:
+        needs_settings()  # type: ignore[call-arg]
+        url = settings.server_url()
+    console = Console()
+    try:
+        with urllib.request.urlopen(f'{url}/api/v1/judging-stats/{node_path}') as response:
+            exercises: dict = json.load(response)['exercises']
+    except urllib.error.URLError as e:
+        console.print(f"[red]ERROR[/red] Could not reach server at {url}: {e.reason}")
+        sys.exit(ERROR_CODE_SERVER_UNREACHABLE)
+
+    def sort_key(item: tuple[str, dict]) -> float:
+        _, statistics = item
+        match sort_by:
+            case 'wall':
+                return statistics['wall_time']['mean']
+            case 'cpu':
+                return statistics['user_time']['mean'] + statistics['system_time']['mean']
+            case 'rss':
+                return statistics['max_rss']['max']
+            case _:
+                return statistics['runs']
+
+    table = Table(title='Judging statistics (means over recent runs)')
+    table.add_column('Exercise')
+    table.add_column('Runs', justify='right')
+    table.add_column('Timeouts', justify='right')
+    table.add_column('Wall (s)', justify='right')
+    table.add_column('Max wall (s)', justify='right')
+    table.add_column('User (s)', justify='right')
+    table.add_column('System (s)', justify='right')
+    table.add_column('Peak RSS (MB)', justify='right')
+    for tree_path, statistics in sorted(exercises.items(), key=sort_key, reverse=True):
+        table.add_row(
+            tree_path,
+            str(statistics['runs']),
+            str(statistics['timeouts']),
+            f"{statistics['wall_time']['mean']:.2f}",
+            f"{statistics['wall_time']['max']:.2f}",
+            f"{statistics['user_time']['mean']:.2f}",
+            f"{statistics['system_time']['mean']:.2f}",
+            f"{statistics['max_rss']['max'] / (1024 * 1024):.1f}",
+        )
+    console.print(table)
@@ -71,6 +71,8 @@ def process_command_line_arguments():
         progtool.cli.update,
         progtool.cli.student,
         progtool.cli.table,
+        progtool.cli.bundle,
+        progtool.cli.judge,
     ]
 
     for command in commands:
@@ -8,10 +8,11 @@ from progtool.constants import TOOL_NAME
 
 @click.command()
 @click.option('--debug', is_flag=True, default=False)
-def server(debug: bool) -> None:
+@click.option('--bundle', 'use_bundle', is_flag=True, default=False, help='Serve content from bundle created by progtool bundle')
+def server(debug: bool, use_bundle: bool) -> None:
     """
     Set up server.
     """
     import progtool.server
     needs_settings(autofix=True)  # type: ignore[call-arg]
-    progtool.server.run(debug)
+    progtool.server.run(debug, use_bundle=use_bundle)
@@ -9,7 +9,7 @@ from rich.tree import Tree
 from progtool import settings
 from progtool.cli.util import needs_settings
 from progtool.content.metadata import (filter_by_tags, load_everything,
-                                       load_metadata)
+                                       load_repository_metadata)
 from progtool.content.navigator import ContentNavigator
 from progtool.content.tree import (ContentNode, Exercise, Explanation, Section,
                                    build_tree)
@@ -32,9 +32,8 @@ def table(tags: list[str], show_all: bool) -> None:
 
     console = Console()
     tree = Tree('root')
-    root_path = settings.repository_exercise_root()
     link_predicate = create_link_predicate()
-    metadata = load_metadata(root_path, link_predicate=link_predicate)
+    metadata = load_repository_metadata(link_predicate=link_predicate)
 
     if metadata is None:
         console.print("[red]ERROR[/red] No nodes satisfy tags")
@@ -7,7 +7,7 @@ from rich.table import Table
 
 from progtool import constants, settings
 from progtool.cli.util import needs_settings
-from progtool.content.metadata import load_everything, load_metadata
+from progtool.content.metadata import load_everything, load_repository_metadata
 from progtool.content.tree import (ContentNode, Exercise, Explanation, Section,
                                    build_tree)
 
@@ -45,9 +45,8 @@ def overview() -> None:
 
     needs_settings() # type: ignore[call-arg]
 
-    root_path = settings.repository_exercise_root()
     link_predicate = load_everything(force_all=True)
-    metadata = load_metadata(root_path, link_predicate=link_predicate)
+    metadata = load_repository_metadata(link_predicate=link_predicate)
 
     if metadata is None:
         print("Unable to load course material")
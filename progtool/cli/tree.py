@@ -7,7 +7,7 @@ from rich.tree import Tree
 from progtool.cli.util import needs_settings
 
 from progtool.content.metadata import (filter_by_tags, load_everything,
-                                       load_metadata)
+                                       load_repository_metadata)
 from progtool.content.tree import (ContentNode, Exercise, Explanation, Section,
                                    build_tree)
 from progtool import settings
@@ -47,9 +47,8 @@ def tree(tags: list[str], show_all: bool) -> None:
 
     console = Console()
     tree = Tree('root')
-    root_path = settings.repository_exercise_root()
     link_predicate = create_link_predicate()
-    metadata = load_metadata(root_path, link_predicate=link_predicate)
+    metadata = load_repository_metadata(link_predicate=link_predicate)
 
     if metadata is None:
         console.print("[red]ERROR[/red] No nodes satisfy tags")
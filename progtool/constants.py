@@ -17,4 +17,5 @@ ERROR_CODE_NO_GIT_REPOSITORY = -5
 ERROR_CODE_FAILED_TO_INITIALIZE = -6
 ERROR_CODE_FAILED_TO_LOAD_METADATA = -7
 ERROR_CODE_WRONG_ACTIVE_BRANCH = -8
+ERROR_CODE_SERVER_UNREACHABLE = -9
 ERROR_CODE_GENERIC = -100
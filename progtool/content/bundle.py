@@ -0,0 +1,203 @@
+import json
+import logging
+import mmap
+import struct
+from pathlib import Path
+from typing import Any, Optional
+
+from progtool.content.metadata import (ContentNodeMetadata, ExerciseMetadata,
+                                       ExplanationMetadata, SectionMetadata,
+                                       TopicsMetadata)
+from progtool.content.tree import (ContentNode, Exercise, Explanation, Section,
+                                   Topics, get_documentation_in_language)
+from progtool.content.treepath import TreePath
+from progtool.judging.factory import create_judge_from_metadata
+from progtool.judging.judge import JudgeMetadata
+
+
+# A bundle is a single file containing everything needed to serve the course material:
+# the node table (names, topics, difficulty, judges, ...) and the markdown of every leaf in every available language.
+# Layout: header (magic, format version, index length) | index (JSON) | markdown data
+# The index also records the modification time and size of the metadata and markdown files the bundle was created from,
+# so that bundles older than their sources can be detected.
+# The server loads bundles using mmap so that markdown is only copied when it is served.
+BUNDLE_MAGIC = b'PTBUNDLE'
+
+BUNDLE_FORMAT_VERSION = 2
+
+_HEADER = struct.Struct('<8sIQ')
+
+
+class BundleError(Exception):
+    pass
+
+
+class StaleBundleError(BundleError):
+    """
+    The sources of the bundle changed after it was created.
+    """
+    pass
+
+
+def _describe_source(file: Path) -> Optional[list[int]]:
+    """
+    Modification time and size of file, None if it does not exist.
+    """
+    try:
+        stat = file.stat()
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def write_bundle(metadata: ContentNodeMetadata, root_path: Path, path: Path) -> None:
+    """
+    Writes the content described by metadata to a bundle at path.
+    Parameter root_path is recorded so that the server can detect bundles of other repositories.
+    """
+    nodes: list[dict[str, Any]] = []
+    chunks: list[bytes] = []
+    data_length = 0
+    sources: dict[str, Optional[list[int]]] = {}
+
+    def add_source(file: Path) -> None:
+        sources[str(file)] = _describe_source(file)
+
+    def add_markdown(file: Path) -> Optional[tuple[int, int]]:
+        nonlocal data_length
+        add_source(file)
+        if not file.is_file():
+            logging.error(f'File {file} not found!')
+            return None
+        # Read as text so that line endings are normalized the same way as when serving from disk
+        data = file.read_text(encoding='utf-8').encode('utf-8')
+        chunks.append(data)
+        offset = data_length
+        data_length += len(data)
+        return (offset, len(data))
+
+    def add_documentation(path: Path, documentation: dict[str, str]) -> dict[str, Any]:
+        return {
+            language: {'file': filename, 'data': add_markdown(path / filename)}
+            for language, filename in documentation.items()
+        }
+
+    def add(node: ContentNodeMetadata) -> int:
+        index = len(nodes)
+        entry: dict[str, Any] = {
+            'type': node.type,
+            'id': node.id,
+            'name': node.name,
+            'path': str(node.path),
+            'topics': node.topics.model_dump(),
+        }
+        nodes.append(entry)
+        # Every node comes from the metadata.yaml in its directory
+        add_source(node.path / 'metadata.yaml')
+        match node:
+            case SectionMetadata(contents=contents):
+                entry['children'] = [add(child) for child in contents]
+            case ExerciseMetadata(path=path, difficulty=difficulty, documentation=documentation, judge=judge):
+                entry['difficulty'] = difficulty
+                entry['judge'] = judge.model_dump()
+                entry['documentation'] = add_documentation(path, documentation)
+            case ExplanationMetadata(path=path, documentation=documentation):
+                entry['documentation'] = add_documentation(path, documentation)
+            case _:
+                raise BundleError(f'Unknown metadata {node!r}')
+        return index
+
+    logging.info('Collecting bundle contents')
+    add(metadata)
+    index = json.dumps({'root': str(root_path), 'sources': sources, 'nodes': nodes}).encode('utf-8')
+
+    logging.info(f'Writing bundle to {path}')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(path.name + '.tmp')
+    with temporary_path.open('wb') as file:
+        file.write(_HEADER.pack(BUNDLE_MAGIC, BUNDLE_FORMAT_VERSION, len(index)))
+        file.write(index)
+        for chunk in chunks:
+            file.write(chunk)
+    temporary_path.replace(path)
+
+
+def load_bundle(path: Path, root_path: Optional[Path] = None) -> ContentNode:
+    """
+    Builds the tree from the bundle at path.
+    If root_path is given, the bundle must have been created from that repository,
+    and a StaleBundleError is raised if any of its sources changed since.
+    """
+    logging.info(f'Loading bundle {path}')
+    if not path.is_file():
+        raise BundleError(f'No bundle found at {path}')
+    with path.open('rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(buffer) < _HEADER.size:
+        raise BundleError(f'{path} is not a bundle')
+    magic, version, index_length = _HEADER.unpack_from(buffer, 0)
+    if magic != BUNDLE_MAGIC:
+        raise BundleError(f'{path} is not a bundle')
+    if version != BUNDLE_FORMAT_VERSION:
+        raise BundleError(f'Bundle {path} has format version {version}; please recreate it using progtool bundle')
+
+    view = memoryview(buffer)
+    index = json.loads(bytes(view[_HEADER.size:_HEADER.size + index_length]))
+    data = view[_HEADER.size + index_length:]
+    nodes = index['nodes']
+
+    if root_path is not None and Path(index['root']) != root_path:
+        raise BundleError(f'Bundle {path} was created from {index["root"]}, not {root_path}')
+    if root_path is not None:
+        for source, description in index['sources'].items():
+            if _describe_source(Path(source)) != description:
+                raise StaleBundleError(f'{source} changed after bundle {path} was created; please recreate it using progtool bundle')
+
+    def select_documentation(path: Path, documentation: dict[str, Any]) -> tuple[Path, Optional[memoryview]]:
+        selected = get_documentation_in_language(documentation)
+        match selected['data']:
+            case [offset, length]:
+                return (path / selected['file'], data[offset:offset + length])
+            case _:
+                return (path / selected['file'], None)
+
+    def build(index: int, tree_path: TreePath) -> ContentNode:
+        entry = nodes[index]
+        path = Path(entry['path'])
+        topics = Topics.from_metadata(TopicsMetadata.model_validate(entry['topics']))
+        match entry['type']:
+            case 'section':
+                return Section(
+                    tree_path=tree_path,
+                    local_path=path,
+                    name=entry['name'],
+                    children=[build(child, tree_path / nodes[child]['id']) for child in entry['children']],
+                    topics=topics,
+                )
+            case 'explanation':
+                file, file_data = select_documentation(path, entry['documentation'])
+                return Explanation(
+                    tree_path=tree_path,
+                    local_path=path,
+                    name=entry['name'],
+                    file=file,
+                    file_data=file_data,
+                    topics=topics,
+                )
+            case 'exercise':
+                assignment_file, assignment_data = select_documentation(path, entry['documentation'])
+                return Exercise(
+                    tree_path=tree_path,
+                    local_path=path,
+                    name=entry['name'],
+                    difficulty=entry['difficulty'],
+                    assignment_file=assignment_file,
+                    assignment_data=assignment_data,
+                    judge=create_judge_from_metadata(path, JudgeMetadata.model_validate(entry['judge'])),
+                    topics=topics,
+                )
+            case node_type:
+                raise BundleError(f'Unknown node type {node_type} in bundle')
+
+    return build(0, TreePath())
@@ -1,10 +1,16 @@
-from pathlib import Path
-from typing import Any, Callable, Iterable, Literal, Optional
+from __future__ import annotations
 
+import concurrent.futures
+import hashlib
 import logging
+import pickle
+from pathlib import Path
+from typing import Any, Callable, Iterable, Literal, NamedTuple, Optional
+
 import pydantic
 import yaml
 
+from progtool import settings
 from progtool.judging.judge import JudgeMetadata
 
 
@@ -75,12 +81,37 @@ class MetadataError(Exception):
 LinkPredicate = Callable[[LinkMetadata], bool]
 
 
+class SectionTemplate(NamedTuple):
+    """
+    Section as it appears in a single metadata.yaml, i.e., with its links not yet followed.
+    """
+    path: Path
+    id: str
+    name: str
+    contents: list[NodeTemplate]
+
+
+# Result of parsing a single metadata.yaml file: links are kept as LinkMetadata
+NodeTemplate = ContentNodeMetadata | LinkMetadata | SectionTemplate
+
+TemplateReader = Callable[[Path], NodeTemplate]
+
+
 def parse_metadata(path: Path, metadata: Any, link_predicate: LinkPredicate) -> Optional[ContentNodeMetadata]:
     """
     Parses the data stored in parameter metadata.
     Parameter path contains the path from which the metadata originates.
     Parameter link_predicate selects which links to follow.
     """
+    template = parse_template(path, metadata)
+    return assemble_metadata(template, link_predicate=link_predicate, read_template=read_template)
+
+
+def parse_template(path: Path, metadata: Any) -> NodeTemplate:
+    """
+    Parses the data stored in parameter metadata without following links.
+    Parameter path contains the path from which the metadata originates.
+    """
     logging.info(f'Parsing metadata from {path}')
     if not isinstance(metadata, dict):
         raise MetadataError('Metadata should be dict')
@@ -102,44 +133,260 @@ def parse_metadata(path: Path, metadata: Any, link_predicate: LinkPredicate) ->
             raise
     elif node_type == TYPE_LINK:
         try:
-            link_metadata = LinkMetadata.model_validate(metadata)
+            return LinkMetadata.model_validate(metadata)
         except:
             logging.error(f"Error occurred while parsing Link metadata from {path}")
             raise
-        if link_predicate(link_metadata):
-            return load_metadata(path / link_metadata.location, link_predicate=link_predicate)
-        else:
-            return None
     elif node_type == TYPE_SECTION:
         identifier = metadata['id']
         name = metadata['name']
         children_objects = metadata['contents']
         if not isinstance(children_objects, list):
             raise MetadataError("A section's content should be a list")
-        children = [
-            child
-            for child in (parse_metadata(path, child, link_predicate) for child in children_objects)
-            if child is not None
-        ]
-        return SectionMetadata(
+        return SectionTemplate(
+            path=path,
             id=identifier,
             name=name,
-            type=TYPE_SECTION,
-            contents=children,
-            path=path,
+            contents=[parse_template(path, child) for child in children_objects],
         )
     else:
         raise MetadataError(f'Unrecognized node type {node_type}')
 
 
-def load_metadata(root_path: Path, *, link_predicate: LinkPredicate) -> Optional[ContentNodeMetadata]:
+def assemble_metadata(template: NodeTemplate, *, link_predicate: LinkPredicate, read_template: TemplateReader) -> Optional[ContentNodeMetadata]:
+    """
+    Turns a template into metadata by following the links selected by link_predicate.
+    Parameter read_template is used to fetch the template of the linked metadata.yaml files.
+    """
+    match template:
+        case LinkMetadata(path=path, location=location):
+            if link_predicate(template):
+                linked_template = read_template(path / location)
+                return assemble_metadata(linked_template, link_predicate=link_predicate, read_template=read_template)
+            else:
+                return None
+        case SectionTemplate(path=path, id=identifier, name=name, contents=contents):
+            children = [
+                child
+                for child in (assemble_metadata(child, link_predicate=link_predicate, read_template=read_template) for child in contents)
+                if child is not None
+            ]
+            return SectionMetadata(
+                id=identifier,
+                name=name,
+                type=TYPE_SECTION,
+                contents=children,
+                path=path,
+            )
+        case _:
+            return template
+
+
+def read_metadata_file(root_path: Path) -> bytes:
     file_path = root_path / 'metadata.yaml'
     logging.info(f'Loading {file_path}')
     if not file_path.is_file():
         raise MetadataError(f'Link to {file_path} does not exist')
-    with file_path.open() as file:
-        data = yaml.safe_load(file)
-    return parse_metadata(root_path, data, link_predicate)
+    return file_path.read_bytes()
+
+
+# libyaml's loader is several times faster than the pure Python one, but is not available everywhere
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def parse_template_file(root_path: Path, contents: bytes) -> NodeTemplate:
+    return parse_template(root_path, yaml.load(contents, Loader=YamlLoader))
+
+
+def read_template(root_path: Path) -> NodeTemplate:
+    return parse_template_file(root_path, read_metadata_file(root_path))
+
+
+def followed_links(template: NodeTemplate, link_predicate: LinkPredicate) -> Iterable[LinkMetadata]:
+    """
+    Enumerates the links inside a single template that link_predicate selects.
+    """
+    match template:
+        case LinkMetadata():
+            if link_predicate(template):
+                yield template
+        case SectionTemplate(contents=contents):
+            for child in contents:
+                yield from followed_links(child, link_predicate)
+
+
+def read_templates_in_parallel(root_path: Path, *, link_predicate: LinkPredicate, snapshot: Optional[MetadataSnapshot] = None, max_workers: Optional[int] = None) -> dict[Path, NodeTemplate]:
+    """
+    Discovers all metadata.yaml files reachable from root_path through links selected by link_predicate
+    and parses them on a process pool.
+    Returns a mapping from each directory to the template of its metadata.yaml.
+    """
+    templates: dict[Path, NodeTemplate] = {}
+    pending: dict[concurrent.futures.Future[NodeTemplate], tuple[Path, bytes]] = {}
+    seen: set[Path] = set()
+
+    def schedule(path: Path) -> None:
+        if path in seen:
+            return
+        seen.add(path)
+        contents = read_metadata_file(path)
+        if snapshot is not None and (template := snapshot.lookup(path, contents)) is not None:
+            found(path, template)
+        else:
+            future = executor.submit(parse_template_file, path, contents)
+            pending[future] = (path, contents)
+
+    def found(path: Path, template: NodeTemplate) -> None:
+        templates[path] = template
+        for link in followed_links(template, link_predicate):
+            schedule(link.path / link.location)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        schedule(root_path)
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                path, contents = pending.pop(future)
+                try:
+                    template = future.result()
+                except Exception:
+                    # Exceptions do not always survive the trip between processes; parse again locally so that the original error surfaces
+                    template = parse_template_file(path, contents)
+                if snapshot is not None:
+                    snapshot.store(path, contents, template)
+                found(path, template)
+
+    return templates
+
+
+LoadingMode = Literal['serial', 'parallel']
+
+
+def load_metadata(root_path: Path, *, link_predicate: LinkPredicate, snapshot: Optional[MetadataSnapshot] = None, mode: LoadingMode = 'serial') -> Optional[ContentNodeMetadata]:
+    """
+    Loads the metadata rooted at root_path.
+    If a snapshot is given, only metadata.yaml files that changed since the snapshot was taken are parsed again.
+    In parallel mode, all linked metadata.yaml files are parsed on a process pool before the tree is assembled.
+    """
+    if mode == 'parallel':
+        templates = read_templates_in_parallel(root_path, link_predicate=link_predicate, snapshot=snapshot)
+        reader: TemplateReader = templates.__getitem__
+    elif snapshot is not None:
+        reader = snapshot.read_template
+    else:
+        reader = read_template
+    template = reader(root_path)
+    metadata = assemble_metadata(template, link_predicate=link_predicate, read_template=reader)
+    if snapshot is not None:
+        snapshot.save()
+    return metadata
+
+
+def load_repository_metadata(*, link_predicate: LinkPredicate) -> Optional[ContentNodeMetadata]:
+    """
+    Loads the metadata of the course material repository, using the snapshot stored alongside the settings.
+    """
+    root_path = settings.repository_exercise_root()
+    snapshot = MetadataSnapshot(settings.metadata_snapshot())
+    return load_metadata(root_path, link_predicate=link_predicate, snapshot=snapshot, mode=settings.metadata_loading())
+
+
+class FileFingerprint(NamedTuple):
+    mtime_ns: int
+    size: int
+    digest: str
+
+    @staticmethod
+    def of(path: Path, contents: bytes) -> FileFingerprint:
+        stat = path.stat()
+        return FileFingerprint(
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            digest=hashlib.sha256(contents).hexdigest(),
+        )
+
+
+class MetadataSnapshot:
+    """
+    On-disk cache of parsed and validated metadata.yaml files.
+    Each file is stored together with its fingerprint so that changed files can be detected.
+    """
+
+    FORMAT_VERSION = 2
+
+    __path: Path
+
+    __entries: dict[Path, tuple[FileFingerprint, NodeTemplate]]
+
+    __dirty: bool
+
+    def __init__(self, path: Path):
+        self.__path = path
+        self.__entries = self.__load_entries()
+        self.__dirty = False
+
+    def __load_entries(self) -> dict[Path, tuple[FileFingerprint, NodeTemplate]]:
+        if not self.__path.is_file():
+            logging.info(f'No metadata snapshot found at {self.__path}')
+            return {}
+        try:
+            with self.__path.open('rb') as file:
+                data = pickle.load(file)
+        except Exception as e:
+            logging.warning(f'Failed to read metadata snapshot {self.__path}: {e!r}')
+            return {}
+        if not isinstance(data, dict) or data.get('version') != MetadataSnapshot.FORMAT_VERSION:
+            logging.info('Metadata snapshot has outdated format; ignoring it')
+            return {}
+        return data['entries']
+
+    def lookup(self, root_path: Path, contents: bytes) -> Optional[NodeTemplate]:
+        """
+        Returns the snapshotted template for root_path's metadata.yaml, or None if the file changed since.
+        """
+        file_path = root_path / 'metadata.yaml'
+        match self.__entries.get(file_path.absolute()):
+            case (fingerprint, template) if fingerprint == FileFingerprint.of(file_path, contents):
+                logging.debug(f'Using snapshot of {file_path}')
+                return template
+            case _:
+                return None
+
+    def store(self, root_path: Path, contents: bytes, template: NodeTemplate) -> None:
+        file_path = root_path / 'metadata.yaml'
+        self.__entries[file_path.absolute()] = (FileFingerprint.of(file_path, contents), template)
+        self.__dirty = True
+
+    def read_template(self, root_path: Path) -> NodeTemplate:
+        contents = read_metadata_file(root_path)
+        template = self.lookup(root_path, contents)
+        if template is None:
+            template = parse_template_file(root_path, contents)
+            self.store(root_path, contents, template)
+        return template
+
+    def save(self) -> None:
+        if not self.__dirty:
+            return
+        logging.info(f'Writing metadata snapshot to {self.__path}')
+        self.__entries = {
+            key: entry
+            for key, entry in self.__entries.items()
+            if key.is_file()
+        }
+        data = {
+            'version': MetadataSnapshot.FORMAT_VERSION,
+            'entries': self.__entries,
+        }
+        try:
+            self.__path.parent.mkdir(parents=True, exist_ok=True)
+            temporary_path = self.__path.with_name(self.__path.name + '.tmp')
+            with temporary_path.open('wb') as file:
+                pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+            temporary_path.replace(self.__path)
+            self.__dirty = False
+        except OSError as e:
+            logging.warning(f'Failed to write metadata snapshot {self.__path}: {e!r}')
 
 
 def load_everything(force_all: bool = False) -> LinkPredicate:
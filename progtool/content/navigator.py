@@ -1,54 +1,126 @@
-from typing import Callable, Literal, Optional
+from typing import Optional
 
 from progtool.content.tree import (ContentNode, ContentTreeBranch,
                                    ContentTreeLeaf)
 
 
 class ContentNavigator:
+    """
+    Answers structural queries about a tree in constant time.
+    All tables are indexed by the position of the node in preorder traversal
+    and are computed once, when the navigator is created.
+    """
+
     __nodes: list[ContentNode]
 
     __node_index_map: dict[ContentNode, int]
 
-    __parent_mapping: dict[ContentNode, ContentTreeBranch]
+    # Index of parent, -1 for the root
+    __parents: list[int]
+
+    __depths: list[int]
+
+    # Index right after the last node of the subtree, i.e., subtree of node i is nodes[i:__subtree_ends[i]]
+    __subtree_ends: list[int]
+
+    # Index of first leaf strictly after/before each node, -1 if there is none
+    __successor_leaves: list[int]
+
+    __predecessor_leaves: list[int]
 
     def __init__(self, root: ContentNode):
-        self.__nodes = list(root.preorder_traversal())
+        self.__nodes = []
+        self.__parents = []
+        self.__depths = []
+        self.__subtree_ends = []
+
+        # Iterative to avoid hitting the recursion limit on deep trees
+        stack: list[tuple[ContentNode, int, int]] = [(root, -1, 0)]
+        while stack:
+            node, parent, depth = stack.pop()
+            index = len(self.__nodes)
+            self.__nodes.append(node)
+            self.__parents.append(parent)
+            self.__depths.append(depth)
+            self.__subtree_ends.append(-1)
+            if isinstance(node, ContentTreeBranch):
+                stack.extend((child, index, depth + 1) for child in reversed(node.children))
+
+        # Subtree ends are found by going backwards: a node's subtree ends where its last child's subtree ends
+        count = len(self.__nodes)
+        for index in reversed(range(count)):
+            if self.__subtree_ends[index] == -1:
+                self.__subtree_ends[index] = index + 1
+            parent = self.__parents[index]
+            if parent != -1 and self.__subtree_ends[parent] == -1:
+                self.__subtree_ends[parent] = self.__subtree_ends[index]
+
         self.__node_index_map = {node: index for index, node in enumerate(self.__nodes)}
-        self.__parent_mapping = {}
-        root.build_parent_mapping(self.__parent_mapping)
+
+        self.__successor_leaves = [-1] * count
+        next_leaf = -1
+        for index in reversed(range(count)):
+            self.__successor_leaves[index] = next_leaf
+            if isinstance(self.__nodes[index], ContentTreeLeaf):
+                next_leaf = index
+
+        self.__predecessor_leaves = [-1] * count
+        previous_leaf = -1
+        for index in range(count):
+            self.__predecessor_leaves[index] = previous_leaf
+            if isinstance(self.__nodes[index], ContentTreeLeaf):
+                previous_leaf = index
+
+    @property
+    def nodes(self) -> list[ContentNode]:
+        """
+        All nodes in preorder traversal.
+        """
+        return self.__nodes
+
+    def index_of(self, node: ContentNode) -> int:
+        """
+        Returns the position of node in preorder traversal.
+        """
+        assert node in self.__node_index_map, "BUG: All nodes should occur in __node_index_map"
+        return self.__node_index_map[node]
 
     def find_successor_leaf(self, node: ContentNode) -> Optional[ContentNode]:
         """
         Given any node, find the first *leaf* that appears after it in preorder traversal.
         """
-        assert node in self.__node_index_map, "BUG: All nodes should occur in __node_index_map"
-        start_index = self.__node_index_map[node] + 1
-        return self.__search_preorder_traversal(
-            start_index,
-            1,
-            lambda node: isinstance(node, ContentTreeLeaf)
-        )
+        return self.__node_at(self.__successor_leaves[self.index_of(node)])
 
     def find_predecessor_leaf(self, node: ContentNode) -> Optional[ContentNode]:
         """
         Given any node, find the first *leaf* that appears before it in preorder traversal.
         """
-        assert node in self.__node_index_map, "BUG: All nodes should occur in __node_index_map"
-        start_index = self.__node_index_map[node] - 1
-        return self.__search_preorder_traversal(
-            start_index,
-            -1,
-            lambda node: isinstance(node, ContentTreeLeaf)
-        )
+        return self.__node_at(self.__predecessor_leaves[self.index_of(node)])
 
     def find_parent(self, node: ContentNode) -> Optional[ContentNode]:
-        return self.__parent_mapping.get(node, None)
-
-    def __search_preorder_traversal(self, start_index: int, direction: Literal[-1, 1], predicate: Callable[[ContentNode], bool]) -> Optional[ContentNode]:
-        index = start_index
-        while 0 <= index < len(self.__nodes) and not predicate(self.__nodes[index]):
-            index += direction
-        if 0 <= index < len(self.__nodes):
-            return self.__nodes[index]
-        else:
+        return self.__node_at(self.__parents[self.index_of(node)])
+
+    def depth(self, node: ContentNode) -> int:
+        """
+        Returns the depth of node, the root having depth 0.
+        """
+        return self.__depths[self.index_of(node)]
+
+    def subtree_range(self, node: ContentNode) -> range:
+        """
+        Returns the preorder indices of the nodes in node's subtree, node included.
+        """
+        index = self.index_of(node)
+        return range(index, self.__subtree_ends[index])
+
+    def is_ancestor(self, ancestor: ContentNode, node: ContentNode) -> bool:
+        """
+        Checks whether ancestor is a proper ancestor of node.
+        """
+        ancestor_index = self.index_of(ancestor)
+        return ancestor_index < self.index_of(node) < self.__subtree_ends[ancestor_index]
+
+    def __node_at(self, index: int) -> Optional[ContentNode]:
+        if index == -1:
             return None
+        return self.__nodes[index]
@@ -1,14 +1,18 @@
 from __future__ import annotations
 
 import logging
+import threading
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Callable, Iterable, NamedTuple
+from typing import Callable, Iterable, NamedTuple, Optional
 
 from progtool import settings
 from progtool.content.metadata import (ContentNodeMetadata, ExerciseMetadata,
-                                       ExplanationMetadata, SectionMetadata,
-                                       TopicsMetadata)
+                                       ExplanationMetadata, LinkMetadata,
+                                       LinkPredicate, NodeTemplate,
+                                       SectionMetadata, SectionTemplate,
+                                       TemplateReader, TopicsMetadata,
+                                       read_template)
 from progtool.content.treepath import TreePath
 from progtool.judging.judge import Judge
 from progtool.judging.factory import create_judge_from_metadata
@@ -34,6 +38,8 @@ class Topics(NamedTuple):
 
 
 class ContentNode(ABC):
+    __slots__ = ('__tree_path', '__local_path', '__name', '__topics')
+
     # Path within tree
     __tree_path: TreePath
 
@@ -83,10 +89,6 @@ class ContentNode(ABC):
     def preorder_traversal(self) -> Iterable[ContentNode]:
         ...
 
-    @abstractmethod
-    def build_parent_mapping(self, mapping: dict[ContentNode, ContentTreeBranch]) -> None:
-        ...
-
     @abstractmethod
     def descend(self, parts: TreePath | tuple[str, ...]) -> ContentNode:
         ...
@@ -98,9 +100,14 @@ class ContentNode(ABC):
 
 
 class ContentTreeLeaf(ContentNode):
+    __slots__ = ('__markdown_path', '__markdown_data')
+
     __markdown_path: Path
 
-    def __init__(self, *, tree_path: TreePath, local_path: Path, name: str, topics: Topics, markup_path: Path):
+    # Contents of the markdown file if it has already been loaded in memory (e.g., from a bundle)
+    __markdown_data: Optional[memoryview]
+
+    def __init__(self, *, tree_path: TreePath, local_path: Path, name: str, topics: Topics, markup_path: Path, markup_data: Optional[memoryview] = None):
         super().__init__(
             tree_path=tree_path,
             local_path=local_path,
@@ -108,6 +115,7 @@ class ContentTreeLeaf(ContentNode):
             topics=topics,
         )
         self.__markdown_path = markup_path
+        self.__markdown_data = markup_data
 
     @property
     def markdown_path(self) -> Path:
@@ -115,17 +123,26 @@ class ContentTreeLeaf(ContentNode):
 
     @property
     def markdown(self) -> str:
+        if self.__markdown_data is not None:
+            return str(self.__markdown_data, encoding='utf-8')
         if not self.__markdown_path.is_file():
             logging.error(f'File {self.__markdown_path} not found!')
             return 'Error'
         return self.__markdown_path.read_text(encoding='utf-8')
 
+    @property
+    def markdown_bytes(self) -> memoryview:
+        """
+        Markdown encoded in UTF-8. Avoids a decode/encode round trip when the markdown is already in memory.
+        Data kept in memory is not copied; callers that need bytes have to make the copy themselves.
+        """
+        if self.__markdown_data is not None:
+            return self.__markdown_data
+        return memoryview(self.markdown.encode('utf-8'))
+
     def preorder_traversal(self) -> Iterable[ContentNode]:
         yield self
 
-    def build_parent_mapping(self, mapping: dict[ContentNode, ContentTreeBranch]) -> None:
-        pass
-
     def descend(self, parts: TreePath | tuple[str, ...]) -> ContentNode:
         if isinstance(parts, TreePath):
             parts = parts.parts
@@ -136,15 +153,16 @@ class ContentTreeLeaf(ContentNode):
 
 
 class Explanation(ContentTreeLeaf):
-    __file: Path
+    __slots__ = ()
 
-    def __init__(self, *, tree_path: TreePath, local_path: Path, name: str, file: Path, topics: Topics):
+    def __init__(self, *, tree_path: TreePath, local_path: Path, name: str, file: Path, topics: Topics, file_data: Optional[memoryview] = None):
         super().__init__(
             tree_path=tree_path,
             local_path=local_path,
             name=name,
             topics=topics,
             markup_path=file,
+            markup_data=file_data,
         )
 
     def __str__(self) -> str:
@@ -159,26 +177,34 @@ class Explanation(ContentTreeLeaf):
 
 
 class Exercise(ContentTreeLeaf):
+    __slots__ = ('__difficulty', '__judge', '__judgment', '__judgment_fingerprint', '__judgment_observers')
+
     __difficulty: int
 
     __judge: Judge
 
     __judgment: Judgment
 
-    __judgment_observers: list[Callable[[], None]]
+    # Fingerprint of the judge's inputs at the time of the judgment (see Judge.fingerprint)
+    __judgment_fingerprint: Optional[str]
 
-    def __init__(self, *, tree_path: TreePath, local_path: Path, name: str, difficulty: int, assignment_file: Path, judge: Judge, topics: Topics):
+    # Tuple rather than list: most exercises have a single observer, and all start out sharing the empty tuple
+    __judgment_observers: tuple[Callable[[], None], ...]
+
+    def __init__(self, *, tree_path: TreePath, local_path: Path, name: str, difficulty: int, assignment_file: Path, judge: Judge, topics: Topics, assignment_data: Optional[memoryview] = None):
         super().__init__(
             tree_path=tree_path,
             local_path=local_path,
             name=name,
             topics=topics,
             markup_path=assignment_file,
+            markup_data=assignment_data,
         )
         self.__difficulty = difficulty
         self.__judge = judge
         self.__judgment = Judgment.UNKNOWN
-        self.__judgment_observers = []
+        self.__judgment_fingerprint = None
+        self.__judgment_observers = ()
 
     def __str__(self) -> str:
         return f'Exercise[{self.tree_path}]'
@@ -208,8 +234,17 @@ class Exercise(ContentTreeLeaf):
             self.__judgment = value
             self.__notify_judgment_observers()
 
+    @property
+    def judgment_fingerprint(self) -> Optional[str]:
+        return self.__judgment_fingerprint
+
+    @judgment_fingerprint.setter
+    def judgment_fingerprint(self, value: Optional[str]) -> None:
+        # Observers are not notified: the fingerprint is always set right before the judgment
+        self.__judgment_fingerprint = value
+
     def observe_judgment(self, callback: Callable[[], None]) -> None:
-        self.__judgment_observers.append(callback)
+        self.__judgment_observers = (*self.__judgment_observers, callback)
 
     def __notify_judgment_observers(self) -> None:
         for observer in self.__judgment_observers:
@@ -217,16 +252,37 @@ class Exercise(ContentTreeLeaf):
 
 
 class ContentTreeBranch(ContentNode):
-    __children_table_value: dict[str, ContentNode]
+    __slots__ = ('__children_table_value', '__children_loader', '__children_lock')
+
+    __children_table_value: Optional[dict[str, ContentNode]]
+
+    # Only set for branches whose children are loaded on first access
+    __children_loader: Optional[Callable[[], list[ContentNode]]]
 
-    def __init__(self, *, name: str, tree_path: TreePath, local_path: Path, children: list[ContentNode], topics: Topics):
+    __children_lock: Optional[threading.Lock]
+
+    def __init__(self, *, name: str, tree_path: TreePath, local_path: Path, children: list[ContentNode] | Callable[[], list[ContentNode]], topics: Topics):
+        """
+        Parameter children can also be a function, in which case it is called the first time the children are needed.
+        """
         super().__init__(
             tree_path=tree_path,
             local_path=local_path,
             name=name,
             topics=topics,
         )
-        self.__children_table_value = {
+        if callable(children):
+            self.__children_table_value = None
+            self.__children_loader = children
+            self.__children_lock = threading.Lock()
+        else:
+            self.__children_table_value = ContentTreeBranch.__create_children_table(children)
+            self.__children_loader = None
+            self.__children_lock = None
+
+    @staticmethod
+    def __create_children_table(children: list[ContentNode]) -> dict[str, ContentNode]:
+        return {
             child.tree_path.parts[-1]: child
             for child in children
         }
@@ -240,8 +296,19 @@ class ContentTreeBranch(ContentNode):
     def children(self) -> list[ContentNode]:
         return list(self.__children_table.values())
 
+    @property
+    def is_loaded(self) -> bool:
+        return self.__children_table_value is not None
+
     @property
     def __children_table(self) -> dict[str, ContentNode]:
+        if self.__children_table_value is None:
+            assert self.__children_loader is not None and self.__children_lock is not None, 'BUG: unloaded branch should have loader'
+            with self.__children_lock:
+                if self.__children_table_value is None:
+                    logging.info(f'Loading children of {self.tree_path}')
+                    self.__children_table_value = ContentTreeBranch.__create_children_table(self.__children_loader())
+                    self.__children_loader = None
         return self.__children_table_value
 
     def preorder_traversal(self) -> Iterable[ContentNode]:
@@ -249,22 +316,15 @@ class ContentTreeBranch(ContentNode):
         for child in self.children:
             yield from child.preorder_traversal()
 
-    def build_parent_mapping(self, mapping: dict[ContentNode, ContentTreeBranch]) -> None:
-        for child in self.children:
-            mapping[child] = self
-            child.build_parent_mapping(mapping)
-
     def descend(self, parts: TreePath | tuple[str, ...]) -> ContentNode:
         if isinstance(parts, TreePath):
             parts = parts.parts
-        if len(parts) == 0:
-            return self
-        else:
-            first, *rest = parts
-            if first not in self.__children_table:
+        node: ContentNode = self
+        for part in parts:
+            if not isinstance(node, ContentTreeBranch) or part not in node.__children_table:
                 raise ContentError('Invalid descent')
-            else:
-                return self.__children_table[first].descend(tuple(rest))
+            node = node.__children_table[part]
+        return node
 
     @property
     def exercises(self) -> Iterable[Exercise]:
@@ -272,7 +332,9 @@ class ContentTreeBranch(ContentNode):
 
 
 class Section(ContentTreeBranch):
-    def __init__(self, *, name: str, tree_path: TreePath, local_path: Path, children: list[ContentNode], topics: Topics):
+    __slots__ = ()
+
+    def __init__(self, *, name: str, tree_path: TreePath, local_path: Path, children: list[ContentNode] | Callable[[], list[ContentNode]], topics: Topics):
         super().__init__(
             name=name,
             tree_path=tree_path,
@@ -298,26 +360,6 @@ def get_documentation_in_language(documentation: dict[str, str]):
 def build_tree(metadata: ContentNodeMetadata) -> ContentNode:
     def recurse(metadata: ContentNodeMetadata, tree_path: TreePath):
         match metadata:
-            case ExplanationMetadata(path=path, name=name, documentation=documentation, topics=topics_metadata):
-                return Explanation(
-                    tree_path=tree_path,
-                    local_path=path,
-                    name=name,
-                    file=path / get_documentation_in_language(documentation),
-                    topics=Topics.from_metadata(topics_metadata),
-                )
-            case ExerciseMetadata(path=path, name=name, difficulty=difficulty, documentation=documentation, judge=judge_metadata, topics=topics_metadata):
-                judge = create_judge_from_metadata(path, judge_metadata)
-
-                return Exercise(
-                    tree_path=tree_path,
-                    local_path=path,
-                    name=name,
-                    difficulty=difficulty,
-                    assignment_file=path / get_documentation_in_language(documentation),
-                    judge=judge,
-                    topics=Topics.from_metadata(topics_metadata),
-                )
             case SectionMetadata(path=path, name=name, contents=contents, topics=topics_metadata):
                 children = [
                     recurse(child, tree_path / child.id)
@@ -332,6 +374,73 @@ def build_tree(metadata: ContentNodeMetadata) -> ContentNode:
                     topics=Topics.from_metadata(topics_metadata),
                 )
             case _:
-                raise ContentError('Unknown metadata {metadata!r}')
+                return build_leaf(metadata, tree_path)
 
     return recurse(metadata, TreePath())
+
+
+def build_leaf(metadata: ContentNodeMetadata, tree_path: TreePath) -> ContentNode:
+    match metadata:
+        case ExplanationMetadata(path=path, name=name, documentation=documentation, topics=topics_metadata):
+            return Explanation(
+                tree_path=tree_path,
+                local_path=path,
+                name=name,
+                file=path / get_documentation_in_language(documentation),
+                topics=Topics.from_metadata(topics_metadata),
+            )
+        case ExerciseMetadata(path=path, name=name, difficulty=difficulty, documentation=documentation, judge=judge_metadata, topics=topics_metadata):
+            judge = create_judge_from_metadata(path, judge_metadata)
+
+            return Exercise(
+                tree_path=tree_path,
+                local_path=path,
+                name=name,
+                difficulty=difficulty,
+                assignment_file=path / get_documentation_in_language(documentation),
+                judge=judge,
+                topics=Topics.from_metadata(topics_metadata),
+            )
+        case _:
+            raise ContentError(f'Unknown metadata {metadata!r}')
+
+
+def build_lazy_tree(root_path: Path, *, link_predicate: LinkPredicate, read_template: TemplateReader = read_template) -> Optional[ContentNode]:
+    """
+    Builds the tree without loading all metadata up front.
+    The children of a section are only built when they are first needed;
+    linked metadata.yaml files are read at that point.
+    """
+    def resolve(template: NodeTemplate) -> Optional[ContentNodeMetadata | SectionTemplate]:
+        while isinstance(template, LinkMetadata):
+            if not link_predicate(template):
+                return None
+            template = read_template(template.path / template.location)
+        return template
+
+    def recurse(template: ContentNodeMetadata | SectionTemplate, tree_path: TreePath) -> ContentNode:
+        match template:
+            case SectionTemplate(path=path, name=name, contents=contents):
+                def load_children() -> list[ContentNode]:
+                    resolved_children = (resolve(child) for child in contents)
+                    return [
+                        recurse(child, tree_path / child.id)
+                        for child in resolved_children
+                        if child is not None
+                    ]
+
+                return Section(
+                    tree_path=tree_path,
+                    local_path=path,
+                    name=name,
+                    children=load_children,
+                    topics=Topics.from_metadata(TopicsMetadata()),
+                )
+            case _:
+                return build_leaf(template, tree_path)
+
+    root = resolve(read_template(root_path))
+    if root is None:
+        return None
+    else:
+        return recurse(root, TreePath())
@@ -1,11 +1,16 @@
 from __future__ import annotations
 
+import sys
 from typing import Any
 
 
 class TreePath:
+    __slots__ = ('__parts', '__hash')
+
     __parts: tuple[str, ...]
 
+    __hash: int
+
     @staticmethod
     def parse(string: str) -> TreePath:
         if string:
@@ -15,7 +20,9 @@ class TreePath:
         return TreePath(*parts)
 
     def __init__(self, *parts: str):
-        self.__parts = parts
+        # Interning makes all paths share a single copy of each part
+        self.__parts = tuple(sys.intern(part) for part in parts)
+        self.__hash = hash(self.__parts)
 
     def __truediv__(self, part: str) -> TreePath:
         return TreePath(*self.__parts, part)
@@ -32,7 +39,7 @@ class TreePath:
         return f'TreePath({argument_string})'
 
     def __hash__(self):
-        return hash(self.__parts)
+        return self.__hash
 
     def __eq__(self, other: Any) -> bool:
         if isinstance(other, TreePath):
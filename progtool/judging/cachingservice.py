@@ -1,72 +1,235 @@
 import asyncio
 import logging
+import threading
+from pathlib import Path
 from progtool.content.tree import ContentNode, Exercise
-import json
+from typing import Optional
 
+from progtool.judging.dependencies import get_dependency_tracker
+from progtool.judging.exerciseindex import ExerciseIndex
+from progtool.judging.failurehistory import get_failure_history
 from progtool.judging.judgment import Judgment
+from progtool.judging.judgmentstore import CacheEntry, JudgmentStore, create_judgment_store
+from progtool.judging.repositorystate import RepositoryState, RepositoryTracker
 from progtool import settings
 
 
 class CachingService:
+    """
+    Stores judgments, along with the state of the repository they were reached for.
+    At startup, git is used to find the exercises whose files changed since; the others keep their cached judgment.
+    The failure history, which determines the order in which tests are run, and the files each exercise's judge imported
+    are stored along with the judgments and on closing; changes to them do not trigger a write by themselves.
+    The imported files let changes to shared modules be traced back to the exercises that use them.
+
+    Changed judgments are written to the store in bulk, cache_delay seconds after the first change.
+    Must be used from the event loop's thread; only the judgment observers run on other threads (e.g., Flask's).
+    Checking the repository for changes (at startup and while writing) is done on a worker thread,
+    keeping the event loop responsive.
+    """
+
     __root: ContentNode
 
     __event_loop: asyncio.AbstractEventLoop
 
+    __store: JudgmentStore
+
+    # Set when a write has been scheduled
     __dirty: bool
 
-    def __init__(self, root: ContentNode, event_loop: asyncio.AbstractEventLoop):
+    # Exercises whose entry needs to be written
+    __changed: set[Exercise]
+
+    # Guards __dirty and __changed, which judgment observers update from other threads
+    __lock: threading.Lock
+
+    # Keeps writes and the startup check from overlapping while they wait for the repository to be checked
+    __writing: asyncio.Lock
+
+    __tracker: Optional[RepositoryTracker]
+
+    # State of the repository at the time of the last write (or as loaded from the cache)
+    __repository_state: Optional[RepositoryState]
+
+    # Exercises whose judgment might not correspond to __repository_state
+    __unverified: set[Exercise]
+
+    def __init__(self, root: ContentNode, event_loop: asyncio.AbstractEventLoop, store: Optional[JudgmentStore] = None):
         self.__root = root
         self.__event_loop = event_loop
+        self.__store = store or create_judgment_store()
         self.__dirty = False
+        self.__changed = set()
+        self.__lock = threading.Lock()
+        self.__writing = asyncio.Lock()
+        self.__tracker = RepositoryTracker.create(root.local_path)
+        self.__repository_state = None
+        self.__unverified = set()
 
         self.__load_cache(root)
         self.__observe_nodes(root)
 
     def __load_cache(self, root: ContentNode):
-        data = self.__load_cache_data()
+        data = self.__store.load()
+        self.__repository_state = data.repository
         for exercise in root.exercises:
             path = str(exercise.tree_path)
-            if path in data:
-                exercise.judgment = Judgment[data[path]]
-
-    def __load_cache_data(self) -> dict[str, str]:
-        path = settings.judgment_cache()
-        if path.is_file():
-            logging.info('Cache found; loading data')
-            with path.open() as file:
-                return json.load(file)
-        else:
-            logging.critical("BUG: This should never happen (but if it does, it's okay, we deal with the situation appropriately)")
-            logging.info('No cache found')
-            return {}
-
-    def write_cache(self):
-        logging.info("Writing judgment cache")
-        data = self.__collect_judgments()
-        self.__write_cache_data(data)
-        self.__dirty = False
+            if path in data.entries:
+                entry = data.entries[path]
+                exercise.judgment_fingerprint = entry.fingerprint
+                exercise.judgment = Judgment[entry.judgment]
+                if not entry.verified:
+                    self.__unverified.add(exercise)
+        get_failure_history().restore(self.__store.load_failed_tests())
+        dependencies = self.__store.load_dependencies()
+        for exercise in root.exercises:
+            files = dependencies.get(str(exercise.tree_path))
+            if files is not None:
+                get_dependency_tracker().restore(exercise.judge.identity, map(Path, files))
+
+    async def find_stale_exercises(self) -> list[Exercise]:
+        """
+        Finds the exercises that need to be judged at startup: those without a judgment
+        and those whose files changed since their judgment was cached.
+        If git cannot tell what changed, all exercises are considered stale.
+        """
+        async with self.__writing:
+            current_state, changed = await asyncio.to_thread(self.__find_changes)
+            if changed is None:
+                logging.info('Unable to determine changes since judgments were cached; all exercises are stale')
+                stale = list(self.__root.exercises)
+            else:
+                stale = [
+                    exercise
+                    for exercise in self.__root.exercises
+                    if exercise.judgment is Judgment.UNKNOWN or exercise in changed or exercise in self.__unverified
+                ]
+                logging.info(f'{len(changed)} exercises changed since judgments were cached; {len(stale)} are stale')
+            self.__repository_state = current_state
+            with self.__lock:
+                self.__changed.update(self.__unverified.symmetric_difference(stale))
+            self.__unverified = set(stale)
+            return stale
+
+    async def write_cache(self) -> None:
+        """
+        Writes all changes to the store. Called automatically after a change, but also needs to be called on shutdown.
+        """
+        async with self.__writing:
+            logging.info("Writing judgment cache")
+            # Changes coming in from here on schedule a new write
+            with self.__lock:
+                changed = self.__changed
+                self.__changed = set()
+                self.__dirty = False
+            try:
+                previously_unverified = self.__unverified
+                self.__repository_state, self.__unverified = await asyncio.to_thread(self.__verify)
+                changed.update(previously_unverified.symmetric_difference(self.__unverified))
+                updated, removed = self.__collect_changes(changed)
+                self.__store.save(updated, removed, self.__repository_state)
+                self.__save_judge_state()
+            except Exception:
+                # Keeps the changes for the next write
+                with self.__lock:
+                    self.__changed.update(changed)
+                raise
+
+    async def flush(self) -> None:
+        """
+        Writes pending changes, if any.
+        """
+        with self.__lock:
+            # Changes can also be left over from a failed write
+            pending = self.__dirty or bool(self.__changed)
+        if pending:
+            await self.write_cache()
+
+    async def close(self) -> None:
+        await self.flush()
+        self.__save_judge_state()
+        self.__store.close()
+
+    def __save_judge_state(self) -> None:
+        """
+        Saves the changes to the failure history and the dependencies.
+        """
+        self.__store.save_failed_tests(get_failure_history().take_changes())
+        changed_identities = get_dependency_tracker().take_changes()
+        self.__store.save_dependencies({
+            str(exercise.tree_path): sorted(str(file) for file in get_dependency_tracker().find(exercise.judge.identity))
+            for exercise in self.__root.exercises
+            if exercise.judge.identity in changed_identities
+        })
+
+    def __find_changes(self) -> tuple[Optional[RepositoryState], Optional[set[Exercise]]]:
+        """
+        Determines the current state of the repository and the exercises affected by changes since __repository_state.
+        """
+        current_state = self.__capture_repository_state()
+        return current_state, self.__find_changed_exercises(current_state)
+
+    def __capture_repository_state(self) -> Optional[RepositoryState]:
+        return self.__tracker.capture() if self.__tracker is not None else None
+
+    def __find_changed_exercises(self, current_state: Optional[RepositoryState]) -> Optional[set[Exercise]]:
+        """
+        Finds the exercises affected by changes since __repository_state, None if unknown.
+        """
+        if self.__tracker is None or self.__repository_state is None or current_state is None:
+            return None
+        if current_state == self.__repository_state:
+            return set()
+        changed_files = self.__tracker.find_changed_files(self.__repository_state)
+        if changed_files is None:
+            return None
+        index = ExerciseIndex(self.__root, get_dependency_tracker())
+        return {exercise for path in changed_files for exercise in index.find_affected_exercises(path)}
 
-    def __collect_judgments(self) -> dict[str, str]:
-        data = {}
-        for exercise in self.__root.exercises:
-            if exercise.judgment is not Judgment.UNKNOWN:
-                data[str(exercise.tree_path)] = str(exercise.judgment)
-        return data
+    def __verify(self) -> tuple[Optional[RepositoryState], set[Exercise]]:
+        """
+        Determines the current state of the repository and the exercises that are unverified with respect to it.
+        Exercises affected by changes since __repository_state are unverified,
+        until their fingerprint shows their judgment corresponds to their current files.
+        Runs on a worker thread, so it leaves the service's state alone.
+        """
+        current_state, changed = self.__find_changes()
+        if changed is None:
+            # Without a known state, all exercises will be judged at startup anyway
+            return current_state, set(self.__root.exercises)
+        unverified = {
+            exercise
+            for exercise in self.__unverified | changed
+            if exercise.judgment_fingerprint is None or exercise.judge.fingerprint() != exercise.judgment_fingerprint
+        }
+        return current_state, unverified
 
-    def __write_cache_data(self, data: dict[str, str]) -> None:
-        with settings.judgment_cache().open('w') as file:
-            json.dump(data, file, sort_keys=True, indent=4)
+    def __collect_changes(self, changed: set[Exercise]) -> tuple[dict[str, CacheEntry], list[str]]:
+        updated = {}
+        removed = []
+        for exercise in changed:
+            tree_path = str(exercise.tree_path)
+            if exercise.judgment is Judgment.UNKNOWN:
+                removed.append(tree_path)
+            else:
+                updated[tree_path] = CacheEntry(str(exercise.judgment), exercise.judgment_fingerprint, exercise not in self.__unverified)
+        return updated, removed
 
     def __observe_nodes(self, root: ContentNode) -> None:
-        def observer():
-            if not self.__dirty:
-                self.__dirty = True
-                self.__schedule_write()
+        def create_observer(exercise: Exercise):
+            def observer():
+                with self.__lock:
+                    self.__changed.add(exercise)
+                    schedule = not self.__dirty
+                    self.__dirty = True
+                if schedule:
+                    self.__schedule_write()
+            return observer
         for exercise in root.exercises:
-            exercise.observe_judgment(observer)
+            exercise.observe_judgment(create_observer(exercise))
 
     def __schedule_write(self) -> None:
         def write_after_delay():
             logging.info(f"Scheduling a cache write in {settings.cache_delay()}s")
-            self.__event_loop.call_later(settings.cache_delay(), self.write_cache)
+            self.__event_loop.call_later(settings.cache_delay(), lambda: self.__event_loop.create_task(self.flush()))
         self.__event_loop.call_soon_threadsafe(write_after_delay)
@@ -0,0 +1,82 @@
+import threading
+from pathlib import Path
+from typing import Hashable, Iterable
+
+
+class DependencyTracker:
+    """
+    Keeps track of the files each judge's last run imported, by judge identity,
+    along with a reverse index from files to the judges that depend on them.
+    Judges record their dependencies from the event loop; the tracker can be read from any thread.
+    The caching service takes care of persisting the dependencies.
+    """
+
+    __dependencies: dict[Hashable, frozenset[Path]]
+
+    __dependents: dict[Path, set[Hashable]]
+
+    # Identities whose dependencies changed since the last call to take_changes
+    __changed: set[Hashable]
+
+    __lock: threading.Lock
+
+    def __init__(self):
+        self.__dependencies = {}
+        self.__dependents = {}
+        self.__changed = set()
+        self.__lock = threading.Lock()
+
+    def record(self, identity: Hashable, files: Iterable[Path]) -> None:
+        """
+        Replaces the dependencies of the judge with the given identity.
+        """
+        with self.__lock:
+            if self.__replace(identity, frozenset(file.absolute() for file in files)):
+                self.__changed.add(identity)
+
+    def restore(self, identity: Hashable, files: Iterable[Path]) -> None:
+        """
+        Loads previously persisted dependencies; does not count as a change.
+        """
+        with self.__lock:
+            self.__replace(identity, frozenset(file.absolute() for file in files))
+
+    def find(self, identity: Hashable) -> frozenset[Path]:
+        with self.__lock:
+            return self.__dependencies.get(identity, frozenset())
+
+    def find_dependents(self, path: Path) -> set[Hashable]:
+        """
+        Returns the identities of the judges that depend on path or, if path is a directory, on a file inside it.
+        """
+        path = path.absolute()
+        with self.__lock:
+            if path in self.__dependents:
+                return set(self.__dependents[path])
+            return {identity for file, identities in self.__dependents.items() if file.is_relative_to(path) for identity in identities}
+
+    def take_changes(self) -> set[Hashable]:
+        with self.__lock:
+            changes = self.__changed
+            self.__changed = set()
+            return changes
+
+    def __replace(self, identity: Hashable, files: frozenset[Path]) -> bool:
+        previous = self.__dependencies.get(identity, frozenset())
+        if files == previous:
+            return False
+        for file in previous - files:
+            self.__dependents[file].discard(identity)
+            if not self.__dependents[file]:
+                del self.__dependents[file]
+        for file in files - previous:
+            self.__dependents.setdefault(file, set()).add(identity)
+        self.__dependencies[identity] = files
+        return True
+
+
+_dependency_tracker = DependencyTracker()
+
+
+def get_dependency_tracker() -> DependencyTracker:
+    return _dependency_tracker
@@ -0,0 +1,51 @@
+from pathlib import Path
+from typing import Hashable, Optional
+
+from progtool.content.tree import ContentNode, Exercise
+from progtool.judging.dependencies import DependencyTracker
+
+
+class ExerciseIndex:
+    """
+    Finds the exercises affected by changes to files.
+
+    A file belongs to the exercises whose local_path is the nearest directory containing it
+    that also contains exercises; exercises in subdirectories are not affected by it.
+    Given a dependency tracker, a file also belongs to the exercises whose judges imported it when last run,
+    which covers helper modules outside the exercises' directories.
+    """
+
+    # Exercises, by their absolute local path
+    __exercises: dict[Path, list[Exercise]]
+
+    __dependencies: Optional[DependencyTracker]
+
+    # Exercises, by identity of their judge
+    __exercises_by_identity: dict[Hashable, list[Exercise]]
+
+    def __init__(self, root: ContentNode, dependencies: Optional[DependencyTracker] = None):
+        self.__exercises = {}
+        self.__dependencies = dependencies
+        self.__exercises_by_identity = {}
+        for exercise in root.exercises:
+            self.__exercises.setdefault(exercise.local_path.absolute(), []).append(exercise)
+            self.__exercises_by_identity.setdefault(exercise.judge.identity, []).append(exercise)
+
+    def find_affected_exercises(self, path: Path) -> list[Exercise]:
+        """
+        Returns the exercises that a change to path can affect.
+        If path is a directory (e.g., one that has been removed), this includes all exercises inside it.
+        """
+        path = path.absolute()
+        affected: list[Exercise] = []
+        for directory in path.parents:
+            if directory in self.__exercises:
+                affected.extend(self.__exercises[directory])
+                break
+        for directory, exercises in self.__exercises.items():
+            if directory.is_relative_to(path):
+                affected.extend(exercises)
+        if self.__dependencies is not None:
+            for identity in self.__dependencies.find_dependents(path):
+                affected.extend(exercise for exercise in self.__exercises_by_identity.get(identity, []) if exercise not in affected)
+        return affected
@@ -6,6 +6,6 @@ from progtool.judging.pytest import PytestJudge
 
 def create_judge_from_metadata(path: Path, metadata: JudgeMetadata) -> Judge:
     if metadata.type == PytestJudge.ID:
-        return PytestJudge(path / metadata.file)
+        return PytestJudge(path / metadata.file, path, timeout=metadata.timeout)
     else:
         raise JudgeError(f'Unknown judge {metadata.type}')
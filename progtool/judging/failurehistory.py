@@ -0,0 +1,70 @@
+import threading
+
+
+class FailureHistory:
+    """
+    Remembers which tests of each test file failed, so that they can be run first next time.
+    As with pytest's --ff, a test is remembered from the moment it fails until it passes again;
+    tests that did not run (e.g., because of -x) or were skipped keep their status.
+
+    Test files are identified by their absolute path; tests by their node id without the file.
+    Judges record outcomes from the event loop; the history can be read from any thread.
+    The caching service takes care of persisting the history.
+    """
+
+    __failed: dict[str, list[str]]
+
+    # Test files whose failures changed since the last call to take_changes
+    __changed: set[str]
+
+    __lock: threading.Lock
+
+    def __init__(self):
+        self.__failed = {}
+        self.__changed = set()
+        self.__lock = threading.Lock()
+
+    def find(self, tests_path: str) -> list[str]:
+        with self.__lock:
+            return list(self.__failed.get(tests_path, []))
+
+    def record(self, tests_path: str, outcomes: dict[str, str]) -> None:
+        """
+        Updates the failures of a test file given the outcomes of the tests that ran, by test.
+        """
+        with self.__lock:
+            previous = self.__failed.get(tests_path, [])
+            failed = [test for test, outcome in outcomes.items() if outcome == 'failed']
+            # Tests skipped after an earlier failure (as in batches) did not really run
+            failed += [test for test in previous if outcomes.get(test) not in ('passed', 'failed')]
+            if failed == previous:
+                return
+            if failed:
+                self.__failed[tests_path] = failed
+            else:
+                del self.__failed[tests_path]
+            self.__changed.add(tests_path)
+
+    def restore(self, failed: dict[str, list[str]]) -> None:
+        """
+        Loads previously persisted failures; does not count as a change.
+        """
+        with self.__lock:
+            self.__failed.update({tests_path: list(tests) for tests_path, tests in failed.items() if tests})
+
+    def take_changes(self) -> dict[str, list[str]]:
+        """
+        Returns the current failures of all test files that changed since the previous call.
+        An empty list means the file no longer has failures.
+        """
+        with self.__lock:
+            changes = {tests_path: list(self.__failed.get(tests_path, [])) for tests_path in self.__changed}
+            self.__changed.clear()
+            return changes
+
+
+_failure_history = FailureHistory()
+
+
+def get_failure_history() -> FailureHistory:
+    return _failure_history
@@ -0,0 +1,296 @@
+import abc
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import struct
+from pathlib import Path
+from typing import Callable, Optional
+
+from progtool.judging.fingerprint import IGNORED_DIRECTORIES
+
+
+# Receives the paths of changed files and directories
+ChangeCallback = Callable[[list[Path]], None]
+
+# Called when a watcher can no longer report all changes, after it has stopped itself
+FailureCallback = Callable[[], None]
+
+
+class FileWatcherError(Exception):
+    pass
+
+
+class FileWatcher(abc.ABC):
+    """
+    Reports changes to the files in a directory tree, skipping IGNORED_DIRECTORIES.
+    Both start and stop must be called on the event loop that the callback should run on.
+    """
+
+    @abc.abstractmethod
+    def start(self, callback: ChangeCallback) -> None:
+        ...
+
+    @abc.abstractmethod
+    def stop(self) -> None:
+        ...
+
+
+def _is_ignored(name: str) -> bool:
+    return name in IGNORED_DIRECTORIES
+
+
+def _find_directories(root: Path) -> list[Path]:
+    directories = []
+    for directory, subdirectories, _ in os.walk(root):
+        subdirectories[:] = [subdirectory for subdirectory in subdirectories if not _is_ignored(subdirectory)]
+        directories.append(Path(directory))
+    return directories
+
+
+class InotifyWatcher(FileWatcher):
+    """
+    Relies on Linux's inotify, which requires a watch on every directory of the tree.
+    The number of watches is limited (see /proc/sys/fs/inotify/max_user_watches);
+    start raises a FileWatcherError if the tree does not fit, and on_failure is called if it outgrows the limit later on.
+    """
+
+    # Constants from <sys/inotify.h>
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+
+    # IN_MODIFY is left out: editors trigger it many times per save, IN_CLOSE_WRITE follows anyway
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    # struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+    EVENT_HEADER = struct.Struct('iIII')
+
+    __root: Path
+
+    __libc: ctypes.CDLL
+
+    __fd: Optional[int]
+
+    # Maps watch descriptors to the directory they watch
+    __directories: dict[int, Path]
+
+    __callback: Optional[ChangeCallback]
+
+    __on_failure: Optional[FailureCallback]
+
+    def __init__(self, root: Path, on_failure: Optional[FailureCallback] = None):
+        self.__root = root
+        self.__libc = InotifyWatcher.__load_libc()
+        self.__fd = None
+        self.__directories = {}
+        self.__callback = None
+        self.__on_failure = on_failure
+
+    @staticmethod
+    def is_supported() -> bool:
+        try:
+            InotifyWatcher.__load_libc()
+            return True
+        except FileWatcherError:
+            return False
+
+    @staticmethod
+    def __load_libc() -> ctypes.CDLL:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        except OSError as e:
+            raise FileWatcherError('Could not load the C library') from e
+        if not hasattr(libc, 'inotify_init1'):
+            raise FileWatcherError('inotify is not supported on this platform')
+        return libc
+
+    def start(self, callback: ChangeCallback) -> None:
+        fd = self.__libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise FileWatcherError(f'Could not initialize inotify: {os.strerror(ctypes.get_errno())}')
+        self.__fd = fd
+        self.__callback = callback
+        try:
+            self.__watch_tree(self.__root)
+        except FileWatcherError:
+            os.close(fd)
+            self.__fd = None
+            self.__directories.clear()
+            raise
+        logging.info(f'[File watcher] Watching {len(self.__directories)} directories in {self.__root} using inotify')
+        asyncio.get_running_loop().add_reader(fd, self.__read_events)
+
+    def stop(self) -> None:
+        if self.__fd is not None:
+            asyncio.get_running_loop().remove_reader(self.__fd)
+            os.close(self.__fd)
+            self.__fd = None
+            self.__directories.clear()
+
+    def __watch_tree(self, root: Path) -> None:
+        assert self.__fd is not None
+        for directory in _find_directories(root):
+            wd = self.__libc.inotify_add_watch(self.__fd, os.fsencode(directory), InotifyWatcher.MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error in (errno.ENOSPC, errno.ENOMEM):
+                    # The watch limit has been reached, so changes would go unnoticed
+                    raise FileWatcherError(f'Could not watch {directory}: {os.strerror(error)}')
+                # E.g., the directory was removed in the meantime
+                logging.error(f'[File watcher] Could not watch {directory}: {os.strerror(error)}')
+            else:
+                self.__directories[wd] = directory
+
+    def __read_events(self) -> None:
+        assert self.__fd is not None and self.__callback is not None
+        try:
+            data = os.read(self.__fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        changes: list[Path] = []
+        failed = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = InotifyWatcher.EVENT_HEADER.unpack_from(data, offset)
+            offset += InotifyWatcher.EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & InotifyWatcher.IN_Q_OVERFLOW:
+                logging.info('[File watcher] Events were lost; reporting everything as changed')
+                changes.append(self.__root)
+                continue
+            if mask & InotifyWatcher.IN_IGNORED:
+                self.__directories.pop(wd, None)
+                continue
+            directory = self.__directories.get(wd)
+            if directory is None or _is_ignored(name):
+                continue
+            path = directory / name
+            if mask & InotifyWatcher.IN_ISDIR and mask & (InotifyWatcher.IN_CREATE | InotifyWatcher.IN_MOVED_TO) and not failed:
+                try:
+                    self.__watch_tree(path)
+                except FileWatcherError as e:
+                    logging.error(f'[File watcher] {e}')
+                    failed = True
+            changes.append(path)
+
+        if failed and self.__on_failure is not None:
+            self.stop()
+        if changes:
+            self.__callback(changes)
+        if failed and self.__on_failure is not None:
+            self.__on_failure()
+
+
+class PollingWatcher(FileWatcher):
+    """
+    Periodically compares the modification times of all files, for platforms without inotify.
+    """
+
+    __root: Path
+
+    # Seconds between scans
+    __interval: float
+
+    __task: Optional[asyncio.Task[None]]
+
+    def __init__(self, root: Path, interval: float = 1):
+        self.__root = root
+        self.__interval = interval
+        self.__task = None
+
+    def start(self, callback: ChangeCallback) -> None:
+        logging.info(f'[File watcher] Watching {self.__root} by polling every {self.__interval}s')
+        self.__task = asyncio.get_running_loop().create_task(self.__poll(callback))
+
+    def stop(self) -> None:
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+
+    async def __poll(self, callback: ChangeCallback) -> None:
+        snapshot = await asyncio.to_thread(self.__scan)
+        while True:
+            await asyncio.sleep(self.__interval)
+            new_snapshot = await asyncio.to_thread(self.__scan)
+            changes = [
+                path
+                for path in snapshot.keys() | new_snapshot.keys()
+                if snapshot.get(path) != new_snapshot.get(path)
+            ]
+            snapshot = new_snapshot
+            if changes:
+                callback(changes)
+
+    def __scan(self) -> dict[Path, tuple[int, int]]:
+        """
+        Maps every file to its modification time and size.
+        """
+        snapshot = {}
+        for directory in _find_directories(self.__root):
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        snapshot[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    continue
+        return snapshot
+
+
+class FallbackWatcher(FileWatcher):
+    """
+    Uses inotify, switching to polling if inotify fails to watch the whole tree, e.g., because of the watch limit.
+    """
+
+    __root: Path
+
+    __watcher: Optional[FileWatcher]
+
+    def __init__(self, root: Path):
+        self.__root = root
+        self.__watcher = None
+
+    def start(self, callback: ChangeCallback) -> None:
+        watcher = InotifyWatcher(self.__root, on_failure=lambda: self.__fall_back(callback))
+        try:
+            watcher.start(callback)
+        except FileWatcherError as e:
+            logging.error(f'[File watcher] Could not use inotify: {e}')
+            self.__fall_back(callback)
+        else:
+            self.__watcher = watcher
+
+    def stop(self) -> None:
+        if self.__watcher is not None:
+            self.__watcher.stop()
+            self.__watcher = None
+
+    def __fall_back(self, callback: ChangeCallback) -> None:
+        logging.info('[File watcher] Falling back to polling')
+        self.__watcher = PollingWatcher(self.__root)
+        self.__watcher.start(callback)
+
+
+def create_file_watcher(root: Path) -> FileWatcher:
+    """
+    Uses inotify if available, and polling otherwise (or if inotify fails).
+    """
+    if InotifyWatcher.is_supported():
+        return FallbackWatcher(root)
+    else:
+        return PollingWatcher(root)
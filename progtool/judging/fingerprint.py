@@ -0,0 +1,49 @@
+import functools
+import hashlib
+import sys
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Iterable
+
+
+# Directories that never contain sources
+IGNORED_DIRECTORIES = frozenset(['__pycache__', '.pytest_cache', '.git'])
+
+
+@functools.cache
+def environment_fingerprint() -> str:
+    """
+    Describes the versions of the tools used for judging.
+    """
+    try:
+        pytest_version = version('pytest')
+    except PackageNotFoundError:
+        pytest_version = 'missing'
+    return f'python {sys.version} pytest {pytest_version}'
+
+
+def find_source_files(directory: Path) -> Iterable[Path]:
+    for path in directory.iterdir():
+        if path.is_dir():
+            if path.name not in IGNORED_DIRECTORIES:
+                yield from find_source_files(path)
+        elif path.suffix == '.py':
+            yield path
+
+
+def compute_fingerprint(directory: Path, extra_files: Iterable[Path] = ()) -> str:
+    """
+    Computes a hash of the environment, all Python files in directory and its subdirectories, and extra_files.
+    """
+    files = set(find_source_files(directory)) if directory.is_dir() else set()
+    files.update(extra_files)
+
+    hasher = hashlib.sha256(environment_fingerprint().encode())
+    for file in sorted(files):
+        if file.is_file():
+            contents = file.read_bytes()
+            hasher.update(f'\0{file}\0{len(contents)}\0'.encode())
+            hasher.update(contents)
+        else:
+            hasher.update(f'\0{file}\0missing\0'.encode())
+    return hasher.hexdigest()
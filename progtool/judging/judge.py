@@ -1,18 +1,59 @@
+from __future__ import annotations
+
 import abc
-from typing import Literal
+from typing import Hashable, Literal, Optional, Sequence
 
 import pydantic
 
+from progtool.judging.judgment import Judgment
+
 
 class Judge(abc.ABC):
+    __slots__ = ()
+
+    @abc.abstractmethod
+    async def judge(self, fingerprint: Optional[str] = None) -> Judgment:
+        """
+        Judges the exercise. Cancelling the call must stop all work it started, e.g., kill subprocesses.
+        fingerprint is the result of fingerprint() for the files being judged;
+        anything the judge keeps about the judgment (e.g., its output) is stored under it.
+        """
+        ...
+
+    @property
     @abc.abstractmethod
-    async def judge(self) -> bool:
+    def identity(self) -> Hashable:
+        """
+        Judges with equal identities are guaranteed to reach the same judgment,
+        allowing them to be judged only once.
+        """
         ...
 
+    @classmethod
+    async def judge_batch(cls, judges: Sequence[Judge], fingerprints: Optional[Sequence[Optional[str]]] = None) -> list[Judgment]:
+        """
+        Judges multiple exercises, all of which have a judge of this class, with the given fingerprints (see judge).
+        Subclasses can override this to share work between judgments; by default, the judges run one by one.
+        """
+        if fingerprints is None:
+            fingerprints = [None] * len(judges)
+        return [await judge.judge(fingerprint) for judge, fingerprint in zip(judges, fingerprints)]
+
+    def fingerprint(self) -> Optional[str]:
+        """
+        Computes a hash of everything the judgment depends on.
+        As long as the fingerprint remains the same, so does the judgment.
+        None means the judgment cannot be reused.
+        Can be called from any thread, including while the exercise is being judged.
+        """
+        return None
+
 
 class JudgeMetadata(pydantic.BaseModel):
     type: Literal['pytest']
     file: str
+    # Overrides the global judge_timeout setting
+    timeout: Optional[float] = None
 
 
 class JudgeError(Exception):
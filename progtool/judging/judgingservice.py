@@ -1,39 +1,338 @@
 import asyncio
+import itertools
 import logging
+from enum import Enum, IntEnum
+from typing import Hashable, Iterator, NamedTuple, Optional
 from progtool.content.tree import ContentNode, Exercise
-import json
 
+from progtool.judging.judge import Judge
 from progtool.judging.judgment import Judgment
 from progtool import settings
 
 
+class JudgingPriority(IntEnum):
+    # Lower values are judged first
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class JobState(Enum):
+    QUEUED = 0
+    RUNNING = 1
+    FINISHED = 2
+    # Queued behind a running batch it superseded, waiting for that batch to finish
+    WAITING = 3
+
+
+class PreviousJudgment(NamedTuple):
+    judgment: Judgment
+    fingerprint: Optional[str]
+
+
+class JudgingJob:
+    """
+    Judges all exercises whose judges share the same identity, e.g., the same test file.
+    """
+
+    __identity: Hashable
+
+    __exercises: list[Exercise]
+
+    # Judgments the exercises had when they were submitted
+    __previous_judgments: dict[Exercise, PreviousJudgment]
+
+    priority: JudgingPriority
+
+    state: JobState
+
+    # Task running the job; jobs judged in the same batch share the same task
+    task: Optional[asyncio.Task[list[tuple[Judgment, Optional[str]]]]]
+
+    # Whether the task can be cancelled without affecting other jobs
+    cancellable: bool
+
+    def __init__(self, identity: Hashable, priority: JudgingPriority):
+        self.__identity = identity
+        self.__exercises = []
+        self.__previous_judgments = {}
+        self.priority = priority
+        self.state = JobState.QUEUED
+        self.task = None
+        self.cancellable = False
+
+    @property
+    def identity(self) -> Hashable:
+        return self.__identity
+
+    @property
+    def exercises(self) -> list[Exercise]:
+        return self.__exercises
+
+    @property
+    def judge(self) -> Judge:
+        return self.__exercises[0].judge
+
+    @property
+    def previous_judgments(self) -> dict[Exercise, PreviousJudgment]:
+        return self.__previous_judgments
+
+    def attach(self, exercise: Exercise, previous_judgment: PreviousJudgment) -> None:
+        if exercise not in self.__exercises:
+            self.__exercises.append(exercise)
+            self.__previous_judgments[exercise] = previous_judgment
+
+    def describe(self) -> str:
+        exercise, *others = self.__exercises
+        if others:
+            return f'{exercise.tree_path} (shared by {", ".join(str(other.tree_path) for other in others)})'
+        else:
+            return str(exercise.tree_path)
+
+    def find_reusable_judgment(self, fingerprint: Optional[str]) -> Optional[Judgment]:
+        """
+        Returns the previous judgment if it is known for all exercises and was reached with the same fingerprint.
+        """
+        if fingerprint is None:
+            return None
+        judgments = set()
+        for previous in self.__previous_judgments.values():
+            # Timeouts also depend on the machine's load and the timeout settings
+            if previous.fingerprint != fingerprint or previous.judgment in (Judgment.UNKNOWN, Judgment.TIMEOUT):
+                return None
+            judgments.add(previous.judgment)
+        return judgments.pop() if len(judgments) == 1 else None
+
+
 class JudgingService:
+    """
+    Judges exercises on the event loop using a fixed number of workers,
+    so that at most that many judges (e.g., pytest processes) run at the same time.
+
+    Requests are coalesced per judge identity: a request for an exercise that is already queued
+    (or that shares its test file with a queued exercise) joins the queued job.
+    An interactive request for an exercise that is being judged cancels the running judge and starts over,
+    as the files might have changed since; a background request simply waits for the running judge.
+
+    Workers take up to batch_size queued jobs at once, which are then judged together (see Judge.judge_batch).
+    A batch can be superseded, but is not cancelled; the new request is judged once the batch is done,
+    and the batch's outcome for the superseded job is discarded.
+
+    Judges are only run if their fingerprint differs from the one recorded with the exercise's current judgment;
+    otherwise, the current judgment is kept.
+    Interactive requests reset the judgment to UNKNOWN while waiting;
+    background requests leave it in place until a new judgment is reached.
+    """
+
     __event_loop: asyncio.AbstractEventLoop
 
-    def __init__(self, event_loop: asyncio.AbstractEventLoop):
+    __worker_count: int
+
+    # Maximum number of jobs judged together
+    __batch_size: int
+
+    # Entries are (priority, sequence number, job); the sequence number keeps requests with equal priority in FIFO order
+    # Raising a job's priority enqueues it a second time; the stale entry is skipped when dequeued
+    __queue: asyncio.PriorityQueue[tuple[int, int, JudgingJob]]
+
+    __sequence_numbers: Iterator[int]
+
+    # Queued and running jobs, by judge identity
+    __jobs: dict[Hashable, JudgingJob]
+
+    __queued: int
+
+    __in_flight: int
+
+    def __init__(self, event_loop: asyncio.AbstractEventLoop, worker_count: Optional[int] = None, batch_size: Optional[int] = None):
         self.__event_loop = event_loop
+        self.__worker_count = worker_count or settings.judge_workers()
+        self.__batch_size = batch_size or settings.judge_batch_size()
+        self.__queue = asyncio.PriorityQueue()
+        self.__sequence_numbers = itertools.count()
+        self.__jobs = {}
+        self.__queued = 0
+        self.__in_flight = 0
+
+        logging.info(f'Starting {self.__worker_count} judging workers')
+        def start_workers():
+            for _ in range(self.__worker_count):
+                self.__event_loop.create_task(self.__work())
+        self.__event_loop.call_soon_threadsafe(start_workers)
+
+    @property
+    def worker_count(self) -> int:
+        return self.__worker_count
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Number of judging jobs waiting for a worker.
+        """
+        return self.__queued
 
-    def judge(self, exercise: Exercise) -> None:
-        async def perform_judging():
-            logging.info(f'Judging {exercise.tree_path}')
-            judge_result = await exercise.judge.judge()
-            judgment = Judgment.PASS if judge_result else Judgment.FAIL
-            logging.info(f'{exercise.tree_path} was judged {judgment}')
-            exercise.judgment = judgment
+    @property
+    def in_flight(self) -> int:
+        """
+        Number of judging jobs currently running.
+        """
+        return self.__in_flight
 
-        logging.info(f'Enqueueing judgment request for {exercise.tree_path}')
-        exercise.judgment = Judgment.UNKNOWN
-        self.__event_loop.call_soon_threadsafe(lambda: self.__event_loop.create_task(perform_judging()))
+    def judge(self, exercise: Exercise, priority: JudgingPriority = JudgingPriority.INTERACTIVE) -> None:
+        logging.info(f'Enqueueing judgment request for {exercise.tree_path} with priority {priority.name}')
+        previous_judgment = PreviousJudgment(exercise.judgment, exercise.judgment_fingerprint)
+        if priority is JudgingPriority.INTERACTIVE:
+            exercise.judgment = Judgment.UNKNOWN
+        self.__event_loop.call_soon_threadsafe(self.__submit, exercise, priority, previous_judgment)
 
-    def judge_recursively(self, content_node: ContentNode, only_unknown=False) -> None:
+    def judge_recursively(self, content_node: ContentNode, only_unknown=False, priority: JudgingPriority = JudgingPriority.INTERACTIVE) -> None:
         for exercise in content_node.exercises:
             if not only_unknown or exercise.judgment is Judgment.UNKNOWN:
-                self.judge(exercise)
-
-    def write_cache(self, root: ContentNode) -> None:
-        cache = {}
-        for exercise in root.exercises:
-            if exercise.judgment != Judgment.UNKNOWN:
-                cache[str(exercise.tree_path)] = str(exercise.judgment)
-        with settings.judgment_cache().open('w') as file:
-            json.dump(cache, file)
+                self.judge(exercise, priority)
+
+    def __submit(self, exercise: Exercise, priority: JudgingPriority, previous_judgment: PreviousJudgment) -> None:
+        identity = exercise.judge.identity
+        job = self.__jobs.get(identity)
+
+        if job is None:
+            job = JudgingJob(identity, priority)
+            job.attach(exercise, previous_judgment)
+            self.__enqueue(job)
+        elif job.state in (JobState.QUEUED, JobState.WAITING):
+            logging.info(f'Coalescing judgment request for {exercise.tree_path} with queued job')
+            job.attach(exercise, previous_judgment)
+            if priority < job.priority:
+                job.priority = priority
+                self.__put(job)
+        elif priority is JudgingPriority.INTERACTIVE:
+            logging.info(f'Superseding running judgment of {exercise.tree_path}')
+            job.attach(exercise, previous_judgment)
+            assert job.task is not None, 'BUG: running jobs should have a task'
+            successor = JudgingJob(identity, priority)
+            for other in job.exercises:
+                successor.attach(other, job.previous_judgments[other])
+            if job.cancellable:
+                job.task.cancel()
+                self.__enqueue(successor)
+            else:
+                # Running the successor alongside the batch would have them judge the same files at the same time
+                logging.info(f'Judging {exercise.tree_path} again once its batch is done')
+                successor.state = JobState.WAITING
+                self.__enqueue(successor)
+                job.task.add_done_callback(lambda _: self.__release(successor))
+        else:
+            logging.info(f'Attaching judgment request for {exercise.tree_path} to running job')
+            job.attach(exercise, previous_judgment)
+
+    def __enqueue(self, job: JudgingJob) -> None:
+        self.__jobs[job.identity] = job
+        self.__queued += 1
+        self.__put(job)
+
+    def __put(self, job: JudgingJob) -> None:
+        # Waiting jobs are put in the queue when released
+        if job.state is JobState.QUEUED:
+            self.__queue.put_nowait((job.priority.value, next(self.__sequence_numbers), job))
+
+    def __release(self, job: JudgingJob) -> None:
+        job.state = JobState.QUEUED
+        self.__put(job)
+
+    async def __work(self) -> None:
+        while True:
+            entry = await self.__queue.get()
+            try:
+                if self.__is_current(entry):
+                    _, _, job = entry
+                    await self.__run([job, *self.__take_batch_partners(job)])
+            except Exception as e:
+                logging.error(f'Error occurred while judging: {e}')
+            finally:
+                self.__queue.task_done()
+
+    def __is_current(self, entry: tuple[int, int, JudgingJob]) -> bool:
+        priority, _, job = entry
+        return job.state is JobState.QUEUED and priority == job.priority.value
+
+    def __take_batch_partners(self, job: JudgingJob) -> list[JudgingJob]:
+        """
+        Takes queued jobs that can be judged along with job, i.e., that have the same priority and kind of judge.
+        """
+        partners: list[JudgingJob] = []
+        postponed = []
+        while len(partners) + 1 < self.__batch_size and not self.__queue.empty():
+            entry = self.__queue.get_nowait()
+            self.__queue.task_done()
+            priority, _, other = entry
+            if not self.__is_current(entry):
+                continue
+            if priority != job.priority.value:
+                # Entries come out in order of priority, so no more partners can be found
+                postponed.append(entry)
+                break
+            if type(other.judge) is type(job.judge):
+                partners.append(other)
+            else:
+                postponed.append(entry)
+        for entry in postponed:
+            self.__queue.put_nowait(entry)
+        return partners
+
+    async def __run(self, jobs: list[JudgingJob]) -> None:
+        self.__queued -= len(jobs)
+        self.__in_flight += len(jobs)
+        # The judge runs in a task of its own so that it can be cancelled without affecting the worker
+        task = self.__event_loop.create_task(self.__perform_judging(jobs))
+        for job in jobs:
+            job.state = JobState.RUNNING
+            job.task = task
+            # Cancelling a batch would also throw away the work done for the other jobs
+            job.cancellable = len(jobs) == 1
+        try:
+            try:
+                results = await task
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    # The worker itself is being cancelled
+                    raise
+                logging.info(f'Judging {jobs[0].identity} was superseded')
+                return
+            for job, (judgment, fingerprint) in zip(jobs, results):
+                if self.__jobs.get(job.identity) is not job:
+                    logging.info(f'Discarding judgment of {job.describe()}, which was superseded')
+                    continue
+                for exercise in job.exercises:
+                    exercise.judgment_fingerprint = fingerprint
+                    exercise.judgment = judgment
+        finally:
+            for job in jobs:
+                job.state = JobState.FINISHED
+                self.__in_flight -= 1
+                if self.__jobs.get(job.identity) is job:
+                    del self.__jobs[job.identity]
+
+    async def __perform_judging(self, jobs: list[JudgingJob]) -> list[tuple[Judgment, Optional[str]]]:
+        # Computing fingerprints reads all source files, so it is kept off the event loop
+        fingerprints = await asyncio.to_thread(lambda: [job.judge.fingerprint() for job in jobs])
+        judgments: list[Optional[Judgment]] = []
+        for job, fingerprint in zip(jobs, fingerprints):
+            reusable_judgment = job.find_reusable_judgment(fingerprint)
+            if reusable_judgment is not None:
+                logging.info(f'{job.describe()} is unchanged; keeping judgment {reusable_judgment}')
+            judgments.append(reusable_judgment)
+
+        pending = [index for index, judgment in enumerate(judgments) if judgment is None]
+        if pending:
+            for index in pending:
+                logging.info(f'Judging {jobs[index].describe()}')
+            if len(pending) > 1:
+                logging.info(f'Judging {len(pending)} exercises in a single batch')
+            pending_judgments = await type(jobs[0].judge).judge_batch([jobs[index].judge for index in pending], [fingerprints[index] for index in pending])
+            for index, pending_judgment in zip(pending, pending_judgments):
+                logging.info(f'{jobs[index].describe()} was judged {pending_judgment}')
+                judgments[index] = pending_judgment
+
+        results = []
+        for judgment, fingerprint in zip(judgments, fingerprints):
+            assert judgment is not None, 'BUG: all jobs should have been judged'
+            results.append((judgment, fingerprint))
+        return results
@@ -5,6 +5,7 @@ class Judgment(Enum):
     UNKNOWN = 0
     PASS = 1
     FAIL = -1
+    TIMEOUT = -2
 
     def __str__(self):
         return self.name
@@ -0,0 +1,322 @@
+import abc
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, Literal, NamedTuple, Optional
+
+from progtool import settings
+from progtool.judging.repositorystate import RepositoryState
+
+
+JudgmentStoreType = Literal['json', 'sqlite']
+
+
+class CacheEntry(NamedTuple):
+    judgment: str
+    fingerprint: Optional[str]
+    # False if the exercise's files might have changed after it was judged
+    verified: bool = True
+
+
+class CacheData(NamedTuple):
+    # Entries, by tree path
+    entries: dict[str, CacheEntry]
+    # State of the repository the verified entries correspond to
+    repository: Optional[RepositoryState]
+
+
+class HistoryEntry(NamedTuple):
+    judgment: str
+    # Seconds since the epoch
+    timestamp: float
+
+
+class JudgmentStoreError(Exception):
+    pass
+
+
+class JudgmentStore(abc.ABC):
+    """
+    Persists judgments between runs.
+    """
+
+    @property
+    @abc.abstractmethod
+    def path(self) -> Path:
+        ...
+
+    @abc.abstractmethod
+    def load(self) -> CacheData:
+        ...
+
+    @abc.abstractmethod
+    def save(self, updated: dict[str, CacheEntry], removed: Iterable[str], repository: Optional[RepositoryState]) -> None:
+        """
+        Updates the given entries, removes others and records the repository state; all other entries remain as they are.
+        """
+        ...
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        ...
+
+    def history(self, tree_path: str) -> list[HistoryEntry]:
+        """
+        Lists the judgments an exercise has received, oldest first.
+        Stores that do not keep history return an empty list.
+        """
+        return []
+
+    def load_failed_tests(self) -> dict[str, list[str]]:
+        """
+        Returns the failed tests recorded by save_failed_tests, by test file (see FailureHistory).
+        Stores that do not keep failed tests return an empty dictionary.
+        """
+        return {}
+
+    def save_failed_tests(self, failed_tests: dict[str, list[str]]) -> None:
+        """
+        Replaces the failed tests of the given test files; an empty list removes a test file.
+        """
+        pass
+
+    def load_dependencies(self) -> dict[str, list[str]]:
+        """
+        Returns the files that exercises' judges imported, by tree path (see DependencyTracker).
+        Stores that do not keep dependencies return an empty dictionary.
+        """
+        return {}
+
+    def save_dependencies(self, dependencies: dict[str, list[str]]) -> None:
+        """
+        Replaces the dependencies of the given exercises.
+        """
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class JsonJudgmentStore(JudgmentStore):
+    """
+    Keeps all judgments in a single JSON file, which is rewritten on every save.
+    """
+
+    __path: Path
+
+    # Contents of the file, loaded on first use
+    __data: Optional[CacheData]
+
+    def __init__(self, path: Path):
+        self.__path = path
+        self.__data = None
+
+    @property
+    def path(self) -> Path:
+        return self.__path
+
+    def load(self) -> CacheData:
+        if self.__data is None:
+            self.__data = self.__read()
+        return CacheData(dict(self.__data.entries), self.__data.repository)
+
+    def save(self, updated: dict[str, CacheEntry], removed: Iterable[str], repository: Optional[RepositoryState]) -> None:
+        entries = self.load().entries
+        entries.update(updated)
+        for tree_path in removed:
+            entries.pop(tree_path, None)
+        self.__data = CacheData(entries, repository)
+        self.__write(self.__data)
+
+    def clear(self) -> None:
+        self.__data = CacheData({}, None)
+        self.__write(self.__data)
+
+    def __read(self) -> CacheData:
+        if self.__path.is_file():
+            logging.info('Cache found; loading data')
+            with self.__path.open() as file:
+                data = json.load(file) or {}
+            # Older caches map tree paths directly to judgments
+            if isinstance(data.get('judgments'), dict):
+                entries = {
+                    tree_path: CacheEntry(entry['judgment'], entry.get('fingerprint'), entry.get('verified', True))
+                    for tree_path, entry in data['judgments'].items()
+                }
+                repository = data.get('repository')
+                return CacheData(entries, RepositoryState(repository['head'], repository['dirty']) if repository else None)
+            else:
+                logging.info('Cache has old format; judgments will be rechecked')
+                return CacheData({tree_path: CacheEntry(judgment, None) for tree_path, judgment in data.items()}, None)
+        else:
+            logging.info('No cache found')
+            return CacheData({}, None)
+
+    def __write(self, data: CacheData) -> None:
+        judgments = {tree_path: entry._asdict() for tree_path, entry in data.entries.items()}
+        repository = data.repository._asdict() if data.repository is not None else None
+        with self.__path.open('w') as file:
+            json.dump({'judgments': judgments, 'repository': repository}, file, sort_keys=True, indent=4)
+
+
+class SqliteJudgmentStore(JudgmentStore):
+    """
+    Keeps judgments in an SQLite database, so that saving only touches the entries that changed.
+    Every change of judgment is also recorded in a history table.
+
+    On first use, the contents of the legacy JSON cache (if any) are imported.
+    The connection must only be used from the thread that created the store.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS judgments (
+            tree_path TEXT PRIMARY KEY,
+            judgment TEXT NOT NULL,
+            fingerprint TEXT,
+            verified INTEGER NOT NULL,
+            timestamp REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS history (
+            tree_path TEXT NOT NULL,
+            judgment TEXT NOT NULL,
+            timestamp REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS history_by_tree_path ON history (tree_path, timestamp);
+        CREATE TABLE IF NOT EXISTS failed_tests (
+            tests_path TEXT PRIMARY KEY,
+            tests TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS dependencies (
+            tree_path TEXT PRIMARY KEY,
+            files TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS properties (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    '''
+
+    __path: Path
+
+    __connection: sqlite3.Connection
+
+    def __init__(self, path: Path, legacy_path: Optional[Path] = None):
+        self.__path = path
+        try:
+            self.__connection = sqlite3.connect(path)
+            # Write-ahead logging makes commits cheap and lets readers (e.g., progtool cache) in while the server writes
+            self.__connection.execute('PRAGMA journal_mode=WAL')
+            self.__connection.execute('PRAGMA synchronous=NORMAL')
+            self.__connection.executescript(SqliteJudgmentStore.SCHEMA)
+        except sqlite3.Error as e:
+            raise JudgmentStoreError(f'Could not open judgment database {path}: {e}') from e
+        if legacy_path is not None and self.__get_property('migrated') is None:
+            self.__migrate(legacy_path)
+
+    @property
+    def path(self) -> Path:
+        return self.__path
+
+    def load(self) -> CacheData:
+        rows = self.__connection.execute('SELECT tree_path, judgment, fingerprint, verified FROM judgments')
+        entries = {
+            tree_path: CacheEntry(judgment, fingerprint, bool(verified))
+            for tree_path, judgment, fingerprint, verified in rows
+        }
+        repository = self.__get_property('repository')
+        return CacheData(entries, RepositoryState(**json.loads(repository)) if repository else None)
+
+    def save(self, updated: dict[str, CacheEntry], removed: Iterable[str], repository: Optional[RepositoryState]) -> None:
+        timestamp = time.time()
+        with self.__connection:
+            # History only records actual changes of judgment
+            self.__connection.executemany(
+                '''
+                INSERT INTO history (tree_path, judgment, timestamp)
+                SELECT :tree_path, :judgment, :timestamp
+                WHERE NOT EXISTS (SELECT 1 FROM judgments WHERE tree_path = :tree_path AND judgment = :judgment)
+                ''',
+                [{'tree_path': tree_path, 'judgment': entry.judgment, 'timestamp': timestamp} for tree_path, entry in updated.items()],
+            )
+            self.__connection.executemany(
+                '''
+                INSERT INTO judgments (tree_path, judgment, fingerprint, verified, timestamp) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (tree_path) DO UPDATE SET
+                    judgment = excluded.judgment,
+                    fingerprint = excluded.fingerprint,
+                    verified = excluded.verified,
+                    timestamp = excluded.timestamp
+                ''',
+                [(tree_path, entry.judgment, entry.fingerprint, entry.verified, timestamp) for tree_path, entry in updated.items()],
+            )
+            self.__connection.executemany('DELETE FROM judgments WHERE tree_path = ?', [(tree_path,) for tree_path in removed])
+            self.__set_property('repository', json.dumps(repository._asdict()) if repository is not None else None)
+
+    def clear(self) -> None:
+        with self.__connection:
+            self.__connection.execute('DELETE FROM judgments')
+            self.__connection.execute('DELETE FROM history')
+            self.__connection.execute('DELETE FROM failed_tests')
+            self.__connection.execute('DELETE FROM dependencies')
+            self.__set_property('repository', None)
+
+    def history(self, tree_path: str) -> list[HistoryEntry]:
+        rows = self.__connection.execute('SELECT judgment, timestamp FROM history WHERE tree_path = ? ORDER BY timestamp', (tree_path,))
+        return [HistoryEntry(judgment, timestamp) for judgment, timestamp in rows]
+
+    def load_failed_tests(self) -> dict[str, list[str]]:
+        rows = self.__connection.execute('SELECT tests_path, tests FROM failed_tests')
+        return {tests_path: json.loads(tests) for tests_path, tests in rows}
+
+    def save_failed_tests(self, failed_tests: dict[str, list[str]]) -> None:
+        with self.__connection:
+            self.__connection.executemany(
+                'INSERT OR REPLACE INTO failed_tests (tests_path, tests) VALUES (?, ?)',
+                [(tests_path, json.dumps(tests)) for tests_path, tests in failed_tests.items() if tests],
+            )
+            self.__connection.executemany(
+                'DELETE FROM failed_tests WHERE tests_path = ?',
+                [(tests_path,) for tests_path, tests in failed_tests.items() if not tests],
+            )
+
+    def load_dependencies(self) -> dict[str, list[str]]:
+        rows = self.__connection.execute('SELECT tree_path, files FROM dependencies')
+        return {tree_path: json.loads(files) for tree_path, files in rows}
+
+    def save_dependencies(self, dependencies: dict[str, list[str]]) -> None:
+        with self.__connection:
+            self.__connection.executemany(
+                'INSERT OR REPLACE INTO dependencies (tree_path, files) VALUES (?, ?)',
+                [(tree_path, json.dumps(files)) for tree_path, files in dependencies.items()],
+            )
+
+    def close(self) -> None:
+        self.__connection.close()
+
+    def __migrate(self, legacy_path: Path) -> None:
+        data = JsonJudgmentStore(legacy_path).load()
+        if data.entries:
+            logging.info(f'Importing {len(data.entries)} judgments from {legacy_path}')
+        self.save(data.entries, [], data.repository)
+        with self.__connection:
+            self.__set_property('migrated', str(legacy_path))
+
+    def __get_property(self, key: str) -> Optional[str]:
+        row = self.__connection.execute('SELECT value FROM properties WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def __set_property(self, key: str, value: Optional[str]) -> None:
+        if value is None:
+            self.__connection.execute('DELETE FROM properties WHERE key = ?', (key,))
+        else:
+            self.__connection.execute('INSERT OR REPLACE INTO properties (key, value) VALUES (?, ?)', (key, value))
+
+
+def create_judgment_store() -> JudgmentStore:
+    match settings.judgment_store():
+        case 'json':
+            return JsonJudgmentStore(settings.judgment_cache())
+        case 'sqlite':
+            return SqliteJudgmentStore(settings.judgment_database(), legacy_path=settings.legacy_judgment_cache())
@@ -0,0 +1,101 @@
+import collections
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Hashable, Optional
+
+from progtool import settings
+
+
+# Multiple of the in-memory capacity that is kept on disk
+SPILL_FACTOR = 10
+
+
+class OutputStore:
+    """
+    Keeps the output of the most recent judge runs, by judge identity and fingerprint of the judged files.
+    Outputs that no longer fit in memory are moved to the spill directory, if there is one,
+    which in turn keeps up to SPILL_FACTOR times as many outputs.
+    Judges store outputs from the event loop; outputs can be looked up from any thread.
+    """
+
+    __capacity: int
+
+    __spill_directory: Optional[Path]
+
+    # Least recently used first
+    __outputs: collections.OrderedDict[tuple[Hashable, Optional[str]], str]
+
+    __lock: threading.Lock
+
+    def __init__(self, capacity: int, spill_directory: Optional[Path] = None):
+        self.__capacity = capacity
+        self.__spill_directory = spill_directory
+        self.__outputs = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def store(self, identity: Hashable, fingerprint: Optional[str], output: str) -> None:
+        key = (identity, fingerprint)
+        with self.__lock:
+            self.__outputs[key] = output
+            self.__outputs.move_to_end(key)
+            while len(self.__outputs) > self.__capacity:
+                evicted_key, evicted_output = self.__outputs.popitem(last=False)
+                self.__spill(evicted_key, evicted_output)
+
+    def find(self, identity: Hashable, fingerprint: Optional[str]) -> Optional[str]:
+        """
+        Returns the output of the run of the given judge on files with the given fingerprint, None if it is not available.
+        """
+        key = (identity, fingerprint)
+        with self.__lock:
+            output = self.__outputs.get(key)
+            if output is not None:
+                self.__outputs.move_to_end(key)
+                return output
+            return self.__read_spilled(key)
+
+    def __spill(self, key: tuple[Hashable, Optional[str]], output: str) -> None:
+        if self.__spill_directory is None:
+            return
+        try:
+            self.__spill_directory.mkdir(parents=True, exist_ok=True)
+            self.__path_of(self.__spill_directory, key).write_text(output)
+            self.__prune(self.__spill_directory)
+        except OSError as e:
+            logging.error(f'[Output store] Failed to spill output to {self.__spill_directory}: {e}')
+
+    def __read_spilled(self, key: tuple[Hashable, Optional[str]]) -> Optional[str]:
+        if self.__spill_directory is None:
+            return None
+        path = self.__path_of(self.__spill_directory, key)
+        try:
+            return path.read_text()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logging.error(f'[Output store] Failed to read spilled output {path}: {e}')
+            return None
+
+    def __prune(self, directory: Path) -> None:
+        """
+        Removes the oldest spilled outputs beyond SPILL_FACTOR times the capacity.
+        """
+        paths = sorted(directory.glob('*.txt'), key=lambda path: path.stat().st_mtime)
+        for path in paths[:max(0, len(paths) - self.__capacity * SPILL_FACTOR)]:
+            path.unlink(missing_ok=True)
+
+    @staticmethod
+    def __path_of(directory: Path, key: tuple[Hashable, Optional[str]]) -> Path:
+        return directory / f'{hashlib.sha256(repr(key).encode()).hexdigest()}.txt'
+
+
+_output_store: Optional[OutputStore] = None
+
+
+def get_output_store() -> OutputStore:
+    global _output_store
+    if _output_store is None:
+        _output_store = OutputStore(settings.judge_output_cache_size(), settings.judge_output_directory())
+    return _output_store
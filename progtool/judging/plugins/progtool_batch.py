@@ -0,0 +1,189 @@
+# Pytest plugin that allows judging many exercises in a single pytest session.
+# Loaded using -p progtool_batch; progtool puts this directory on PYTHONPATH.
+#
+# * Each test file is judged separately: once a test in a file fails, the remaining tests in that file are skipped,
+#   mimicking pytest -x for every file individually.
+# * Test files and the modules they import often have the same names across exercises (tests.py, student.py, ...).
+#   To keep exercises apart, modules loaded from an exercise's directory are only present in sys.modules
+#   while that exercise's tests are collected or run.
+# * Run with --continue-on-collection-errors, as otherwise a single broken exercise prevents all tests from running.
+# * With --progtool-report PATH, the outcome of every test file is appended to PATH as soon as it is known,
+#   as a line containing a JSON object {"file": absolute path of test file, "outcome": "passed" | "failed" | "timeout"}.
+#   As with pytest's exit code, a file fails if it cannot be collected, contains no tests or has a failing test.
+# * With --progtool-timeout SECONDS, the session is ended as soon as collecting or running a single test file
+#   takes longer than SECONDS. The file is reported to have timed out; files that did not get to run get no outcome.
+#
+# This module must not import progtool, as it is loaded in the pytest process.
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+import pytest
+
+
+# Exit code used when a test file times out
+TIMEOUT_EXIT_CODE = 124
+
+
+def pytest_addoption(parser: Any) -> None:
+    parser.addoption('--progtool-report', default=None, help='File to write outcomes per test file to')
+    parser.addoption('--progtool-timeout', default=None, type=float, help='Maximum number of seconds per test file')
+
+
+def pytest_configure(config: Any) -> None:
+    report = Report(config.getoption('--progtool-report'))
+    timeout = config.getoption('--progtool-timeout')
+    watchdog = Watchdog(timeout, report) if timeout is not None else None
+    config.pluginmanager.register(BatchPlugin(report, watchdog), 'progtool-batch')
+
+
+class Report:
+    def __init__(self, path: Optional[str]):
+        self.file = open(path, 'a') if path is not None else None
+        self.lock = threading.Lock()
+
+    def write(self, path: str, outcome: str) -> None:
+        if self.file is None:
+            return
+        with self.lock:
+            self.file.write(json.dumps({'file': path, 'outcome': outcome}) + '\n')
+            self.file.flush()
+
+
+class Watchdog:
+    """
+    Ends the process if a test file takes too long.
+    Runs on a thread of its own, as the main thread could be stuck in an infinite loop.
+    """
+
+    def __init__(self, timeout: float, report: Report):
+        self.timeout = timeout
+        self.report = report
+        self.lock = threading.Lock()
+        self.current: Optional[str] = None
+        self.deadline = 0.0
+        threading.Thread(target=self.watch, daemon=True, name='progtool-watchdog').start()
+
+    def start(self, path: str) -> None:
+        with self.lock:
+            if self.current != path:
+                self.current = path
+                self.deadline = time.monotonic() + self.timeout
+
+    def stop(self) -> None:
+        with self.lock:
+            self.current = None
+
+    def watch(self) -> None:
+        while True:
+            time.sleep(0.05)
+            with self.lock:
+                if self.current is not None and time.monotonic() > self.deadline:
+                    self.report.write(self.current, 'timeout')
+                    os._exit(TIMEOUT_EXIT_CODE)
+
+
+class ExerciseModules:
+    """
+    Keeps track of the modules loaded from an exercise's directory.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.modules: dict[str, Any] = {}
+
+    def __enter__(self) -> None:
+        directory = str(self.directory)
+        if directory in sys.path:
+            sys.path.remove(directory)
+        sys.path.insert(0, directory)
+        sys.modules.update(self.modules)
+
+    def __exit__(self, *args: Any) -> None:
+        for name, module in list(sys.modules.items()):
+            if self.__is_local(module):
+                self.modules[name] = module
+                del sys.modules[name]
+
+    def __is_local(self, module: Any) -> bool:
+        file: Optional[str] = getattr(module, '__file__', None)
+        if file is None:
+            return False
+        return os.path.abspath(file).startswith(str(self.directory) + os.sep)
+
+
+class BatchPlugin:
+    def __init__(self, report: Report, watchdog: Optional[Watchdog]):
+        self.report = report
+        self.watchdog = watchdog
+        self.exercises: dict[Path, ExerciseModules] = {}
+        # Number of tests per test file
+        self.test_counts: dict[str, int] = {}
+        # Test files containing a failed test or that failed to be collected
+        self.failed: set[str] = set()
+
+    def exercise_of(self, path: Path) -> ExerciseModules:
+        directory = path.parent.absolute()
+        if directory not in self.exercises:
+            self.exercises[directory] = ExerciseModules(directory)
+        return self.exercises[directory]
+
+    def start(self, key: str) -> None:
+        if self.watchdog is not None:
+            self.watchdog.start(key)
+
+    def finish(self, key: str) -> None:
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        # Like pytest, consider files without tests failed
+        failed = key in self.failed or self.test_counts.get(key, 0) == 0
+        self.report.write(key, 'failed' if failed else 'passed')
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_make_collect_report(self, collector: Any):
+        if isinstance(collector, pytest.Module):
+            key = str(collector.path.absolute())
+            self.test_counts.setdefault(key, 0)
+            self.start(key)
+            with self.exercise_of(collector.path):
+                outcome = yield
+            if self.watchdog is not None:
+                self.watchdog.stop()
+            if outcome.get_result().failed:
+                self.failed.add(key)
+        else:
+            yield
+
+    def pytest_collection_modifyitems(self, items: list[Any]) -> None:
+        for item in items:
+            key = str(item.path.absolute())
+            self.test_counts[key] = self.test_counts.get(key, 0) + 1
+
+    def pytest_collection_finish(self, session: Any) -> None:
+        # Files without tests to run are done after collection
+        for key, count in self.test_counts.items():
+            if count == 0:
+                self.finish(key)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item: Any, nextitem: Any):
+        key = str(item.path.absolute())
+        self.start(key)
+        with self.exercise_of(item.path):
+            yield
+        if nextitem is None or nextitem.path != item.path:
+            self.finish(key)
+
+    def pytest_runtest_setup(self, item: Any) -> None:
+        if str(item.path.absolute()) in self.failed:
+            pytest.skip('An earlier test in this file failed')
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self, item: Any, call: Any):
+        outcome = yield
+        if outcome.get_result().failed:
+            self.failed.add(str(item.path.absolute()))
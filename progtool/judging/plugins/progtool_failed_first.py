@@ -0,0 +1,42 @@
+# Pytest plugin that runs the tests that failed before first, like pytest's --ff,
+# but with the failures supplied by progtool instead of read from .pytest_cache.
+# Loaded using -p progtool_failed_first; progtool puts this directory on PYTHONPATH.
+#
+# With --progtool-failed-first PATH, PATH names a JSON file {file: [test, ...]}
+# where file is the absolute path of a test file and test a node id without the file (as in progtool_progress).
+# Within each file, these tests are moved to the front; files themselves keep their order,
+# so that plugins handling test files one at a time (progtool_batch) are unaffected.
+#
+# This module must not import progtool, as it is loaded in the pytest process.
+import json
+from typing import Any
+
+
+def pytest_addoption(parser: Any) -> None:
+    parser.addoption('--progtool-failed-first', default=None, help='File listing the tests to run first')
+
+
+def pytest_configure(config: Any) -> None:
+    path = config.getoption('--progtool-failed-first')
+    if path is not None:
+        with open(path) as file:
+            failed = json.load(file)
+        config.pluginmanager.register(FailedFirstPlugin(failed), 'progtool-failed-first')
+
+
+class FailedFirstPlugin:
+    def __init__(self, failed: dict[str, list[str]]):
+        self.failed = {file: set(tests) for file, tests in failed.items()}
+
+    def pytest_collection_modifyitems(self, items: list[Any]) -> None:
+        file_positions: dict[str, int] = {}
+
+        def key(item: Any) -> tuple[int, bool]:
+            file = str(item.path.absolute())
+            position = file_positions.setdefault(file, len(file_positions))
+            return (position, item.nodeid.partition('::')[2] not in self.failed.get(file, ()))
+
+        # Determines the file positions in collection order before sorting
+        keys = [key(item) for item in items]
+        order = sorted(range(len(items)), key=keys.__getitem__)
+        items[:] = [items[index] for index in order]
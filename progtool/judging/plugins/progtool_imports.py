@@ -0,0 +1,68 @@
+# Pytest plugin that records which files the tests of each test file imported.
+# Loaded using -p progtool_imports; progtool puts this directory on PYTHONPATH.
+#
+# With --progtool-imports PATH, a JSON object {file: [imported file, ...]} is written to PATH when the session ends,
+# where file is the absolute path of a test file.
+# The files of all modules in sys.modules after collecting a test file and after each of its tests are included,
+# except modules that were loaded before this plugin (pytest itself, the pool worker's packages)
+# and the files of the standard library, installed packages and progtool's plugins.
+# In a batch, modules from outside an exercise's directory stay loaded (see progtool_batch),
+# so they are also attributed to the test files that come after it.
+#
+# This module must not import progtool, as it is loaded in the pytest process.
+import json
+import os
+import sys
+import sysconfig
+from typing import Any
+
+import pytest
+
+
+# Modules loaded before any test file or conftest.py
+PRELOADED_MODULES = frozenset(sys.modules)
+
+
+def pytest_addoption(parser: Any) -> None:
+    parser.addoption('--progtool-imports', default=None, help='File to write imported files to')
+
+
+def pytest_configure(config: Any) -> None:
+    path = config.getoption('--progtool-imports')
+    if path is not None:
+        config.pluginmanager.register(ImportsPlugin(path), 'progtool-imports')
+
+
+class ImportsPlugin:
+    def __init__(self, path: str):
+        self.path = path
+        # Imported files, by test file
+        self.imports: dict[str, set[str]] = {}
+        paths = sysconfig.get_paths()
+        directories = {os.path.dirname(os.path.abspath(__file__)), *(paths[name] for name in ('stdlib', 'platstdlib', 'purelib', 'platlib'))}
+        self.excluded = tuple(os.path.join(os.path.abspath(directory), '') for directory in directories)
+
+    def record(self, file: str) -> None:
+        imported = self.imports.setdefault(file, set())
+        for name, module in list(sys.modules.items()):
+            module_file = getattr(module, '__file__', None) if name not in PRELOADED_MODULES else None
+            if isinstance(module_file, str) and os.path.isfile(module_file):
+                module_file = os.path.abspath(module_file)
+                if not module_file.startswith(self.excluded):
+                    imported.add(module_file)
+
+    # Innermost wrappers, so that progtool_batch still has the exercise's modules loaded
+    @pytest.hookimpl(hookwrapper=True, trylast=True)
+    def pytest_make_collect_report(self, collector: Any):
+        yield
+        if isinstance(collector, pytest.Module):
+            self.record(str(collector.path.absolute()))
+
+    @pytest.hookimpl(hookwrapper=True, trylast=True)
+    def pytest_runtest_protocol(self, item: Any, nextitem: Any):
+        yield
+        self.record(str(item.path.absolute()))
+
+    def pytest_unconfigure(self, config: Any) -> None:
+        with open(self.path, 'w') as file:
+            json.dump({test_file: sorted(imported) for test_file, imported in self.imports.items()}, file)
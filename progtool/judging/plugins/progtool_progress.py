@@ -0,0 +1,77 @@
+# Pytest plugin that reports the progress of a session while it runs.
+# Loaded using -p progtool_progress; progtool puts this directory on PYTHONPATH.
+#
+# With --progtool-progress PATH, events are appended to PATH as they happen, one JSON object per line:
+#   {"event": "collected", "file": str, "tests": int}                  once per test file, after collection
+#   {"event": "started", "file": str, "test": str}                     when a test starts
+#   {"event": "finished", "file": str, "test": str, "outcome": str}    when a test ends; outcome is "passed", "failed" or "skipped"
+# where file is the absolute path of the test file.
+#
+# This module must not import progtool, as it is loaded in the pytest process.
+import json
+from typing import Any, Optional
+
+import pytest
+
+
+def pytest_addoption(parser: Any) -> None:
+    parser.addoption('--progtool-progress', default=None, help='File to write progress events to')
+
+
+def pytest_configure(config: Any) -> None:
+    path = config.getoption('--progtool-progress')
+    if path is not None:
+        config.pluginmanager.register(ProgressPlugin(path), 'progtool-progress')
+
+
+class ProgressPlugin:
+    def __init__(self, path: str):
+        self.file = open(path, 'a')
+        # Test files, by node id of the tests they contain
+        self.files: dict[str, str] = {}
+
+    def write(self, event: dict) -> None:
+        self.file.write(json.dumps(event) + '\n')
+        self.file.flush()
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, items: list[Any]) -> None:
+        counts: dict[str, int] = {}
+        for item in items:
+            file = str(item.path.absolute())
+            self.files[item.nodeid] = file
+            counts[file] = counts.get(file, 0) + 1
+        for file, count in counts.items():
+            self.write({'event': 'collected', 'file': file, 'tests': count})
+
+    def pytest_runtest_logstart(self, nodeid: str, location: Any) -> None:
+        file = self.files.get(nodeid)
+        if file is not None:
+            self.write({'event': 'started', 'file': file, 'test': self.name_of(nodeid)})
+
+    def pytest_runtest_logreport(self, report: Any) -> None:
+        outcome = self.outcome_of(report)
+        file = self.files.get(report.nodeid)
+        if outcome is not None and file is not None:
+            self.write({'event': 'finished', 'file': file, 'test': self.name_of(report.nodeid), 'outcome': outcome})
+
+    @staticmethod
+    def outcome_of(report: Any) -> Optional[str]:
+        """
+        Determines the outcome of a test from the report of one of its phases (setup, call, teardown).
+        Returns None if the report does not settle the outcome.
+        """
+        if report.when == 'call' or (report.when == 'setup' and not report.passed):
+            return report.outcome
+        if report.when == 'teardown' and report.failed:
+            # The call phase has already been reported; a failing teardown still fails the test
+            return 'failed'
+        return None
+
+    @staticmethod
+    def name_of(nodeid: str) -> str:
+        # Drops the file from the node id, but keeps classes and parameters
+        return nodeid.partition('::')[2]
+
+    def pytest_unconfigure(self, config: Any) -> None:
+        self.file.close()
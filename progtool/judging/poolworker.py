@@ -0,0 +1,84 @@
+# Worker process of the pytest worker pool (see progtool.judging.runner.PoolRunner).
+# Run as python -m progtool.judging.poolworker.
+#
+# Importing pytest and its plugins is what makes starting pytest slow.
+# The worker does this once, then handles requests by forking a child that runs pytest,
+# so that every run still starts from a clean slate.
+#
+# Protocol: one JSON object per line.
+#   Request (stdin):    {"directory": str, "arguments": [str], "output": str | null,
+#                        "limits": {"cpu_time": int | null, "address_space": int | null}}
+#   Responses (stdout): {"pid": int}, sent once the child has been forked, followed by
+#                       {"returncode": int, "usage": [user_time, system_time, max_rss]}, sent once the child has exited,
+#                       where usage contains the child's ru_utime, ru_stime and ru_maxrss
+# Output of pytest is written to the file named by "output", or discarded.
+#
+# This module must not import progtool: it should stay light and keep student code away from progtool's modules.
+import json
+import os
+import resource
+import sys
+from importlib.metadata import entry_points
+
+import pytest
+
+
+def preload_plugins() -> None:
+    for entry_point in entry_points(group='pytest11'):
+        try:
+            entry_point.load()
+        except Exception:
+            pass
+
+
+def apply_limits(limits: dict) -> None:
+    if limits.get('cpu_time') is not None:
+        resource.setrlimit(resource.RLIMIT_CPU, (limits['cpu_time'], limits['cpu_time'] + 1))
+    if limits.get('address_space') is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (limits['address_space'], limits['address_space']))
+
+
+def run_child(directory: str, arguments: list[str], output: str | None, limits: dict) -> None:
+    try:
+        apply_limits(limits)
+        output_fd = os.open(output or os.devnull, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        os.dup2(output_fd, 1)
+        os.dup2(output_fd, 2)
+        os.chdir(directory)
+        exit_code = int(pytest.main(arguments))
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except BaseException:
+        exit_code = int(pytest.ExitCode.INTERNAL_ERROR)
+    # Skip cleanup inherited from the parent (atexit handlers, buffered responses, ...)
+    os._exit(exit_code)
+
+
+def serve() -> None:
+    # Keep the real stdout for responses; anything else that ends up on stdout goes to stderr
+    responses = os.fdopen(os.dup(1), 'w')
+    os.dup2(2, 1)
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        responses.flush()
+        pid = os.fork()
+        if pid == 0:
+            run_child(request['directory'], request['arguments'], request.get('output'), request.get('limits', {}))
+        responses.write(json.dumps({'pid': pid}) + '\n')
+        responses.flush()
+        _, status, rusage = os.wait4(pid, 0)
+        response = {
+            'returncode': os.waitstatus_to_exitcode(status),
+            'usage': [rusage.ru_utime, rusage.ru_stime, rusage.ru_maxrss],
+        }
+        responses.write(json.dumps(response) + '\n')
+        responses.flush()
+
+
+if __name__ == '__main__':
+    # Running with -m puts the current directory on sys.path, which should not leak into the tests
+    if sys.path and sys.path[0] in ('', os.getcwd()):
+        del sys.path[0]
+    preload_plugins()
+    serve()
@@ -0,0 +1,180 @@
+import asyncio
+import contextlib
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import AsyncIterator, Callable, Hashable, NamedTuple, Optional
+
+
+# Seconds between checks for new progress events
+POLL_INTERVAL = 0.1
+
+
+class JudgingProgress(NamedTuple):
+    # None until the tests have been collected
+    total: Optional[int] = None
+    passed: int = 0
+    failed: int = 0
+    skipped: int = 0
+    # Test that is currently running
+    current: Optional[str] = None
+
+
+# Receives progress of the judge with the given identity, or None when judging has ended
+ProgressObserver = Callable[[Hashable, Optional[JudgingProgress]], None]
+
+
+class ProgressTracker:
+    """
+    Keeps track of the progress of running judges, by judge identity.
+    Updates come from the event loop; observers are called on that same thread.
+    """
+
+    __progress: dict[Hashable, JudgingProgress]
+
+    __observers: tuple[ProgressObserver, ...]
+
+    __lock: threading.Lock
+
+    def __init__(self):
+        self.__progress = {}
+        self.__observers = ()
+        self.__lock = threading.Lock()
+
+    def observe(self, observer: ProgressObserver) -> None:
+        self.__observers = (*self.__observers, observer)
+
+    def update(self, identity: Hashable, progress: JudgingProgress) -> None:
+        with self.__lock:
+            self.__progress[identity] = progress
+        self.__notify(identity, progress)
+
+    def finish(self, identity: Hashable) -> None:
+        with self.__lock:
+            if self.__progress.pop(identity, None) is None:
+                return
+        self.__notify(identity, None)
+
+    def find(self, identity: Hashable) -> Optional[JudgingProgress]:
+        with self.__lock:
+            return self.__progress.get(identity)
+
+    def __notify(self, identity: Hashable, progress: Optional[JudgingProgress]) -> None:
+        for observer in self.__observers:
+            observer(identity, progress)
+
+
+_progress_tracker = ProgressTracker()
+
+
+def get_progress_tracker() -> ProgressTracker:
+    return _progress_tracker
+
+
+class ProgressReader:
+    """
+    Reads the events written by the progtool_progress pytest plugin, keeping track of the progress per test file.
+    """
+
+    __path: Path
+
+    # Number of bytes of the file processed so far
+    __offset: int
+
+    # Outcomes of finished tests and the test currently running, per test file
+    __outcomes: dict[str, dict[str, str]]
+    __totals: dict[str, int]
+    __current: dict[str, Optional[str]]
+
+    def __init__(self, path: Path):
+        self.__path = path
+        self.__offset = 0
+        self.__outcomes = {}
+        self.__totals = {}
+        self.__current = {}
+
+    @property
+    def files(self) -> list[str]:
+        return list(self.__outcomes)
+
+    def outcomes_of(self, file: str) -> dict[str, str]:
+        """
+        Returns the outcomes of the finished tests in file, by test.
+        """
+        return dict(self.__outcomes.get(file, {}))
+
+    def read(self) -> dict[str, JudgingProgress]:
+        """
+        Processes new events and returns the progress of the test files they concern.
+        """
+        if not self.__path.is_file():
+            return {}
+        with self.__path.open('rb') as file:
+            file.seek(self.__offset)
+            data = file.read()
+        # Only complete lines are processed; the rest will be read next time
+        end = data.rfind(b'\n') + 1
+        self.__offset += end
+        changed = set()
+        for line in data[:end].splitlines():
+            try:
+                event = json.loads(line)
+                changed.add(self.__process(event))
+            except (json.JSONDecodeError, KeyError) as e:
+                logging.error(f'[Progress] Invalid progress event {line!r}: {e}')
+        return {file: self.__progress_of(file) for file in changed}
+
+    def __process(self, event: dict) -> str:
+        file = event['file']
+        outcomes = self.__outcomes.setdefault(file, {})
+        match event['event']:
+            case 'collected':
+                self.__totals[file] = event['tests']
+            case 'started':
+                self.__current[file] = event['test']
+            case 'finished':
+                outcomes[event['test']] = event['outcome']
+                if self.__current.get(file) == event['test']:
+                    self.__current[file] = None
+        return file
+
+    def __progress_of(self, file: str) -> JudgingProgress:
+        outcomes = list(self.__outcomes.get(file, {}).values())
+        return JudgingProgress(
+            total=self.__totals.get(file),
+            passed=outcomes.count('passed'),
+            failed=outcomes.count('failed'),
+            skipped=outcomes.count('skipped'),
+            current=self.__current.get(file),
+        )
+
+
+@contextlib.asynccontextmanager
+async def follow_progress(path: Path, identify: Callable[[str], Hashable]) -> AsyncIterator[ProgressReader]:
+    """
+    While in the context, reports progress events written to path to the progress tracker.
+    identify maps the test files to the identities of the judges responsible for them.
+    On leaving the context, the remaining events are processed and the judges are reported to have finished;
+    the reader that is bound by the context then holds the outcomes of all tests.
+    """
+    reader = ProgressReader(path)
+    tracker = get_progress_tracker()
+
+    def report() -> None:
+        for file, progress in reader.read().items():
+            tracker.update(identify(file), progress)
+
+    async def poll() -> None:
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            report()
+
+    task = asyncio.create_task(poll())
+    try:
+        yield reader
+    finally:
+        task.cancel()
+        report()
+        for file in reader.files:
+            tracker.finish(identify(file))
@@ -1,38 +1,327 @@
 import asyncio
+import json
 import logging
 import os
+import tempfile
 from pathlib import Path
+from typing import Hashable, Optional, Sequence
 
+from progtool import settings
+from progtool.judging.dependencies import get_dependency_tracker
+from progtool.judging.fingerprint import compute_fingerprint
+from progtool.judging.failurehistory import get_failure_history
 from progtool.judging.judge import Judge
+from progtool.judging.judgment import Judgment
+from progtool.judging.outputstore import get_output_store
+from progtool.judging.progress import ProgressReader, follow_progress
+from progtool.judging.runner import ResourceUsage, default_resource_limits, exceeded_cpu_time, get_runner
+from progtool.judging.syntaxcheck import SyntaxProblem, check_syntax
+from progtool.judging.telemetry import get_telemetry
 
 
 class PytestJudge(Judge):
     ID = 'pytest'
 
+    __slots__ = ('__tests_path', '__source_directory', '__timeout')
+
     __tests_path: Path
 
-    def __init__(self, tests_path: Path):
+    # Directory containing the files under test
+    __source_directory: Path
+
+    # Overrides the judge_timeout setting
+    __timeout: Optional[float]
+
+    def __init__(self, tests_path: Path, source_directory: Optional[Path] = None, timeout: Optional[float] = None):
         self.__tests_path = tests_path
+        self.__source_directory = source_directory or tests_path.parent
+        self.__timeout = timeout
+
+    @property
+    def tests_path(self) -> Path:
+        return self.__tests_path
+
+    @property
+    def timeout(self) -> Optional[float]:
+        """
+        Number of seconds after which judging is aborted, None for no limit.
+        """
+        return self.__timeout or settings.judge_timeout()
+
+    @property
+    def identity(self) -> Hashable:
+        return (PytestJudge.ID, self.__tests_path.absolute())
+
+    def fingerprint(self) -> Optional[str]:
+        # Modules imported from outside the source directory (e.g., shared helpers) are included as well
+        dependencies = get_dependency_tracker().find(self.identity)
+        return compute_fingerprint(self.__source_directory, [self.__tests_path, *dependencies])
 
-    async def judge(self) -> bool:
+    async def judge(self, fingerprint: Optional[str] = None) -> Judgment:
         try:
             tests_path = self.__tests_path
             assert os.path.isfile(tests_path), f'{tests_path} does not exist'
 
+            problem = await asyncio.to_thread(self.__check_syntax)
+            if problem is not None:
+                return self.__reject(problem, fingerprint)
+
             parent_directory = tests_path.parent
             filename = tests_path.name
 
-            # -x flag interrupts tests after first failure
-            command = f'pytest -x {filename}'
-            logging.info(f'[Pytest judge] Running {command} in {parent_directory}')
-            process = await asyncio.create_subprocess_shell(command, stdout=asyncio.subprocess.PIPE, cwd=parent_directory)
-            stdout, stderr = await process.communicate() # TODO Would process.wait() work?
-            output = stdout.decode()
+            with tempfile.TemporaryDirectory() as temporary_directory:
+                progress_path = Path(temporary_directory) / 'progress.jsonl'
+                imports_path = Path(temporary_directory) / 'imports.json'
+                # -x flag interrupts tests after first failure
+                arguments = [
+                    '-x',
+                    *PytestJudge.__progress_arguments(progress_path),
+                    *PytestJudge.__failed_first_arguments(Path(temporary_directory), [str(tests_path.absolute())]),
+                    *PytestJudge.__imports_arguments(imports_path),
+                    filename,
+                ]
+                logging.info(f'[Pytest judge] Running pytest on {filename} in {parent_directory}')
+                limits = default_resource_limits()
+                # Runs killed on timeout (or because they were superseded) count as timeouts
+                on_kill = lambda usage: get_telemetry().record(self.identity, usage, Judgment.TIMEOUT)
+                async with asyncio.timeout(self.timeout), follow_progress(progress_path, lambda _: self.identity) as progress:
+                    pytest_result, output, usage = await get_runner().run(parent_directory, arguments, limits, on_kill)
+                PytestJudge.__record_failures(progress)
+                PytestJudge.__record_dependencies(imports_path)
+            get_output_store().store(self.identity, fingerprint, output)
             logging.debug(f'[Pytest judge] STDOUT from pytest: {output}')
-            pytest_result = process.returncode
             logging.info(f'[Pytest judge] Pytest ended with code {pytest_result} (0 indicates passed tests)')
-            tests_passed = pytest_result == 0
-            return tests_passed
+            if exceeded_cpu_time(pytest_result, usage, limits):
+                logging.info(f'[Pytest judge] Pytest exceeded its CPU time while judging {tests_path}')
+                judgment = Judgment.TIMEOUT
+            else:
+                judgment = Judgment.PASS if pytest_result == 0 else Judgment.FAIL
+            get_telemetry().record(self.identity, usage, judgment)
+            return judgment
+        except TimeoutError:
+            # The runner has killed pytest; on_kill recorded the resources it used
+            logging.info(f'[Pytest judge] Judging {self.__tests_path} timed out after {self.timeout}s')
+            return Judgment.TIMEOUT
         except Exception as e:
             logging.error(f"[Pytest judge] Error occurred while judging {self.__tests_path}: {e}")
-            return False
+            return Judgment.FAIL
+
+    def __check_syntax(self) -> Optional[SyntaxProblem]:
+        """
+        Compiles the tests and the local modules they import, without running pytest.
+        Only imports found in the current sources are followed: the files recorded during the last run
+        might no longer be imported, and as pytest is not run when the check fails, they would never be updated.
+        Errors in modules that are not found this way are left for pytest to report.
+        """
+        return check_syntax([self.__tests_path], [self.__tests_path.parent, self.__source_directory])
+
+    def __reject(self, problem: SyntaxProblem, fingerprint: Optional[str]) -> Judgment:
+        """
+        Fails the exercise without running pytest, which could not even import the code.
+        """
+        logging.info(f'[Pytest judge] Syntax error in {problem}; not running pytest on {self.__tests_path}')
+        get_output_store().store(self.identity, fingerprint, f'[Syntax check failed; pytest was not run]\n\n{problem.details}')
+        return Judgment.FAIL
+
+    @staticmethod
+    def __progress_arguments(progress_path: Path) -> list[str]:
+        """
+        Has pytest report the progress of each test (see progtool.judging.progress).
+        """
+        return ['-p', 'progtool_progress', '--progtool-progress', str(progress_path)]
+
+    @staticmethod
+    def __failed_first_arguments(directory: Path, tests_paths: list[str]) -> list[str]:
+        """
+        Has pytest run the tests that failed before first, so that failures are found as soon as possible.
+        Also keeps pytest from creating a .pytest_cache in the exercise's directory, as the failures are kept by progtool.
+        """
+        arguments = ['-p', 'no:cacheprovider']
+        failed = {tests_path: get_failure_history().find(tests_path) for tests_path in tests_paths}
+        failed = {tests_path: tests for tests_path, tests in failed.items() if tests}
+        if failed:
+            failed_path = directory / 'failed.json'
+            failed_path.write_text(json.dumps(failed))
+            arguments += ['-p', 'progtool_failed_first', '--progtool-failed-first', str(failed_path)]
+        return arguments
+
+    @staticmethod
+    def __imports_arguments(imports_path: Path) -> list[str]:
+        """
+        Has pytest record which files each test file imported (see DependencyTracker).
+        """
+        return ['-p', 'progtool_imports', '--progtool-imports', str(imports_path)]
+
+    @staticmethod
+    def __record_dependencies(imports_path: Path) -> None:
+        try:
+            imports = json.loads(imports_path.read_text())
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f'[Pytest judge] Could not read imported files from {imports_path}: {e}')
+            return
+        for tests_path, files in imports.items():
+            get_dependency_tracker().record(PytestJudge.__identity_of(tests_path), map(Path, files))
+
+    @staticmethod
+    def __record_failures(progress: ProgressReader) -> None:
+        for tests_path in progress.files:
+            get_failure_history().record(tests_path, progress.outcomes_of(tests_path))
+
+    @classmethod
+    async def judge_batch(cls, judges: Sequence[Judge], fingerprints: Optional[Sequence[Optional[str]]] = None) -> list[Judgment]:
+        """
+        Judges exercises in as few pytest sessions as possible.
+        Exercises whose code does not compile fail without being included in a session.
+        A session can only judge exercises with the same timeout.
+        If a session ends early (e.g., because a test file timed out), a new session judges the remaining exercises.
+        Exercises for which the sessions do not produce an outcome are judged separately.
+        """
+        if fingerprints is None:
+            fingerprints = [None] * len(judges)
+        if len(judges) == 1:
+            return [await judges[0].judge(fingerprints[0])]
+
+        pytest_judges = [judge for judge in judges if isinstance(judge, PytestJudge)]
+        assert len(pytest_judges) == len(judges), 'BUG: batch should only contain pytest judges'
+
+        problems = await asyncio.to_thread(lambda: [judge.__check_syntax() for judge in pytest_judges])
+        judges_by_timeout: dict[Optional[float], list[PytestJudge]] = {}
+        for judge, problem in zip(pytest_judges, problems):
+            if problem is None:
+                judges_by_timeout.setdefault(judge.timeout, []).append(judge)
+        judgments: dict[str, Judgment] = {}
+        outputs: dict[str, str] = {}
+        for timeout, judges_with_timeout in judges_by_timeout.items():
+            tests_paths = [str(judge.__tests_path.absolute()) for judge in judges_with_timeout if judge.__tests_path.is_file()]
+            await PytestJudge.__judge_in_sessions(tests_paths, timeout, judgments, outputs)
+
+        results = []
+        for judge, problem, fingerprint in zip(pytest_judges, problems, fingerprints):
+            tests_path = str(judge.__tests_path.absolute())
+            if problem is not None:
+                results.append(judge.__reject(problem, fingerprint))
+            elif tests_path in judgments:
+                get_output_store().store(judge.identity, fingerprint, outputs[tests_path])
+                results.append(judgments[tests_path])
+            else:
+                logging.info(f'[Pytest judge] No outcome for {tests_path} in batch; judging it separately')
+                results.append(await judge.judge(fingerprint))
+        return results
+
+    @staticmethod
+    async def __judge_in_sessions(tests_paths: list[str], timeout: Optional[float], judgments: dict[str, Judgment], outputs: dict[str, str]) -> None:
+        """
+        Adds the judgments reached for tests_paths to judgments, and the output of the session that reached them to outputs.
+        """
+        remaining = tests_paths
+        while remaining:
+            outcomes, output = await PytestJudge.__run_batch(remaining, timeout)
+            if not outcomes:
+                # No progress; the remaining exercises will be judged separately
+                break
+            for tests_path, outcome in outcomes.items():
+                outputs[tests_path] = f'[Output of a pytest session shared by {len(remaining)} files]\n\n{output}'
+                judgment = PytestJudge.__to_judgment(outcome)
+                if judgment is Judgment.TIMEOUT:
+                    logging.info(f'[Pytest judge] Judging {tests_path} timed out after {timeout}s')
+                if judgment is not None:
+                    judgments[tests_path] = judgment
+            remaining = [tests_path for tests_path in remaining if tests_path not in judgments]
+
+    @staticmethod
+    async def __run_batch(tests_paths: list[str], timeout: Optional[float]) -> tuple[dict[str, str], str]:
+        """
+        Runs a single pytest session and returns the outcomes it reported, which might not cover all tests_paths,
+        together with the session's output.
+        """
+        directory = Path(os.path.commonpath([Path(path).parent for path in tests_paths]))
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            report_path = Path(temporary_directory) / 'report.jsonl'
+            progress_path = Path(temporary_directory) / 'progress.jsonl'
+            imports_path = Path(temporary_directory) / 'imports.json'
+            # The plugin takes care of -x semantics and timeouts for each file separately
+            arguments = [
+                '-p', 'progtool_batch',
+                '--progtool-report', str(report_path),
+                '--continue-on-collection-errors',
+                *PytestJudge.__progress_arguments(progress_path),
+                *PytestJudge.__failed_first_arguments(Path(temporary_directory), tests_paths),
+                *PytestJudge.__imports_arguments(imports_path),
+            ]
+            if timeout is not None:
+                arguments += ['--progtool-timeout', str(timeout)]
+            arguments += tests_paths
+            # In case the plugin fails to enforce the timeout, e.g., because a C extension hangs
+            session_timeout = None if timeout is None else timeout * len(tests_paths) + 10
+            limits = default_resource_limits().scale(len(tests_paths))
+            usage: Optional[ResourceUsage] = None
+            output = ''
+            try:
+                logging.info(f'[Pytest judge] Running pytest on {len(tests_paths)} files in {directory}')
+                # A killed session is charged to all of its files as a timeout
+                on_kill = lambda usage: PytestJudge.__record_shared_usage(dict.fromkeys(tests_paths, Judgment.TIMEOUT), usage)
+                async with asyncio.timeout(session_timeout), follow_progress(progress_path, PytestJudge.__identity_of) as progress:
+                    pytest_result, output, usage = await get_runner().run(directory, arguments, limits, on_kill)
+                PytestJudge.__record_failures(progress)
+                PytestJudge.__record_dependencies(imports_path)
+                logging.debug(f'[Pytest judge] STDOUT from pytest: {output}')
+                logging.info(f'[Pytest judge] Pytest ended with code {pytest_result}')
+            except TimeoutError:
+                logging.error(f'[Pytest judge] Batch session in {directory} timed out')
+            except Exception as e:
+                logging.error(f'[Pytest judge] Error occurred while judging batch: {e}')
+            outcomes = PytestJudge.__read_report(report_path)
+            if usage is not None and outcomes:
+                PytestJudge.__record_shared_usage({tests_path: PytestJudge.__to_judgment(outcome) for tests_path, outcome in outcomes.items()}, usage)
+            return outcomes, output
+
+    @staticmethod
+    def __to_judgment(outcome: str) -> Optional[Judgment]:
+        """
+        Converts an outcome reported by progtool_batch to a judgment, None if it is not recognized.
+        """
+        match outcome:
+            case 'passed':
+                return Judgment.PASS
+            case 'failed':
+                return Judgment.FAIL
+            case 'timeout':
+                return Judgment.TIMEOUT
+            case _:
+                return None
+
+    @staticmethod
+    def __record_shared_usage(judgments: dict[str, Optional[Judgment]], usage: ResourceUsage) -> None:
+        """
+        Attributes an equal share of a session's time to each of the files it judged, along with the file's judgment.
+        The peak memory usage is that of the whole session.
+        """
+        count = len(judgments)
+        share = usage._replace(
+            wall_time=usage.wall_time / count,
+            user_time=usage.user_time / count,
+            system_time=usage.system_time / count,
+        )
+        for tests_path, judgment in judgments.items():
+            get_telemetry().record(PytestJudge.__identity_of(tests_path), share, judgment)
+
+    @staticmethod
+    def __identity_of(tests_path: str) -> Hashable:
+        """
+        Identity of the judge for the given absolute path of a test file.
+        """
+        return (PytestJudge.ID, Path(tests_path))
+
+    @staticmethod
+    def __read_report(path: Path) -> dict[str, str]:
+        outcomes: dict[str, str] = {}
+        if path.is_file():
+            with path.open() as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Last line might be incomplete if pytest was killed
+                        continue
+                    outcomes[entry['file']] = entry['outcome']
+        return outcomes
@@ -0,0 +1,91 @@
+import hashlib
+import logging
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import git
+
+from progtool.repository import RepositoryException, find_repository, root_of_repository
+
+
+class RepositoryState(NamedTuple):
+    """
+    Describes the contents of a git working tree without storing them.
+    """
+
+    # Commit checked out
+    head: str
+
+    # Hashes of the files that differ from head (including untracked files), by path relative to the repository root
+    # Deleted files have an empty hash
+    dirty: dict[str, str]
+
+
+def hash_file(path: Path) -> str:
+    """
+    Computes the hash git would assign to the file's contents, or an empty string if the file does not exist.
+    """
+    if not path.is_file():
+        return ''
+    contents = path.read_bytes()
+    return hashlib.sha1(f'blob {len(contents)}\0'.encode() + contents).hexdigest()
+
+
+class RepositoryTracker:
+    """
+    Determines which files have changed between two moments using git, without reading every file.
+    """
+
+    __repository: git.Repo
+
+    __root: Path
+
+    def __init__(self, repository: git.Repo):
+        self.__repository = repository
+        self.__root = root_of_repository(repository)
+
+    @staticmethod
+    def create(directory: Path) -> Optional['RepositoryTracker']:
+        """
+        Returns None if directory is not part of a git repository.
+        """
+        try:
+            return RepositoryTracker(find_repository(directory))
+        except (RepositoryException, git.GitError):
+            return None
+
+    def capture(self) -> Optional[RepositoryState]:
+        """
+        Returns None if git cannot describe the working tree, e.g., because nothing has been committed yet.
+        """
+        try:
+            head = self.__repository.git.rev_parse('--verify', 'HEAD')
+            dirty = {path: hash_file(self.__root / path) for path in self.__find_differences(head)}
+            return RepositoryState(head, dirty)
+        except git.GitError as e:
+            logging.info(f'Could not determine state of repository {self.__root}: {e}')
+            return None
+
+    def find_changed_files(self, since: RepositoryState) -> Optional[list[Path]]:
+        """
+        Returns the absolute paths of all files whose contents differ from the given state.
+        Returns None if this cannot be determined, e.g., because the commit since.head no longer exists.
+        """
+        try:
+            candidates = self.__find_differences(since.head) | since.dirty.keys()
+        except git.GitError as e:
+            logging.info(f'Could not compare repository {self.__root} with commit {since.head}: {e}')
+            return None
+        return [
+            self.__root / path
+            for path in sorted(candidates)
+            if path not in since.dirty or since.dirty[path] != hash_file(self.__root / path)
+        ]
+
+    def __find_differences(self, commit: str) -> set[str]:
+        """
+        Finds the files in the working tree that differ from commit, including untracked files.
+        """
+        changed = self.__repository.git.diff('--name-only', '-z', '--no-renames', commit, '--')
+        untracked = self.__repository.git.ls_files('--others', '--exclude-standard', '-z')
+        return {path for path in [*changed.split('\0'), *untracked.split('\0')] if path}
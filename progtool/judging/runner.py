@@ -0,0 +1,427 @@
+from __future__ import annotations
+
+import abc
+import asyncio
+import json
+import logging
+import os
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Literal, NamedTuple, Optional
+
+from progtool import settings
+
+
+RunnerType = Literal['subprocess', 'pool']
+
+# Contains the pytest plugins progtool loads in pytest (using -p)
+PLUGINS_DIRECTORY = Path(__file__).parent / 'plugins'
+
+
+# Maximum number of bytes of output kept per run
+DEFAULT_OUTPUT_LIMIT = 64 * 1024
+
+
+# The CPU time reported by rusage can fall slightly short of the limit that got the process killed
+CPU_TIME_MARGIN = 0.9
+
+
+class RunnerError(Exception):
+    pass
+
+
+class ResourceLimits(NamedTuple):
+    # Seconds of CPU time; pytest is killed when it uses more
+    cpu_time: Optional[int] = None
+
+    # Bytes of address space; allocations beyond fail with MemoryError
+    address_space: Optional[int] = None
+
+    @property
+    def active(self) -> bool:
+        """
+        Whether any limit is set.
+        """
+        return self.cpu_time is not None or self.address_space is not None
+
+    def apply(self) -> None:
+        """
+        Applies the limits to the current process.
+        """
+        if self.cpu_time is not None:
+            # The soft limit sends SIGXCPU, the hard limit SIGKILL should SIGXCPU be ignored
+            resource.setrlimit(resource.RLIMIT_CPU, (self.cpu_time, self.cpu_time + 1))
+        if self.address_space is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (self.address_space, self.address_space))
+
+    def scale(self, factor: int) -> ResourceLimits:
+        """
+        Multiplies the CPU time limit, e.g., for runs judging multiple exercises.
+        """
+        return self._replace(cpu_time=None if self.cpu_time is None else self.cpu_time * factor)
+
+
+class ResourceUsage(NamedTuple):
+    # Seconds
+    wall_time: float
+
+    # Seconds of CPU time spent in user mode
+    user_time: float
+
+    # Seconds of CPU time spent in the kernel
+    system_time: float
+
+    # Bytes
+    max_rss: int
+
+    @staticmethod
+    def create(wall_time: float, user_time: float, system_time: float, max_rss: int) -> ResourceUsage:
+        """
+        Creates a ResourceUsage from the fields of a struct rusage.
+        """
+        # ru_maxrss is expressed in kilobytes, except on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return ResourceUsage(wall_time=wall_time, user_time=user_time, system_time=system_time, max_rss=max_rss * scale)
+
+    @property
+    def cpu_time(self) -> float:
+        return self.user_time + self.system_time
+
+
+class RunResult(NamedTuple):
+    # Negative if pytest was killed by a signal
+    exit_code: int
+
+    output: str
+
+    usage: ResourceUsage
+
+
+class OutputBuffer:
+    """
+    Keeps the beginning and the end of an output of any size, up to limit bytes in total.
+    """
+
+    __limit: int
+
+    __head: bytearray
+
+    __tail: bytearray
+
+    # Number of bytes dropped between head and tail
+    __omitted: int
+
+    def __init__(self, limit: int):
+        self.__limit = limit
+        self.__head = bytearray()
+        self.__tail = bytearray()
+        self.__omitted = 0
+
+    def write(self, data: bytes) -> None:
+        head_space = self.__limit // 2 - len(self.__head)
+        if head_space > 0:
+            self.__head += data[:head_space]
+            data = data[head_space:]
+        self.__tail += data
+        excess = len(self.__tail) - (self.__limit - self.__limit // 2)
+        if excess > 0:
+            del self.__tail[:excess]
+            self.__omitted += excess
+
+    def skip(self, count: int) -> None:
+        """
+        Records that count bytes were left out without being written, e.g., because they were never read.
+        """
+        self.__omitted += count
+
+    def getvalue(self) -> str:
+        if self.__omitted:
+            marker = f'\n\n[... {self.__omitted} bytes of output omitted ...]\n\n'.encode()
+            data = bytes(self.__head) + marker + bytes(self.__tail)
+        else:
+            data = bytes(self.__head) + bytes(self.__tail)
+        return data.decode(errors='replace')
+
+
+def read_output(path: Path, limit: int) -> str:
+    """
+    Reads at most limit bytes from the beginning and end of the file, without reading the rest.
+    """
+    buffer = OutputBuffer(limit)
+    if path.is_file():
+        with path.open('rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size <= limit:
+                buffer.write(file.read())
+            else:
+                buffer.write(file.read(limit // 2))
+                file.seek(size - (limit - limit // 2))
+                buffer.skip(size - limit)
+                buffer.write(file.read())
+    return buffer.getvalue()
+
+
+def default_resource_limits() -> ResourceLimits:
+    memory_limit = settings.judge_memory_limit()
+    return ResourceLimits(
+        cpu_time=settings.judge_cpu_limit(),
+        address_space=None if memory_limit is None else memory_limit * 1024 * 1024,
+    )
+
+
+def exceeded_cpu_time(exit_code: int, usage: ResourceUsage, limits: ResourceLimits) -> bool:
+    """
+    Checks whether a process was killed for using too much CPU time.
+    SIGKILL is also sent by, e.g., the OOM killer, so the signal only counts if the process actually used up its CPU time.
+    """
+    if limits.cpu_time is None or exit_code not in (-signal.SIGXCPU, -signal.SIGKILL):
+        return False
+    return usage.cpu_time >= limits.cpu_time * CPU_TIME_MARGIN
+
+
+def create_environment() -> dict[str, str]:
+    """
+    Environment for pytest processes, in which progtool's plugins can be imported.
+    """
+    environment = dict(os.environ)
+    python_path = environment.get('PYTHONPATH')
+    environment['PYTHONPATH'] = os.pathsep.join([str(PLUGINS_DIRECTORY), python_path]) if python_path else str(PLUGINS_DIRECTORY)
+    return environment
+
+
+# Receives the resources used by a pytest process killed because its run was cancelled
+KillObserver = Callable[[ResourceUsage], None]
+
+
+class PytestRunner(abc.ABC):
+    """
+    Runs pytest on behalf of the pytest judge.
+    """
+
+    # Maximum number of bytes of output kept per run; the middle part of longer outputs is left out
+    __output_limit: int
+
+    def __init__(self, output_limit: int = DEFAULT_OUTPUT_LIMIT):
+        self.__output_limit = output_limit
+
+    @property
+    def output_limit(self) -> int:
+        return self.__output_limit
+
+    @abc.abstractmethod
+    async def run(self, directory: Path, arguments: list[str], limits: ResourceLimits = ResourceLimits(), on_kill: Optional[KillObserver] = None) -> RunResult:
+        """
+        Runs pytest with the given arguments in directory.
+        Returns pytest's exit code, output and the resources it used.
+        Cancelling the call kills pytest; on_kill is then called with the resources it used up to that point.
+        """
+        ...
+
+
+class SubprocessRunner(PytestRunner):
+    """
+    Starts a new pytest process for every run.
+    """
+
+    async def run(self, directory: Path, arguments: list[str], limits: ResourceLimits = ResourceLimits(), on_kill: Optional[KillObserver] = None) -> RunResult:
+        command = ['pytest', *arguments]
+        logging.info(f'[Pytest runner] Running {" ".join(command)} in {directory}')
+        start = time.monotonic()
+        # Not run through a shell, so that killing the process actually kills pytest
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=directory,
+            env=create_environment(),
+            # preexec_fn makes Popen fall back to fork, which is slower than posix_spawn
+            preexec_fn=limits.apply if limits.active else None,
+        )
+        # asyncio's subprocesses do not expose the child's resource usage, so the process is reaped with os.wait4 on a thread
+        # Shielded so that, when cancelled, the process can be killed and still be reaped
+        waiting = asyncio.ensure_future(asyncio.to_thread(SubprocessRunner.__wait, process, self.output_limit))
+        try:
+            exit_code, output, rusage = await asyncio.shield(waiting)
+        except asyncio.CancelledError:
+            logging.info(f'[Pytest runner] Run in {directory} cancelled; killing pytest')
+            process.kill()
+            await asyncio.wait([waiting])
+            if on_kill is not None and waiting.exception() is None:
+                _, _, rusage = waiting.result()
+                on_kill(ResourceUsage.create(time.monotonic() - start, rusage.ru_utime, rusage.ru_stime, rusage.ru_maxrss))
+            raise
+        usage = ResourceUsage.create(time.monotonic() - start, rusage.ru_utime, rusage.ru_stime, rusage.ru_maxrss)
+        return RunResult(exit_code, output, usage)
+
+    @staticmethod
+    def __wait(process: subprocess.Popen, output_limit: int) -> tuple[int, str, resource.struct_rusage]:
+        assert process.stdout is not None
+        output = OutputBuffer(output_limit)
+        with process.stdout:
+            # Reads everything to keep pytest from blocking on a full pipe, but only keeps a bounded part
+            # os.read returns whatever is available without waiting for a full chunk; nothing else reads from the pipe
+            while chunk := os.read(process.stdout.fileno(), 64 * 1024):
+                output.write(chunk)
+        _, status, rusage = os.wait4(process.pid, 0)
+        # Lets Popen know the process has been reaped
+        process.returncode = os.waitstatus_to_exitcode(status)
+        return (process.returncode, output.getvalue(), rusage)
+
+
+class PoolWorker:
+    """
+    Process that has pytest imported and forks a child for every run (see progtool.judging.poolworker).
+    """
+
+    __process: asyncio.subprocess.Process
+
+    # Set when the worker is no longer in a usable state
+    __stopped: bool
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.__process = process
+        self.__stopped = False
+
+    @staticmethod
+    async def start() -> 'PoolWorker':
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, '-m', 'progtool.judging.poolworker',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            env=create_environment(),
+        )
+        logging.info(f'[Pytest pool] Started worker {process.pid}')
+        return PoolWorker(process)
+
+    @property
+    def is_alive(self) -> bool:
+        return not self.__stopped and self.__process.returncode is None
+
+    async def run(self, directory: Path, arguments: list[str], limits: ResourceLimits = ResourceLimits(), output_limit: int = DEFAULT_OUTPUT_LIMIT, on_kill: Optional[KillObserver] = None) -> RunResult:
+        start = time.monotonic()
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            output_path = Path(temporary_directory) / 'output'
+            await self.__send({
+                'directory': str(directory),
+                'arguments': arguments,
+                'output': str(output_path),
+                'limits': limits._asdict(),
+            })
+            try:
+                pid = (await self.__receive())['pid']
+            except asyncio.CancelledError:
+                # Without the pid, there is no way of stopping the child other than stopping the worker
+                await self.stop()
+                raise
+            # Shielded so that, when cancelled, the response can still be read and the worker remains usable
+            receiving = asyncio.ensure_future(self.__receive())
+            try:
+                response = await asyncio.shield(receiving)
+            except asyncio.CancelledError:
+                logging.info(f'[Pytest pool] Run in {directory} cancelled; killing child {pid}')
+                self.__kill_child(pid)
+                await asyncio.wait([receiving])
+                # The worker reaps the child with os.wait4 and reports its usage as usual
+                if on_kill is not None and receiving.exception() is None:
+                    on_kill(ResourceUsage.create(time.monotonic() - start, *receiving.result()['usage']))
+                raise
+            output = read_output(output_path, output_limit)
+            usage = ResourceUsage.create(time.monotonic() - start, *response['usage'])
+            return RunResult(response['returncode'], output, usage)
+
+    async def stop(self) -> None:
+        if self.is_alive:
+            self.__stopped = True
+            self.__process.kill()
+            await self.__process.wait()
+
+    async def __send(self, message: dict) -> None:
+        assert self.__process.stdin is not None
+        self.__process.stdin.write((json.dumps(message) + '\n').encode())
+        await self.__process.stdin.drain()
+
+    async def __receive(self) -> dict:
+        assert self.__process.stdout is not None
+        line = await self.__process.stdout.readline()
+        if not line:
+            raise RunnerError(f'Pool worker {self.__process.pid} died')
+        return json.loads(line)
+
+    @staticmethod
+    def __kill_child(pid: int) -> None:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+class PoolRunner(PytestRunner):
+    """
+    Runs pytest in a pool of warm worker processes, avoiding interpreter startup and pytest's import time.
+    Workers are started on demand, up to the given size.
+    """
+
+    __size: int
+
+    __idle: list[PoolWorker]
+
+    __available: Optional[asyncio.Semaphore]
+
+    def __init__(self, size: int, output_limit: int = DEFAULT_OUTPUT_LIMIT):
+        super().__init__(output_limit)
+        self.__size = size
+        self.__idle = []
+        self.__available = None
+
+    async def run(self, directory: Path, arguments: list[str], limits: ResourceLimits = ResourceLimits(), on_kill: Optional[KillObserver] = None) -> RunResult:
+        # Created here rather than in __init__, as it has to belong to the event loop
+        if self.__available is None:
+            self.__available = asyncio.Semaphore(self.__size)
+        async with self.__available:
+            worker = await self.__acquire()
+            try:
+                return await worker.run(directory, arguments, limits, self.output_limit, on_kill)
+            finally:
+                self.__release(worker)
+
+    async def stop(self) -> None:
+        """
+        Stops all idle workers.
+        """
+        for worker in self.__idle:
+            await worker.stop()
+        self.__idle.clear()
+
+    async def __acquire(self) -> PoolWorker:
+        while self.__idle:
+            worker = self.__idle.pop()
+            if worker.is_alive:
+                return worker
+        return await PoolWorker.start()
+
+    def __release(self, worker: PoolWorker) -> None:
+        if worker.is_alive:
+            self.__idle.append(worker)
+
+
+_runner: Optional[PytestRunner] = None
+
+
+def create_runner(runner_type: RunnerType) -> PytestRunner:
+    match runner_type:
+        case 'subprocess':
+            return SubprocessRunner(settings.judge_output_limit())
+        case 'pool':
+            return PoolRunner(settings.judge_workers(), settings.judge_output_limit())
+
+
+def get_runner() -> PytestRunner:
+    global _runner
+    if _runner is None:
+        _runner = create_runner(settings.judge_runner())
+    return _runner
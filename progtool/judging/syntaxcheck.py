@@ -0,0 +1,81 @@
+import ast
+import traceback
+import warnings
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional
+
+
+class SyntaxProblem(NamedTuple):
+    path: Path
+    # None if the location is unknown (e.g., the file contains null bytes)
+    line: Optional[int]
+    column: Optional[int]
+    message: str
+    # Error as Python would print it, including the offending line
+    details: str
+
+    def __str__(self) -> str:
+        location = ':'.join(str(part) for part in (self.path, self.line, self.column) if part is not None)
+        return f'{location}: {self.message}'
+
+
+def check_syntax(files: Iterable[Path], search_directories: list[Path]) -> Optional[SyntaxProblem]:
+    """
+    Compiles files and, transitively, the modules they import from search_directories, without running them.
+    Returns the first problem found, None if everything compiles. Missing files are ignored.
+    """
+    pending = list(files)
+    checked: set[Path] = set()
+    while pending:
+        path = pending.pop(0).absolute()
+        if path in checked or not path.is_file():
+            continue
+        checked.add(path)
+        try:
+            tree = _compile(path)
+        except SyntaxError as e:
+            return SyntaxProblem(path, e.lineno, e.offset, e.msg, ''.join(traceback.format_exception_only(e)))
+        except ValueError as e:
+            return SyntaxProblem(path, None, None, str(e), f'{path}: {e}\n')
+        pending.extend(_find_local_imports(tree, path, search_directories))
+    return None
+
+
+def _compile(path: Path) -> ast.Module:
+    source = path.read_bytes()
+    with warnings.catch_warnings():
+        # Warnings (e.g., about invalid escape sequences) do not keep the code from running
+        warnings.simplefilter('ignore')
+        tree = ast.parse(source, str(path))
+        # Some errors, such as return outside a function, are only detected by the compiler
+        compile(tree, str(path), 'exec', dont_inherit=True)
+    return tree
+
+
+def _find_local_imports(tree: ast.Module, path: Path, search_directories: list[Path]) -> list[Path]:
+    """
+    Finds the files of the modules imported anywhere in tree that reside in search_directories.
+    Relative imports are resolved with respect to path.
+    """
+    modules: list[tuple[list[Path], str]] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.extend((search_directories, alias.name) for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level > 0:
+                directories = [path.parents[node.level - 1]] if node.level <= len(path.parents) else []
+            else:
+                directories = search_directories
+            base = node.module or ''
+            if base:
+                modules.append((directories, base))
+            # Imported names might be submodules
+            modules.extend((directories, f'{base}.{alias.name}' if base else alias.name) for alias in node.names)
+    files: list[Path] = []
+    for directories, module in modules:
+        parts = module.split('.')
+        for directory in directories:
+            for count in range(1, len(parts) + 1):
+                package = directory.joinpath(*parts[:count])
+                files.extend(candidate for candidate in (package.with_suffix('.py'), package / '__init__.py') if candidate.is_file())
+    return files
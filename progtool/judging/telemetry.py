@@ -0,0 +1,118 @@
+import collections
+import threading
+from typing import Hashable, NamedTuple, Optional
+
+from progtool.judging.judgment import Judgment
+from progtool.judging.runner import ResourceUsage
+
+
+# Number of most recent judge runs the statistics are computed over
+WINDOW_SIZE = 20
+
+
+class Summary(NamedTuple):
+    last: float
+    mean: float
+    maximum: float
+
+
+class UsageStatistics:
+    """
+    Rolling statistics about the resources used by the most recent runs of a judge.
+    """
+
+    # Total number of runs, including those no longer in the window
+    __runs: int
+
+    # Number of runs, including those no longer in the window, that timed out
+    __timeouts: int
+
+    __window: collections.deque[ResourceUsage]
+
+    def __init__(self, window_size: int = WINDOW_SIZE):
+        self.__runs = 0
+        self.__timeouts = 0
+        self.__window = collections.deque(maxlen=window_size)
+
+    def record(self, usage: ResourceUsage, judgment: Optional[Judgment] = None) -> None:
+        self.__runs += 1
+        if judgment is Judgment.TIMEOUT:
+            self.__timeouts += 1
+        self.__window.append(usage)
+
+    def copy(self) -> 'UsageStatistics':
+        copy = UsageStatistics(self.__window.maxlen or WINDOW_SIZE)
+        copy.__runs = self.__runs
+        copy.__timeouts = self.__timeouts
+        copy.__window.extend(self.__window)
+        return copy
+
+    @property
+    def runs(self) -> int:
+        return self.__runs
+
+    @property
+    def timeouts(self) -> int:
+        return self.__timeouts
+
+    @property
+    def wall_time(self) -> Summary:
+        return self.__summarize([usage.wall_time for usage in self.__window])
+
+    @property
+    def user_time(self) -> Summary:
+        return self.__summarize([usage.user_time for usage in self.__window])
+
+    @property
+    def system_time(self) -> Summary:
+        return self.__summarize([usage.system_time for usage in self.__window])
+
+    @property
+    def max_rss(self) -> Summary:
+        return self.__summarize([usage.max_rss for usage in self.__window])
+
+    @staticmethod
+    def __summarize(values: list[float]) -> Summary:
+        assert values, 'BUG: statistics should contain at least one run'
+        return Summary(last=values[-1], mean=sum(values) / len(values), maximum=max(values))
+
+
+class Telemetry:
+    """
+    Keeps usage statistics per judge identity.
+    Judges record their runs from the event loop; the statistics can be read from any thread.
+    """
+
+    __statistics: dict[Hashable, UsageStatistics]
+
+    __lock: threading.Lock
+
+    def __init__(self):
+        self.__statistics = {}
+        self.__lock = threading.Lock()
+
+    def record(self, identity: Hashable, usage: ResourceUsage, judgment: Optional[Judgment] = None) -> None:
+        """
+        Records a run of the judge with the given identity and the judgment it led to, None if unknown.
+        """
+        with self.__lock:
+            if identity not in self.__statistics:
+                self.__statistics[identity] = UsageStatistics()
+            self.__statistics[identity].record(usage, judgment)
+
+    def find(self, identity: Hashable) -> Optional[UsageStatistics]:
+        """
+        Returns a copy of the statistics for the given identity, None if it has never been judged.
+        """
+        with self.__lock:
+            statistics = self.__statistics.get(identity)
+            if statistics is None:
+                return None
+            return statistics.copy()
+
+
+_telemetry = Telemetry()
+
+
+def get_telemetry() -> Telemetry:
+    return _telemetry
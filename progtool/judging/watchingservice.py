@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import Optional
+
+from progtool import settings
+from progtool.content.tree import ContentNode, Exercise
+from progtool.judging.dependencies import get_dependency_tracker
+from progtool.judging.exerciseindex import ExerciseIndex
+from progtool.judging.filewatcher import FileWatcher, create_file_watcher
+from progtool.judging.judgingservice import JudgingPriority, JudgingService
+
+
+class WatchingService:
+    """
+    Rejudges exercises when their files change.
+
+    Changed files are mapped to exercises using an ExerciseIndex.
+    Changes are debounced: judging only starts once no more changes have come in for the given delay,
+    so that a burst of saves results in a single judgment.
+    """
+
+    __event_loop: asyncio.AbstractEventLoop
+
+    __judging_service: JudgingService
+
+    __watcher: FileWatcher
+
+    __index: ExerciseIndex
+
+    # Seconds without changes before judging starts
+    __delay: float
+
+    # Exercises waiting for the delay to pass
+    __pending: dict[Exercise, None]
+
+    __timer: Optional[asyncio.TimerHandle]
+
+    def __init__(self, root: ContentNode, judging_service: JudgingService, event_loop: asyncio.AbstractEventLoop, watcher: Optional[FileWatcher] = None, delay: Optional[float] = None):
+        self.__event_loop = event_loop
+        self.__judging_service = judging_service
+        self.__watcher = watcher or create_file_watcher(root.local_path)
+        self.__index = ExerciseIndex(root, get_dependency_tracker())
+        self.__delay = settings.watch_delay() if delay is None else delay
+        self.__pending = {}
+        self.__timer = None
+
+        self.__event_loop.call_soon_threadsafe(self.__watcher.start, self.__on_changes)
+
+    def stop(self) -> None:
+        def stop_watching():
+            self.__watcher.stop()
+            if self.__timer is not None:
+                self.__timer.cancel()
+        self.__event_loop.call_soon_threadsafe(stop_watching)
+
+    def __on_changes(self, paths: list[Path]) -> None:
+        affected = [exercise for path in paths for exercise in self.__index.find_affected_exercises(path)]
+        if affected:
+            logging.debug(f'[Watcher] {", ".join(map(str, paths))} changed')
+            self.__pending.update(dict.fromkeys(affected))
+            if self.__timer is not None:
+                self.__timer.cancel()
+            self.__timer = self.__event_loop.call_later(self.__delay, self.__judge_pending)
+
+    def __judge_pending(self) -> None:
+        self.__timer = None
+        exercises = list(self.__pending)
+        self.__pending.clear()
+        logging.info(f'[Watcher] Files changed; rejudging {", ".join(str(exercise.tree_path) for exercise in exercises)}')
+        for exercise in exercises:
+            self.__judging_service.judge(exercise, JudgingPriority.INTERACTIVE)
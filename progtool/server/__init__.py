@@ -1,29 +1,41 @@
+import asyncio
 import logging
 import re
-from typing import Literal, Optional
+from typing import Iterator, Literal, Optional
 
 import flask
 import pydantic
 import sass
 
 from progtool import settings
-from progtool.content.tree import (ContentNode, ContentTreeLeaf)
+from progtool.content.tree import (ContentNode, ContentTreeLeaf, Exercise)
 from progtool.content.treepath import TreePath
 from progtool.judging.cachingservice import CachingService
-from progtool.judging.judgingservice import JudgingService
-from progtool.server import rest
+from progtool.judging.judgingservice import JudgingPriority, JudgingService
+from progtool.judging.outputstore import get_output_store
+from progtool.judging.progress import get_progress_tracker
+from progtool.judging.telemetry import Summary, UsageStatistics, get_telemetry
+from progtool.judging.watchingservice import WatchingService
 from progtool.server.bgthread import create_background_worker
-from progtool.server.content import Content, load_content
+from progtool.server.content import Content, SerializedResponse, load_content
 from progtool.server.error import ServerError
+from progtool.server.events import EventLog, JudgmentEventLog, ProgressEventLog
 from progtool.server.protocols import find_protocol
 
 
 app = flask.Flask(__name__)
 
+# Number of bytes of in-memory data (e.g., markdown from a bundle) written at a time
+STREAM_CHUNK_SIZE = 64 * 1024
+
 _content: Optional[Content] = None
 
 _judging_service: Optional[JudgingService] = None
 
+_judgment_events: Optional[JudgmentEventLog] = None
+
+_progress_events: Optional[ProgressEventLog] = None
+
 def get_content() -> Content:
     if _content is None:
         raise ServerError("Content not yet loaded")
@@ -38,6 +50,20 @@ def get_judging_service() -> JudgingService:
         return _judging_service
 
 
+def get_judgment_events() -> JudgmentEventLog:
+    if _judgment_events is None:
+        raise ServerError("Judgment events are not being recorded")
+    else:
+        return _judgment_events
+
+
+def get_progress_events() -> ProgressEventLog:
+    if _progress_events is None:
+        raise ServerError("Judging progress is not being recorded")
+    else:
+        return _progress_events
+
+
 @app.route('/')
 @app.route('/nodes/')
 def root():
@@ -52,10 +78,8 @@ def node_page(node_path: str):
         protocol = find_protocol(extension)
         if protocol is None:
             return flask.Response(f"Unsupported format {extension}", 400)
-        parts = node_path.split('/')
-        tree_path = TreePath(*parts[:-1])
-        content_node = find_node(tree_path)
-        filename = parts[-1]
+        directory, _, filename = node_path.rpartition('/')
+        content_node = find_node(directory)
         return protocol.serve(content_node, filename)
     else:
         return serve_html()
@@ -63,19 +87,18 @@ def node_page(node_path: str):
 
 @app.route('/api/v1/overview')
 def rest_overview():
-    content = get_content()
-    root = content.root
-    data = rest.convert_tree(root)
-    return flask.jsonify(data.model_dump(mode='json'))
+    return serve_serialized(get_content().overview)
 
 
 @app.route('/api/v1/markdown/', defaults={'node_path': ''})
 @app.route('/api/v1/markdown/<path:node_path>')
 def rest_markup(node_path: str):
-    content_node = find_node(TreePath.parse(node_path))
+    content_node = find_node(node_path)
     match content_node:
-        case ContentTreeLeaf(markdown=markdown):
-            return flask.Response(markdown, mimetype='text/markdown')
+        case ContentTreeLeaf(markdown_bytes=markdown):
+            response = flask.Response(stream_view(markdown), mimetype='text/markdown')
+            response.content_length = markdown.nbytes
+            return response
         case _:
             return 'error', 400
 
@@ -93,7 +116,7 @@ class JudgmentFailure(pydantic.BaseModel):
 @app.route('/api/v1/judgment/<path:node_path>')
 def rest_judgment(node_path: str):
     try:
-        content_node = find_node(TreePath.parse(node_path))
+        content_node = find_node(node_path)
         judgments = {}
         for exercise in content_node.exercises:
             judgments[str(exercise.tree_path)] = str(exercise.judgment).lower()
@@ -102,6 +125,34 @@ def rest_judgment(node_path: str):
         return flask.jsonify(JudgmentFailure())
 
 
+@app.route('/api/v1/judgment-events/', defaults={'node_path': ''})
+@app.route('/api/v1/judgment-events/<path:node_path>')
+def rest_judgment_events(node_path: str):
+    return serve_events(get_judgment_events(), node_path)
+
+
+@app.route('/api/v1/judging-progress/', defaults={'node_path': ''})
+@app.route('/api/v1/judging-progress/<path:node_path>')
+def rest_judging_progress(node_path: str):
+    return serve_events(get_progress_events(), node_path)
+
+
+@app.route('/api/v1/judgment-output/<path:node_path>')
+def rest_judgment_output(node_path: str):
+    content_node = find_node(node_path)
+    match content_node:
+        case Exercise(judge=judge, judgment_fingerprint=fingerprint):
+            # Only the output belonging to the current judgment is served, not that of an earlier version of the files
+            output = get_output_store().find(judge.identity, fingerprint)
+            if output is None:
+                return flask.Response(f'No output available for {node_path}', 404)
+            response = flask.Response(output, mimetype='text/plain')
+            response.cache_control.no_cache = True
+            return response
+        case _:
+            return flask.Response(f'{node_path} is not an exercise', 400)
+
+
 class RejudgeResponse(pydantic.BaseModel):
     status: Literal['ok'] | Literal['fail']
 
@@ -110,7 +161,7 @@ class RejudgeResponse(pydantic.BaseModel):
 @app.route('/api/v1/judgment/<path:node_path>', methods=['POST'])
 def rest_rejudge(node_path: str):
     try:
-        content_node = find_node(TreePath.parse(node_path))
+        content_node = find_node(node_path)
         get_judging_service().judge_recursively(content_node)
         response = RejudgeResponse(status='ok')
     except:
@@ -119,6 +170,73 @@ def rest_rejudge(node_path: str):
     return flask.jsonify(response.model_dump())
 
 
+class JudgingStatus(pydantic.BaseModel):
+    workers: int
+    queued: int
+    in_flight: int
+
+
+@app.route('/api/v1/judging-status')
+def rest_judging_status():
+    judging_service = get_judging_service()
+    status = JudgingStatus(
+        workers=judging_service.worker_count,
+        queued=judging_service.queue_depth,
+        in_flight=judging_service.in_flight,
+    )
+    return flask.jsonify(status.model_dump())
+
+
+class UsageSummary(pydantic.BaseModel):
+    last: float
+    mean: float
+    max: float
+
+    @staticmethod
+    def create(summary: Summary) -> 'UsageSummary':
+        return UsageSummary(last=summary.last, mean=summary.mean, max=summary.maximum)
+
+
+class ExerciseStatistics(pydantic.BaseModel):
+    runs: int
+    timeouts: int
+    # Seconds
+    wall_time: UsageSummary
+    user_time: UsageSummary
+    system_time: UsageSummary
+    # Bytes
+    max_rss: UsageSummary
+
+    @staticmethod
+    def create(statistics: UsageStatistics) -> 'ExerciseStatistics':
+        return ExerciseStatistics(
+            runs=statistics.runs,
+            timeouts=statistics.timeouts,
+            wall_time=UsageSummary.create(statistics.wall_time),
+            user_time=UsageSummary.create(statistics.user_time),
+            system_time=UsageSummary.create(statistics.system_time),
+            max_rss=UsageSummary.create(statistics.max_rss),
+        )
+
+
+class JudgingStatistics(pydantic.BaseModel):
+    # Only exercises that have been judged since the server started
+    exercises: dict[str, ExerciseStatistics]
+
+
+@app.route('/api/v1/judging-stats/', defaults={'node_path': ''})
+@app.route('/api/v1/judging-stats/<path:node_path>')
+def rest_judging_statistics(node_path: str):
+    content_node = find_node(node_path)
+    telemetry = get_telemetry()
+    exercises = {}
+    for exercise in content_node.exercises:
+        statistics = telemetry.find(exercise.judge.identity)
+        if statistics is not None:
+            exercises[str(exercise.tree_path)] = ExerciseStatistics.create(statistics)
+    return flask.jsonify(JudgingStatistics(exercises=exercises).model_dump())
+
+
 @app.route('/styles.css')
 def stylesheet():
     scss = settings.get_settings().style_path.read_text()
@@ -126,30 +244,98 @@ def stylesheet():
     return flask.Response(css, mimetype='text/css')
 
 
+def serve_serialized(serialized: SerializedResponse) -> flask.Response:
+    if flask.request.accept_encodings['gzip'] > 0:
+        response = flask.Response(serialized.gzipped_data, mimetype='application/json')
+        response.content_encoding = 'gzip'
+        response.set_etag(serialized.gzipped_etag)
+    else:
+        response = flask.Response(serialized.data, mimetype='application/json')
+        response.set_etag(serialized.etag)
+    response.vary.add('Accept-Encoding')
+    # Have the browser revalidate every time; unchanged content is answered with 304 Not Modified
+    response.cache_control.no_cache = True
+    # Turns the response into a 304 in place if the client's ETag matches
+    response.make_conditional(flask.request)
+    return response
+
+
+def stream_view(view: memoryview) -> Iterator[bytes]:
+    """
+    Streams the data in view without copying all of it at once.
+    WSGI requires bytes, so each chunk is copied as it is written.
+    """
+    for offset in range(0, view.nbytes, STREAM_CHUNK_SIZE):
+        yield bytes(view[offset:offset + STREAM_CHUNK_SIZE])
+
+
+def serve_events(event_log: EventLog, node_path: str) -> flask.Response:
+    content_node = find_node(node_path)
+    # EventSource sends Last-Event-ID when reconnecting; the query parameter allows resuming after a page reload
+    last_event_id = flask.request.headers.get('Last-Event-ID') or flask.request.args.get('lastEventId')
+    response = flask.Response(event_log.stream(content_node, last_event_id), mimetype='text/event-stream')
+    response.cache_control.no_cache = True
+    # Keeps reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def serve_html() -> str:
     with settings.html_path().open(encoding='utf-8') as file:
         return file.read()
 
 
-def find_node(tree_path: TreePath) -> ContentNode:
-    return get_content().root.descend(tree_path)
+def find_node(node_path: str) -> ContentNode:
+    return get_content().find_node(node_path)
 
 
-def run(debug: bool = False):
+def run(debug: bool = False, use_bundle: bool = False):
     logging.info("Loading content")
     global _content
-    _content = load_content()
+    _content = content = load_content(use_bundle=use_bundle)
 
     logging.info('Creating background worker')
     event_loop = create_background_worker()
 
-    logging.info('Setting up caching service')
-    caching_service = CachingService(_content.root, event_loop)
-
     logging.info('Setting up judging service')
     global _judging_service
     _judging_service = JudgingService(event_loop)
-    _judging_service.judge_recursively(_content.root, only_unknown=True)
+
+    global _judgment_events, _progress_events
+    _judgment_events = judgment_events = JudgmentEventLog()
+    _progress_events = progress_events = ProgressEventLog(get_progress_tracker())
+
+    caching_service: Optional[CachingService] = None
+
+    # Done on the background thread since it requires the entire tree, which might not be loaded yet
+    async def initialize_judgments():
+        nonlocal caching_service
+        assert _content is not None and _judging_service is not None
+        logging.info('Setting up caching service')
+        caching_service = CachingService(_content.root, event_loop)
+        # Only after loading the cache, so that cached judgments are not reported as changes
+        judgment_events.observe(_content.root)
+        progress_events.observe(_content.root)
+        # Exercises whose files did not change according to git keep their cached judgment;
+        # the others are checked in the background (and only actually judged if their fingerprint changed)
+        # Asking git is done on a worker thread, so that the event loop keeps serving judgments and events meanwhile
+        for exercise in await caching_service.find_stale_exercises():
+            _judging_service.judge(exercise, priority=JudgingPriority.BACKGROUND)
+        if settings.watch_files() and not use_bundle:
+            logging.info('Setting up watching service')
+            WatchingService(_content.root, _judging_service, event_loop)
+
+    asyncio.run_coroutine_threadsafe(initialize_judgments(), event_loop)
+
+    # The caching service belongs to the background thread, so it has to be closed there too
+    async def close_caching_service():
+        if caching_service is not None:
+            await caching_service.close()
 
     logging.info('Starting up Flask')
-    app.run(debug=debug)
+    try:
+        app.run(host=settings.server_host(), port=settings.server_port(), debug=debug)
+    finally:
+        logging.info('Writing pending judgments')
+        asyncio.run_coroutine_threadsafe(close_caching_service(), event_loop).result(timeout=10)
+        content.close()
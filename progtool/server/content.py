@@ -1,46 +1,161 @@
+import gzip
+import hashlib
 import logging
+import threading
+from typing import NamedTuple, Optional
 
 from progtool import repository, settings
-from progtool.content.metadata import load_everything, load_metadata
+from progtool.content.bundle import BundleError, StaleBundleError, load_bundle
+from progtool.content.metadata import MetadataSnapshot, load_everything, load_repository_metadata
 from progtool.content.navigator import ContentNavigator
-from progtool.content.tree import ContentNode, build_tree
+from progtool.content.tree import ContentNode, build_lazy_tree, build_tree
+from progtool.content.treepath import TreePath
+from progtool.server import rest
 from progtool.server.error import ServerError
 
 
+class SerializedResponse(NamedTuple):
+    """
+    Response body serialized ahead of time, along with its gzipped version and their ETags.
+    """
+    data: bytes
+    etag: str
+    gzipped_data: bytes
+    gzipped_etag: str
+
+    @staticmethod
+    def create(data: bytes) -> 'SerializedResponse':
+        etag = hashlib.sha256(data).hexdigest()
+        # mtime=0 makes the compressed data depend only on data
+        gzipped_data = gzip.compress(data, mtime=0)
+        return SerializedResponse(data, etag, gzipped_data, f'{etag}-gzip')
+
+
 class Content:
     __root: ContentNode
-    __navigator: ContentNavigator
+    __navigator: Optional[ContentNavigator]
+    __overview: Optional[SerializedResponse]
+    __lock: threading.Lock
+
+    # Maps tree paths in string form (as they appear in URLs) to nodes
+    __index: dict[str, ContentNode]
+
+    # Snapshot that a lazy tree reads its metadata through; saved on closing
+    __snapshot: Optional[MetadataSnapshot]
 
-    def __init__(self, root: ContentNode, navigator: ContentNavigator):
+    def __init__(self, root: ContentNode, *, build_index: bool = True, snapshot: Optional[MetadataSnapshot] = None):
+        """
+        If build_index is False, the index is filled in as nodes are looked up,
+        which avoids loading the entire tree up front.
+        """
         assert isinstance(root, ContentNode)
         self.__root = root
-        self.__navigator = navigator
+        self.__snapshot = snapshot
+        self.__navigator = None
+        self.__overview = None
+        self.__lock = threading.Lock()
+        if build_index:
+            self.__index = {str(node.tree_path): node for node in root.preorder_traversal()}
+        else:
+            self.__index = {}
 
     @property
     def root(self) -> ContentNode:
         return self.__root
 
+    def close(self) -> None:
+        """
+        Saves the metadata read since loading, so that the next run can reuse it.
+        """
+        if self.__snapshot is not None:
+            self.__snapshot.save()
+
+    def find_node(self, node_path: str) -> ContentNode:
+        """
+        Looks up a node given its tree path in string form, e.g., 'basics/loops'.
+        """
+        node = self.__index.get(node_path)
+        if node is None:
+            node = self.__root.descend(TreePath.parse(node_path))
+            self.__index[node_path] = node
+        return node
+
     @property
     def navigator(self) -> ContentNavigator:
-        return self.__navigator
+        # Built on demand, as building it requires the entire tree to be loaded
+        with self.__lock:
+            if self.__navigator is None:
+                logging.info("Building navigator")
+                self.__navigator = ContentNavigator(self.__root)
+            return self.__navigator
+
+    @property
+    def overview(self) -> SerializedResponse:
+        # The content never changes while loaded, so the overview only needs to be serialized once
+        navigator = self.navigator
+        with self.__lock:
+            if self.__overview is None:
+                logging.info("Serializing overview")
+                tree = rest.convert_tree(self.__root, navigator)
+                self.__overview = SerializedResponse.create(tree.model_dump_json().encode('utf-8'))
+            return self.__overview
 
 
-def load_content() -> Content:
+def load_content(use_bundle: bool = False) -> Content:
     logging.info("Loading content...")
-    root_path = settings.repository_exercise_root()
+    bundled_tree = load_bundled_tree() if use_bundle else None
+    if bundled_tree is not None:
+        content = Content(bundled_tree)
+        # Serialized up front, like content loaded from the sources
+        content.overview
+    elif settings.lazy_loading():
+        # Metadata is only read as the tree is explored, so the snapshot is saved when the content is closed
+        snapshot = MetadataSnapshot(settings.metadata_snapshot())
+        # Building the index would load the entire tree
+        content = Content(load_lazy_tree(snapshot), build_index=False, snapshot=snapshot)
+    else:
+        content = Content(load_tree())
+        # Lazy content is only serialized on first request, as serializing requires the entire tree
+        content.overview
 
+    logging.info("Done reading content")
+    return content
+
+
+def load_tree() -> ContentNode:
     logging.info("Loading metadata")
     # TODO Add tag filtering functionality
-    metadata = load_metadata(root_path, link_predicate=load_everything(force_all=True))
+    metadata = load_repository_metadata(link_predicate=load_everything(force_all=True))
 
     if metadata is None:
         raise ServerError("No content found!")
 
     logging.info("Building tree")
-    tree = build_tree(metadata)
+    return build_tree(metadata)
 
-    logging.info("Building navigator")
-    navigator = ContentNavigator(tree)
 
-    logging.info("Done reading content")
-    return Content(tree, navigator)
+def load_bundled_tree() -> Optional[ContentNode]:
+    """
+    Returns None if the bundle is older than the content's sources, which should be loaded instead.
+    """
+    try:
+        return load_bundle(settings.bundle_path(), settings.repository_exercise_root())
+    except StaleBundleError as e:
+        logging.warning(f"{e}; loading content from the sources instead")
+        return None
+    except BundleError as e:
+        raise ServerError(f"Failed to load bundle: {e}")
+
+
+def load_lazy_tree(snapshot: MetadataSnapshot) -> ContentNode:
+    logging.info("Building lazy tree")
+    tree = build_lazy_tree(
+        settings.repository_exercise_root(),
+        link_predicate=load_everything(force_all=True),
+        read_template=snapshot.read_template,
+    )
+
+    if tree is None:
+        raise ServerError("No content found!")
+
+    return tree
@@ -0,0 +1,167 @@
+import abc
+import collections
+import json
+import threading
+import uuid
+from typing import Any, Hashable, Iterator, NamedTuple, Optional
+
+from progtool.content.tree import ContentNode, Exercise
+from progtool.content.treepath import TreePath
+from progtool.judging.progress import JudgingProgress, ProgressTracker
+
+
+# Number of events kept around for clients that reconnect
+HISTORY_SIZE = 1000
+
+# Seconds between keepalive comments, which also let the server notice disconnected clients
+KEEPALIVE_INTERVAL = 15
+
+
+class Event(NamedTuple):
+    sequence_number: int
+    tree_path: TreePath
+    type: str
+    data: dict[str, Any]
+
+
+class EventLog(abc.ABC):
+    """
+    Records events concerning exercises and streams them as Server-Sent Events.
+
+    Event ids consist of an identifier of the log and a sequence number,
+    so that ids handed out by an earlier run of the server are recognized as such.
+    A client that connects without a usable Last-Event-ID first receives a snapshot of its subtree.
+    """
+
+    __identifier: str
+
+    __events: collections.deque[Event]
+
+    # Sequence number of the most recent event, 0 if there are none
+    __last_sequence_number: int
+
+    __condition: threading.Condition
+
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        self.__identifier = uuid.uuid4().hex[:8]
+        self.__events = collections.deque(maxlen=history_size)
+        self.__last_sequence_number = 0
+        self.__condition = threading.Condition()
+
+    @abc.abstractmethod
+    def snapshot(self, content_node: ContentNode) -> dict[str, Any]:
+        """
+        Describes the current state of the subtree rooted at content_node.
+        """
+        ...
+
+    def publish(self, tree_path: TreePath, type: str, data: dict[str, Any]) -> None:
+        with self.__condition:
+            self.__last_sequence_number += 1
+            self.__events.append(Event(self.__last_sequence_number, tree_path, type, data))
+            self.__condition.notify_all()
+
+    def stream(self, content_node: ContentNode, last_event_id: Optional[str] = None, keepalive_interval: float = KEEPALIVE_INTERVAL) -> Iterator[str]:
+        """
+        Yields the messages of an event stream for the subtree rooted at content_node, never returning.
+        """
+        subtree = content_node.tree_path.parts
+        position = self.__parse_event_id(last_event_id)
+        while True:
+            events = self.__wait_for_events(position, keepalive_interval) if position is not None else None
+            if events is None:
+                # Events have been missed, so the client needs a fresh start
+                position, message = self.__create_snapshot(content_node)
+                yield message
+            elif not events:
+                yield ': keepalive\n\n'
+            else:
+                for event in events:
+                    if event.tree_path.parts[:len(subtree)] == subtree:
+                        yield self.__format(event.sequence_number, event.type, event.data)
+                position = events[-1].sequence_number
+
+    def __parse_event_id(self, event_id: Optional[str]) -> Optional[int]:
+        if event_id is None:
+            return None
+        identifier, _, sequence_number = event_id.partition(':')
+        if identifier != self.__identifier or not sequence_number.isdigit():
+            return None
+        return int(sequence_number)
+
+    def __wait_for_events(self, position: int, timeout: float) -> Optional[list[Event]]:
+        """
+        Waits for events after position and returns them, or an empty list on timeout.
+        Returns None if some of these events are no longer available.
+        """
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__last_sequence_number != position, timeout)
+            if position > self.__last_sequence_number:
+                return None
+            missed = self.__last_sequence_number - position
+            if missed > len(self.__events):
+                return None
+            return list(self.__events)[len(self.__events) - missed:]
+
+    def __create_snapshot(self, content_node: ContentNode) -> tuple[int, str]:
+        # Changes after this position will be sent as events, even if the snapshot already includes them
+        with self.__condition:
+            position = self.__last_sequence_number
+        return position, self.__format(position, 'snapshot', self.snapshot(content_node))
+
+    def __format(self, sequence_number: int, type: str, data: dict[str, Any]) -> str:
+        return f'id: {self.__identifier}:{sequence_number}\nevent: {type}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+class JudgmentEventLog(EventLog):
+    """
+    Streams changes of judgment.
+    """
+
+    def observe(self, root: ContentNode) -> None:
+        def create_observer(exercise: Exercise):
+            return lambda: self.publish_judgment(exercise)
+        for exercise in root.exercises:
+            exercise.observe_judgment(create_observer(exercise))
+
+    def publish_judgment(self, exercise: Exercise) -> None:
+        self.publish(exercise.tree_path, 'judgment', {'path': str(exercise.tree_path), 'judgment': str(exercise.judgment).lower()})
+
+    def snapshot(self, content_node: ContentNode) -> dict[str, Any]:
+        return {'judgments': {str(exercise.tree_path): str(exercise.judgment).lower() for exercise in content_node.exercises}}
+
+
+class ProgressEventLog(EventLog):
+    """
+    Streams the progress of exercises being judged.
+    A progress event without progress means judging has ended.
+    """
+
+    __tracker: ProgressTracker
+
+    def __init__(self, tracker: ProgressTracker, history_size: int = HISTORY_SIZE):
+        super().__init__(history_size)
+        self.__tracker = tracker
+
+    def observe(self, root: ContentNode) -> None:
+        exercises: dict[Hashable, list[Exercise]] = {}
+        for exercise in root.exercises:
+            exercises.setdefault(exercise.judge.identity, []).append(exercise)
+
+        def observer(identity: Hashable, progress: Optional[JudgingProgress]) -> None:
+            for exercise in exercises.get(identity, []):
+                self.publish(exercise.tree_path, 'progress', {'path': str(exercise.tree_path), 'progress': self.__convert(progress)})
+
+        self.__tracker.observe(observer)
+
+    def snapshot(self, content_node: ContentNode) -> dict[str, Any]:
+        progress = {}
+        for exercise in content_node.exercises:
+            exercise_progress = self.__tracker.find(exercise.judge.identity)
+            if exercise_progress is not None:
+                progress[str(exercise.tree_path)] = self.__convert(exercise_progress)
+        return {'progress': progress}
+
+    @staticmethod
+    def __convert(progress: Optional[JudgingProgress]) -> Optional[dict[str, Any]]:
+        return progress._asdict() if progress is not None else None
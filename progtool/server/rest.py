@@ -39,7 +39,9 @@ class Exercise(Leaf):
 
 
 
-def convert_tree(root: content.ContentNode) -> Node:
+def convert_tree(root: content.ContentNode, navigator: Optional[ContentNavigator] = None) -> Node:
+    tree_navigator = ContentNavigator(root) if navigator is None else navigator
+
     def format_tree_path_of(node: Optional[content.ContentNode]) -> Optional[RestTreePath]:
         if node is None:
             return None
@@ -53,9 +55,9 @@ def convert_tree(root: content.ContentNode) -> Node:
         return f'/api/v1/judgment/{"/".join(tree_path.parts)}'
 
     def convert(content_node: content.ContentNode) -> Node:
-        predecessor = navigator.find_predecessor_leaf(content_node)
-        successor = navigator.find_successor_leaf(content_node)
-        parent = navigator.find_parent(content_node)
+        predecessor = tree_navigator.find_predecessor_leaf(content_node)
+        successor = tree_navigator.find_successor_leaf(content_node)
+        parent = tree_navigator.find_parent(content_node)
 
         match content_node:
             case content.Section(children=children):
@@ -94,5 +96,4 @@ def convert_tree(root: content.ContentNode) -> Node:
             case _:
                 raise RuntimeError(f"Unrecognized node type: {type(content_node)}")
 
-    navigator = ContentNavigator(root)
     return convert(root)
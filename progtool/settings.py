@@ -1,7 +1,8 @@
 import abc
 import logging
+import os
 from pathlib import Path
-from typing import Annotated, Optional
+from typing import Annotated, Literal, Optional
 import yaml
 import pydantic
 
@@ -16,6 +17,25 @@ class Settings(pydantic.BaseModel):
     style_path: Optional[SerializablePath] = None
     repository_root: Optional[SerializablePath] = None
     judgment_cache: Optional[SerializablePath] = None
+    judgment_store: Literal['json', 'sqlite'] = 'sqlite'
+    judgment_database: Optional[SerializablePath] = None
+    metadata_snapshot: Optional[SerializablePath] = None
+    metadata_loading: Literal['serial', 'parallel'] = 'serial'
+    bundle_path: Optional[SerializablePath] = None
+    lazy_loading: bool = False
+    judge_workers: Optional[int] = None
+    judge_runner: Literal['subprocess', 'pool'] = 'subprocess'
+    judge_batch_size: int = 1
+    judge_timeout: Optional[float] = None
+    judge_cpu_limit: Optional[int] = None
+    judge_memory_limit: Optional[int] = None
+    judge_output_limit: int = 64 * 1024
+    judge_output_cache_size: int = 100
+    judge_output_directory: Optional[SerializablePath] = None
+    watch_files: bool = False
+    watch_delay: float = 0.5
+    server_host: str = '127.0.0.1'
+    server_port: int = 5000
     cache_delay: float
 
 
@@ -34,6 +54,18 @@ def default_judgment_cache_path() -> Path:
     return default_storage_path() / "progtool-cache.json"
 
 
+def default_judgment_database_path() -> Path:
+    return default_storage_path() / "progtool-cache.sqlite"
+
+
+def default_metadata_snapshot_path() -> Path:
+    return default_storage_path() / "progtool-metadata.pickle"
+
+
+def default_bundle_path() -> Path:
+    return default_storage_path() / "progtool-content.bundle"
+
+
 def default_html_path() -> Path:
     return default_storage_path() / "progtool-index.html"
 
@@ -113,15 +145,25 @@ def verify_settings(settings: Settings) -> None:
         logging.info(f'Style file {settings.style_path} does not exist')
         raise MissingStyleFile(settings.style_path)
 
-    logging.debug('Checking if judgment cache is set')
-    if settings.judgment_cache is None:
-        logging.info(f'No judgment cache is set')
-        raise MissingJudgmentCacheSetting()
-
-    logging.debug('Checking if judgment cache exists')
-    if not settings.judgment_cache.is_file():
-        logging.info(f'Judgment cache {settings.judgment_cache} does not exist')
-        raise MissingJudgmentCacheFile(settings.judgment_cache)
+    match settings.judgment_store:
+        case 'json':
+            logging.debug('Checking if judgment cache is set')
+            if settings.judgment_cache is None:
+                logging.info(f'No judgment cache is set')
+                raise MissingJudgmentCacheSetting()
+
+            logging.debug('Checking if judgment cache exists')
+            if not settings.judgment_cache.is_file():
+                logging.info(f'Judgment cache {settings.judgment_cache} does not exist')
+                raise MissingJudgmentCacheFile(settings.judgment_cache)
+        case 'sqlite':
+            # The database is created on first use, so only its directory needs to exist;
+            # the JSON cache, if set, is merely imported once and may be missing
+            database = settings.judgment_database or default_judgment_database_path()
+            logging.debug('Checking if judgment database directory exists')
+            if not database.parent.is_dir():
+                logging.info(f'Directory of judgment database {database} does not exist')
+                raise MissingJudgmentDatabaseDirectory(database)
 
     logging.debug('Checking if repository root is set')
     if settings.repository_root is None:
@@ -187,6 +229,146 @@ def judgment_cache() -> Path:
     return path
 
 
+def judgment_store() -> Literal['json', 'sqlite']:
+    return get_settings().judgment_store
+
+
+def judgment_database() -> Path:
+    """
+    Location of the SQLite judgment store.
+    """
+    return get_settings().judgment_database or default_judgment_database_path()
+
+
+def legacy_judgment_cache() -> Optional[Path]:
+    """
+    JSON judgment cache whose contents are imported into the SQLite judgment store on first use, if any.
+    """
+    return get_settings().judgment_cache
+
+
+def metadata_snapshot() -> Path:
+    return get_settings().metadata_snapshot or default_metadata_snapshot_path()
+
+
+def metadata_loading() -> Literal['serial', 'parallel']:
+    return get_settings().metadata_loading
+
+
+def bundle_path() -> Path:
+    return get_settings().bundle_path or default_bundle_path()
+
+
+def lazy_loading() -> bool:
+    """
+    Whether linked metadata is only loaded when the server first needs it.
+    This only shortens the time until the server answers its first requests: setting up the judgment cache,
+    the initial judging and the event streams happens on the background thread right after startup
+    and needs every exercise, as does serving the overview, so the entire tree is loaded soon anyway.
+    """
+    return get_settings().lazy_loading
+
+
+def judge_workers() -> int:
+    """
+    Maximum number of exercises judged simultaneously; defaults to the number of CPUs.
+    """
+    return get_settings().judge_workers or os.cpu_count() or 1
+
+
+def judge_runner() -> Literal['subprocess', 'pool']:
+    return get_settings().judge_runner
+
+
+def judge_batch_size() -> int:
+    """
+    Maximum number of exercises judged in a single pytest session.
+    """
+    return max(1, get_settings().judge_batch_size)
+
+
+def judge_timeout() -> Optional[float]:
+    """
+    Number of seconds after which judging an exercise is aborted and judged TIMEOUT,
+    unless the exercise specifies its own timeout. None (the default) means no limit.
+    """
+    return get_settings().judge_timeout
+
+
+def judge_cpu_limit() -> Optional[int]:
+    """
+    Number of seconds of CPU time a judge process is allowed to use.
+    """
+    return get_settings().judge_cpu_limit
+
+
+def judge_memory_limit() -> Optional[int]:
+    """
+    Number of megabytes of address space a judge process is allowed to use.
+    """
+    return get_settings().judge_memory_limit
+
+
+def judge_output_limit() -> int:
+    """
+    Number of bytes of output kept per judge run.
+    """
+    return get_settings().judge_output_limit
+
+
+def judge_output_cache_size() -> int:
+    """
+    Number of judge outputs kept in memory.
+    """
+    return get_settings().judge_output_cache_size
+
+
+def judge_output_directory() -> Optional[Path]:
+    """
+    Directory to which judge outputs are moved when they no longer fit in memory, None to discard them.
+    """
+    return get_settings().judge_output_directory
+
+
+def watch_files() -> bool:
+    """
+    Whether exercises are rejudged automatically when their files change.
+    """
+    return get_settings().watch_files
+
+
+def watch_delay() -> float:
+    """
+    Number of seconds without further changes after which changed exercises are rejudged.
+    """
+    return get_settings().watch_delay
+
+
+def server_host() -> str:
+    """
+    Address the server listens on.
+    """
+    return get_settings().server_host
+
+
+def server_port() -> int:
+    """
+    Port the server listens on.
+    """
+    return get_settings().server_port
+
+
+def server_url() -> str:
+    """
+    URL at which the server can be reached from this machine.
+    """
+    host = server_host()
+    # A server listening on all interfaces is reached through the loopback interface
+    if host in ('', '0.0.0.0', '::'):
+        host = '127.0.0.1'
+    return f'http://{host}:{server_port()}'
+
+
 def cache_delay() -> float:
     return get_settings().cache_delay
 
@@ -226,6 +408,10 @@ class MissingJudgmentCacheFile(SettingsException):
     def __init__(self, path: Path):
         super().__init__(f'No file found at {path}')
 
+class MissingJudgmentDatabaseDirectory(SettingsException):
+    def __init__(self, path: Path):
+        super().__init__(f'No directory found for judgment database {path}')
+
 class MissingRepositoryRootSetting(SettingsException):
     def __init__(self):
         super().__init__(f'Missing repository root setting')
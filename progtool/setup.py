@@ -18,7 +18,21 @@ def initialize(settings_file_path: Path):
     initialize_repository_root(settings_file_path, settings)
     initialize_html_path(settings_file_path, settings)
     initialize_style_path(settings_file_path, settings)
-    initialize_judgment_cache_path(settings_file_path, settings)
+    match settings.judgment_store:
+        case 'json':
+            initialize_judgment_cache_path(settings_file_path, settings)
+        case 'sqlite':
+            initialize_judgment_database_path(settings)
+
+
+def initialize_judgment_database_path(settings: Settings) -> None:
+    logging.info('Initializing judgment database path')
+    path = settings.judgment_database or progtool.settings.default_judgment_database_path()
+    logging.debug(f'Checking if directory of judgment database {path} exists')
+    if not path.parent.is_dir():
+        logging.debug(f'No directory found for {path}; creating it now')
+        path.parent.mkdir(parents=True)
+    logging.info(f'Judgment database will be stored at {path}')
 
 
 def initialize_judgment_cache_path(settings_file_path: Path, settings: Settings) -> None:
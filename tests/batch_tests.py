@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+import progtool.judging.pytest
+from progtool.judging.judgment import Judgment
+from progtool.judging.pytest import PytestJudge
+from progtool.judging.telemetry import Telemetry
+
+
+pytestmark = pytest.mark.usefixtures('default_settings')
+
+
+EXERCISES = {
+    'correct': ('def square(x):\n    return x * x\n', 'from student import square\n\ndef test_square():\n    assert square(3) == 9\n'),
+    'incorrect': ('def square(x):\n    return x + x\n', 'from student import square\n\ndef test_square():\n    assert square(3) == 9\n'),
+    'broken': ('def square(x:\n', 'from student import square\n\ndef test_square():\n    assert square(3) == 9\n'),
+    'runtime-import': ('VALUE = 5\n', 'def test_value():\n    import student\n    assert student.VALUE == 5\n'),
+    'empty': ('', '\n'),
+    'skipped': ('', 'import pytest\n\n@pytest.mark.skip\ndef test_skipped():\n    pass\n'),
+    'stops-early': ('', 'def test_first():\n    assert False\n\ndef test_second():\n    open("ran", "w").close()\n'),
+}
+
+
+@pytest.fixture
+def judges(tmp_path):
+    judges = []
+    for name, (student, tests) in EXERCISES.items():
+        directory = tmp_path / name
+        directory.mkdir()
+        (directory / 'student.py').write_text(student)
+        (directory / 'tests.py').write_text(tests)
+        judges.append(PytestJudge(directory / 'tests.py'))
+    judges.append(PytestJudge(tmp_path / 'missing' / 'tests.py'))
+    return judges
+
+
+def test_batch_agrees_with_separate_judging(judges, tmp_path):
+    async def judge_both():
+        separately = [await judge.judge() for judge in judges]
+        (tmp_path / 'stops-early' / 'ran').unlink(missing_ok=True)
+        batch = await PytestJudge.judge_batch(judges)
+        return separately, batch
+
+    separately, batch = asyncio.run(judge_both())
+
+    assert batch == separately
+    assert batch[:2] == [Judgment.PASS, Judgment.FAIL]
+    assert not (tmp_path / 'stops-early' / 'ran').exists()
+
+
+def test_batch_survives_timeout(tmp_path):
+    judges = []
+    for name, tests in [('first', 'def test_pass():\n    pass\n'), ('loop', 'def test_loop():\n    while True:\n        pass\n'), ('last', 'def test_fail():\n    assert False\n')]:
+        directory = tmp_path / name
+        directory.mkdir()
+        (directory / 'tests.py').write_text(tests)
+        judges.append(PytestJudge(directory / 'tests.py', timeout=3))
+
+    judgments = asyncio.run(PytestJudge.judge_batch(judges))
+
+    assert judgments == [Judgment.PASS, Judgment.TIMEOUT, Judgment.FAIL]
+
+
+def test_judge_timeout(tmp_path, monkeypatch):
+    telemetry = Telemetry()
+    monkeypatch.setattr(progtool.judging.pytest, 'get_telemetry', lambda: telemetry)
+    (tmp_path / 'tests.py').write_text('def test_loop():\n    while True:\n        pass\n')
+    judge = PytestJudge(tmp_path / 'tests.py', timeout=1)
+
+    assert asyncio.run(judge.judge()) is Judgment.TIMEOUT
+
+    # The killed run is still accounted for
+    statistics = telemetry.find(judge.identity)
+    assert statistics is not None
+    assert (statistics.runs, statistics.timeouts) == (1, 1)
+    assert statistics.user_time.last > 0
@@ -0,0 +1,84 @@
+import pytest
+
+import progtool.server.content
+from progtool import settings
+from progtool.content.bundle import BundleError, StaleBundleError, load_bundle, write_bundle
+from progtool.content.metadata import load_everything, load_metadata
+from progtool.content.tree import ContentTreeLeaf, build_tree
+
+
+pytestmark = pytest.mark.usefixtures('default_settings')
+
+
+def test_bundle_round_trip(course, tmp_path):
+    (course / 'intro.md').write_text('# Intro\n\nWelcome')
+    (course / 'basics' / 'assignment.md').write_text('Loops', encoding='utf-8')
+    (course / 'basics' / 'variables' / 'assignment.md').write_text('Variables: x → y', encoding='utf-8')
+    metadata = load_metadata(course, link_predicate=load_everything())
+    bundle_path = tmp_path / 'content.bundle'
+
+    write_bundle(metadata, course, bundle_path)
+    expected = list(build_tree(metadata).preorder_traversal())
+    actual = list(load_bundle(bundle_path, course).preorder_traversal())
+
+    assert [(node.tree_path, type(node), node.name, node.local_path, node.topics) for node in actual] == \
+           [(node.tree_path, type(node), node.name, node.local_path, node.topics) for node in expected]
+    for actual_node, expected_node in zip(actual, expected):
+        if isinstance(actual_node, ContentTreeLeaf):
+            assert isinstance(expected_node, ContentTreeLeaf)
+            assert actual_node.markdown_path == expected_node.markdown_path
+            assert actual_node.markdown == expected_node.markdown
+            assert actual_node.markdown_bytes == expected_node.markdown.encode('utf-8')
+
+
+def test_bundle_of_other_repository_is_rejected(course, tmp_path):
+    metadata = load_metadata(course, link_predicate=load_everything())
+    bundle_path = tmp_path / 'content.bundle'
+    write_bundle(metadata, course, bundle_path)
+
+    with pytest.raises(BundleError):
+        load_bundle(bundle_path, tmp_path)
+
+
+@pytest.mark.parametrize('changed', ['intro.md', 'basics/metadata.yaml'])
+def test_bundle_older_than_sources_is_detected(course, tmp_path, changed):
+    (course / 'intro.md').write_text('# Intro')
+    metadata = load_metadata(course, link_predicate=load_everything())
+    bundle_path = tmp_path / 'content.bundle'
+    write_bundle(metadata, course, bundle_path)
+
+    with (course / changed).open('a') as file:
+        file.write('\n')
+
+    with pytest.raises(StaleBundleError):
+        load_bundle(bundle_path, course)
+    # Without a repository to compare with, the bundle is used as is
+    load_bundle(bundle_path)
+
+
+def test_stale_bundle_is_replaced_by_sources(course, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings.get_settings(), 'repository_root', tmp_path)
+    monkeypatch.setattr(settings.get_settings(), 'bundle_path', tmp_path / 'content.bundle')
+    (course / 'intro.md').write_text('# Intro')
+    write_bundle(load_metadata(course, link_predicate=load_everything()), course, tmp_path / 'content.bundle')
+    (course / 'intro.md').write_text('# Updated intro')
+
+    content = progtool.server.content.load_content(use_bundle=True)
+
+    assert content.find_node('intro').markdown == '# Updated intro'
+
+
+def test_bundled_content_has_overview(course, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings.get_settings(), 'repository_root', tmp_path)
+    monkeypatch.setattr(settings.get_settings(), 'bundle_path', tmp_path / 'content.bundle')
+    write_bundle(load_metadata(course, link_predicate=load_everything()), course, tmp_path / 'content.bundle')
+    convert_tree = progtool.server.content.rest.convert_tree
+    converted = []
+    monkeypatch.setattr(progtool.server.content.rest, 'convert_tree', lambda *args: converted.append(args) or convert_tree(*args))
+
+    content = progtool.server.content.load_content(use_bundle=True)
+
+    # Serialized while loading, and only then
+    assert len(converted) == 1
+    content.overview
+    assert len(converted) == 1
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import threading
+
+import git
+import pytest
+
+import progtool.judging.dependencies
+from progtool import settings
+from progtool.content.metadata import load_everything, load_metadata
+from progtool.content.tree import build_tree
+from progtool.judging.cachingservice import CachingService
+from progtool.judging.dependencies import DependencyTracker
+from progtool.judging.judgment import Judgment
+from progtool.judging.repositorystate import RepositoryTracker
+
+
+pytestmark = pytest.mark.usefixtures('default_settings')
+
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    path = tmp_path / 'cache.json'
+    monkeypatch.setattr(settings.get_settings(), 'judgment_cache', path)
+    monkeypatch.setattr(settings.get_settings(), 'judgment_database', tmp_path / 'cache.sqlite')
+    return path
+
+
+@pytest.fixture
+def event_loop():
+    event_loop = asyncio.new_event_loop()
+    yield event_loop
+    event_loop.close()
+
+
+def test_legacy_cache_is_loaded(course, cache_path, event_loop):
+    cache_path.write_text(json.dumps({'basics/loops': 'PASS'}))
+    root = build_tree(load_metadata(course, link_predicate=load_everything()))
+
+    CachingService(root, event_loop)
+
+    loops = root.descend(('basics', 'loops'))
+    assert loops.judgment is Judgment.PASS
+    assert loops.judgment_fingerprint is None
+
+
+def test_fingerprints_are_cached(course, cache_path, event_loop):
+    cache_path.write_text('{}')
+    root = build_tree(load_metadata(course, link_predicate=load_everything()))
+    caching_service = CachingService(root, event_loop)
+    loops = root.descend(('basics', 'loops'))
+    loops.judgment_fingerprint = 'fingerprint'
+    loops.judgment = Judgment.FAIL
+    event_loop.run_until_complete(caching_service.write_cache())
+
+    reloaded = build_tree(load_metadata(course, link_predicate=load_everything()))
+    CachingService(reloaded, event_loop)
+
+    reloaded_loops = reloaded.descend(('basics', 'loops'))
+    assert reloaded_loops.judgment is Judgment.FAIL
+    assert reloaded_loops.judgment_fingerprint == 'fingerprint'
+
+
+@pytest.fixture
+def repository(course):
+    repository = git.Repo.init(course)
+    with repository.config_writer() as config:
+        config.set_value('user', 'name', 'Test')
+        config.set_value('user', 'email', 'test@example.com')
+    repository.git.add('--all')
+    repository.index.commit('Initial commit')
+    return repository
+
+
+def judge_all_and_write_cache(course, event_loop):
+    root = build_tree(load_metadata(course, link_predicate=load_everything()))
+    caching_service = CachingService(root, event_loop)
+    event_loop.run_until_complete(caching_service.find_stale_exercises())
+    for exercise in root.exercises:
+        exercise.judgment_fingerprint = exercise.judge.fingerprint()
+        exercise.judgment = Judgment.PASS
+    event_loop.run_until_complete(caching_service.write_cache())
+
+
+def find_stale_exercises(course, event_loop):
+    root = build_tree(load_metadata(course, link_predicate=load_everything()))
+    return sorted(str(exercise.tree_path) for exercise in event_loop.run_until_complete(CachingService(root, event_loop).find_stale_exercises()))
+
+
+def test_unchanged_exercises_are_not_stale(course, cache_path, event_loop, repository):
+    judge_all_and_write_cache(course, event_loop)
+
+    assert find_stale_exercises(course, event_loop) == []
+
+
+def test_exercises_changed_in_working_tree_are_stale(course, cache_path, event_loop, repository):
+    (course / 'basics' / 'variables' / 'solution.py').write_text('x = 1\n')
+    judge_all_and_write_cache(course, event_loop)
+    (course / 'basics' / 'variables' / 'solution.py').write_text('x = 2\n')
+    (course / 'basics' / 'helper.py').write_text('y = 1\n')
+
+    assert find_stale_exercises(course, event_loop) == ['basics/loops', 'basics/variables']
+
+
+def test_exercises_changed_by_commits_are_stale(course, cache_path, event_loop, repository):
+    judge_all_and_write_cache(course, event_loop)
+    (course / 'basics' / 'variables' / 'solution.py').write_text('x = 1\n')
+    repository.git.add('--all')
+    repository.index.commit('Add solution')
+
+    assert find_stale_exercises(course, event_loop) == ['basics/variables']
+
+
+def test_exercises_changed_after_judging_are_stale(course, cache_path, event_loop, repository):
+    root = build_tree(load_metadata(course, link_predicate=load_everything()))
+    caching_service = CachingService(root, event_loop)
+    event_loop.run_until_complete(caching_service.find_stale_exercises())
+    for exercise in root.exercises:
+        exercise.judgment_fingerprint = exercise.judge.fingerprint()
+        exercise.judgment = Judgment.PASS
+    # Changed after judging, but before the cache was written
+    (course / 'basics' / 'helper.py').write_text('y = 1\n')
+    event_loop.run_until_complete(caching_service.write_cache())
+
+    assert find_stale_exercises(course, event_loop) == ['basics/loops']
+
+
+def test_exercises_importing_changed_files_are_stale(course, cache_path, event_loop, repository, monkeypatch):
+    (course / 'shared').mkdir()
+    (course / 'shared' / 'helper.py').write_text('y = 1\n')
+    repository.git.add('--all')
+    repository.index.commit('Add helper')
+    tracker = DependencyTracker()
+    monkeypatch.setattr(progtool.judging.dependencies, '_dependency_tracker', tracker)
+    variables = build_tree(load_metadata(course, link_predicate=load_everything())).descend(('basics', 'variables'))
+    tracker.record(variables.judge.identity, [course / 'shared' / 'helper.py'])
+    judge_all_and_write_cache(course, event_loop)
+    # The dependencies are loaded from the cache after a restart
+    monkeypatch.setattr(progtool.judging.dependencies, '_dependency_tracker', DependencyTracker())
+
+    (course / 'shared' / 'helper.py').write_text('y = 2\n')
+
+    assert find_stale_exercises(course, event_loop) == ['basics/variables']
+
+
+def test_all_exercises_are_stale_without_git(course, cache_path, event_loop):
+    judge_all_and_write_cache(course, event_loop)
+
+    assert find_stale_exercises(course, event_loop) == ['basics/loops', 'basics/variables']
+
+
+def test_repository_is_checked_off_the_event_loop(course, cache_path, event_loop, repository, monkeypatch):
+    threads = []
+    capture = RepositoryTracker.capture
+    def record_thread(tracker):
+        threads.append(threading.get_ident())
+        return capture(tracker)
+    monkeypatch.setattr(RepositoryTracker, 'capture', record_thread)
+    root = build_tree(load_metadata(course, link_predicate=load_everything()))
+    caching_service = CachingService(root, event_loop)
+    root.descend(('basics', 'loops')).judgment = Judgment.PASS
+
+    event_loop.run_until_complete(caching_service.write_cache())
+
+    assert threads
+    assert threading.get_ident() not in threads
+
+
+def test_stale_exercises_are_found_off_the_event_loop(course, cache_path, event_loop, repository, monkeypatch):
+    judge_all_and_write_cache(course, event_loop)
+    threads = []
+    capture = RepositoryTracker.capture
+    def record_thread(tracker):
+        threads.append(threading.get_ident())
+        return capture(tracker)
+    monkeypatch.setattr(RepositoryTracker, 'capture', record_thread)
+
+    assert find_stale_exercises(course, event_loop) == []
+    assert threads
+    assert threading.get_ident() not in threads
@@ -0,0 +1,60 @@
+from pathlib import Path
+
+import pytest
+import yaml
+
+from progtool import settings
+
+
+def write_metadata(directory: Path, data: dict) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    with (directory / 'metadata.yaml').open('w') as file:
+        yaml.dump(data, file)
+
+
+def exercise(identifier: str) -> dict:
+    return {
+        'type': 'exercise',
+        'id': identifier,
+        'name': identifier.capitalize(),
+        'difficulty': 1,
+        'documentation': {'en': 'assignment.md'},
+        'judge': {'type': 'pytest', 'file': 'tests.py'},
+    }
+
+
+@pytest.fixture
+def course(tmp_path: Path) -> Path:
+    root = tmp_path / 'exercises'
+    write_metadata(root, {
+        'type': 'section',
+        'id': 'root',
+        'name': 'Root',
+        'contents': [
+            {'type': 'link', 'location': 'basics'},
+            {'type': 'link', 'location': 'advanced', 'tags': ['advanced'], 'available_by_default': False},
+            {'type': 'explanation', 'id': 'intro', 'name': 'Intro', 'documentation': {'en': 'intro.md'}},
+        ],
+    })
+    write_metadata(root / 'basics', {
+        'type': 'section',
+        'id': 'basics',
+        'name': 'Basics',
+        'contents': [
+            {'type': 'link', 'location': 'variables'},
+            exercise('loops'),
+        ],
+    })
+    write_metadata(root / 'basics' / 'variables', exercise('variables'))
+    write_metadata(root / 'advanced', {
+        'type': 'section',
+        'id': 'advanced',
+        'name': 'Advanced',
+        'contents': [exercise('recursion')],
+    })
+    return root
+
+
+@pytest.fixture
+def default_settings(monkeypatch):
+    monkeypatch.setattr(settings, '_settings', settings.create_default_settings(), raising=False)
@@ -0,0 +1,79 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+import progtool.judging.dependencies
+from progtool.judging.dependencies import DependencyTracker
+from progtool.judging.judgment import Judgment
+from progtool.judging.pytest import PytestJudge
+
+
+pytestmark = pytest.mark.usefixtures('default_settings')
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    tracker = DependencyTracker()
+    monkeypatch.setattr(progtool.judging.dependencies, '_dependency_tracker', tracker)
+    return tracker
+
+
+def test_reverse_index_follows_recorded_dependencies():
+    tracker = DependencyTracker()
+    tracker.record('first', [Path('/course/shared.py'), Path('/course/first/solution.py')])
+    tracker.record('second', [Path('/course/shared.py')])
+    tracker.record('first', [Path('/course/first/solution.py')])
+
+    assert tracker.find_dependents(Path('/course/shared.py')) == {'second'}
+    assert tracker.find_dependents(Path('/course')) == {'first', 'second'}
+    assert tracker.take_changes() == {'first', 'second'}
+    assert tracker.take_changes() == set()
+
+
+# Imports a helper module from the parent directory
+TESTS = '''
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+import helper
+
+def test_helper():
+    assert helper.VALUE == 1
+'''
+
+
+def create_exercise(directory: Path, name: str) -> PytestJudge:
+    (directory / name).mkdir(parents=True)
+    (directory / name / 'tests.py').write_text(TESTS)
+    return PytestJudge(directory / name / 'tests.py')
+
+
+def test_imported_files_are_recorded(tmp_path, tracker):
+    (tmp_path / 'helper.py').write_text('import json\nVALUE = 1\n')
+    judge = create_exercise(tmp_path, 'exercise')
+
+    assert asyncio.run(judge.judge()) is Judgment.PASS
+
+    assert tracker.find(judge.identity) == {tmp_path / 'helper.py', tmp_path / 'exercise' / 'tests.py'}
+
+
+def test_imported_files_are_recorded_in_batches(tmp_path, tracker):
+    (tmp_path / 'helper.py').write_text('VALUE = 1\n')
+    judges = [create_exercise(tmp_path, name) for name in ['first', 'second']]
+
+    assert asyncio.run(PytestJudge.judge_batch(judges)) == [Judgment.PASS, Judgment.PASS]
+
+    for judge in judges:
+        assert {tmp_path / 'helper.py', judge.tests_path} <= tracker.find(judge.identity)
+
+
+def test_fingerprint_covers_imported_files(tmp_path, tracker):
+    (tmp_path / 'helper.py').write_text('VALUE = 1\n')
+    judge = create_exercise(tmp_path, 'exercise')
+    asyncio.run(judge.judge())
+    fingerprint = judge.fingerprint()
+
+    (tmp_path / 'helper.py').write_text('VALUE = 2\n')
+
+    assert judge.fingerprint() != fingerprint
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+import progtool.judging.failurehistory
+from progtool.judging.failurehistory import FailureHistory
+from progtool.judging.judgment import Judgment
+from progtool.judging.pytest import PytestJudge
+
+
+pytestmark = pytest.mark.usefixtures('default_settings')
+
+
+TESTS = '''
+from pathlib import Path
+
+def run(name):
+    # Records the order in which tests run
+    with (Path(__file__).parent / 'order.txt').open('a') as file:
+        file.write(name + '\\n')
+
+def test_first():
+    run('test_first')
+
+def test_second():
+    run('test_second')
+
+def test_third():
+    run('test_third')
+    assert not (Path(__file__).parent / 'broken').exists()
+
+def test_fourth():
+    run('test_fourth')
+'''
+
+
+def read_order(directory):
+    return (directory / 'order.txt').read_text().split()
+
+
+@pytest.fixture
+def history(monkeypatch):
+    history = FailureHistory()
+    monkeypatch.setattr(progtool.judging.failurehistory, '_failure_history', history)
+    return history
+
+
+def test_failed_tests_are_remembered_until_they_pass(tmp_path, history):
+    (tmp_path / 'tests.py').write_text(TESTS)
+    (tmp_path / 'broken').touch()
+    judge = PytestJudge(tmp_path / 'tests.py')
+    tests_path = str((tmp_path / 'tests.py').absolute())
+
+    assert asyncio.run(judge.judge()) is Judgment.FAIL
+    assert history.find(tests_path) == ['test_third']
+
+    (tmp_path / 'broken').unlink()
+    assert asyncio.run(judge.judge()) is Judgment.PASS
+    assert history.find(tests_path) == []
+    assert not (tmp_path / '.pytest_cache').exists()
+
+
+def test_failed_tests_run_first(tmp_path, history):
+    (tmp_path / 'tests.py').write_text(TESTS)
+    history.record(str((tmp_path / 'tests.py').absolute()), {'test_third': 'failed'})
+    (tmp_path / 'broken').touch()
+
+    assert asyncio.run(PytestJudge(tmp_path / 'tests.py').judge()) is Judgment.FAIL
+    # With -x, the failure ends the session before the other tests run
+    assert read_order(tmp_path) == ['test_third']
+
+
+def test_failed_tests_run_first_in_batches(tmp_path, history):
+    judges = []
+    for name in ['first', 'second']:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'tests.py').write_text(TESTS)
+        judges.append(PytestJudge(tmp_path / name / 'tests.py'))
+    history.record(str((tmp_path / 'second' / 'tests.py').absolute()), {'test_fourth': 'failed'})
+
+    assert asyncio.run(PytestJudge.judge_batch(judges)) == [Judgment.PASS, Judgment.PASS]
+    assert read_order(tmp_path / 'first') == ['test_first', 'test_second', 'test_third', 'test_fourth']
+    assert read_order(tmp_path / 'second') == ['test_fourth', 'test_first', 'test_second', 'test_third']
+    assert history.find(str((tmp_path / 'second' / 'tests.py').absolute())) == []
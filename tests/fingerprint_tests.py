@@ -0,0 +1,25 @@
+from progtool.judging.fingerprint import compute_fingerprint
+
+
+def test_fingerprint_depends_on_sources(tmp_path):
+    (tmp_path / 'solution.py').write_text('x = 1\n')
+    (tmp_path / 'tests.py').write_text('def test_x(): pass\n')
+    (tmp_path / 'assignment.md').write_text('# Assignment\n')
+    original = compute_fingerprint(tmp_path, [tmp_path / 'tests.py'])
+
+    (tmp_path / 'assignment.md').write_text('# Changed assignment\n')
+    (tmp_path / '__pycache__').mkdir()
+    (tmp_path / '__pycache__' / 'cached.py').write_text('')
+    assert compute_fingerprint(tmp_path, [tmp_path / 'tests.py']) == original
+
+    (tmp_path / 'solution.py').write_text('x = 2\n')
+    assert compute_fingerprint(tmp_path, [tmp_path / 'tests.py']) != original
+
+
+def test_fingerprint_detects_new_files(tmp_path):
+    (tmp_path / 'tests.py').write_text('def test_x(): pass\n')
+    original = compute_fingerprint(tmp_path)
+
+    (tmp_path / 'package').mkdir()
+    (tmp_path / 'package' / 'helper.py').write_text('')
+    assert compute_fingerprint(tmp_path) != original
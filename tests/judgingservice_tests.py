@@ -0,0 +1,270 @@
+import asyncio
+import threading
+from pathlib import Path
+
+import pytest
+
+from progtool.content.tree import Exercise, Topics
+from progtool.content.treepath import TreePath
+from progtool.judging.judge import Judge
+from progtool.judging.judgingservice import JudgingPriority, JudgingService
+from progtool.judging.judgment import Judgment
+from progtool.server.bgthread import create_background_worker
+
+
+pytestmark = pytest.mark.usefixtures('default_settings')
+
+
+class RecordingJudge(Judge):
+    def __init__(self, name, log, release=None, identity=None, fingerprint=None):
+        self.name = name
+        self.log = log
+        self.release = release
+        self.started = threading.Event()
+        self.__identity = identity or name
+        self.__fingerprint = fingerprint
+
+    @property
+    def identity(self):
+        return self.__identity
+
+    def fingerprint(self):
+        return self.__fingerprint
+
+    async def judge(self, fingerprint=None) -> Judgment:
+        self.log.append(self.name)
+        self.started.set()
+        try:
+            if self.release is not None:
+                await asyncio.to_thread(self.release.wait)
+            else:
+                await asyncio.sleep(0.01)
+        except asyncio.CancelledError:
+            self.log.append(f'cancelled {self.name}')
+            raise
+        return Judgment.PASS
+
+
+@pytest.fixture
+def event_loop():
+    event_loop = create_background_worker()
+    yield event_loop
+
+    async def cancel_workers():
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(cancel_workers(), event_loop).result(5)
+    event_loop.call_soon_threadsafe(event_loop.stop)
+
+
+def create_exercise(judge: Judge) -> Exercise:
+    return Exercise(
+        tree_path=TreePath(judge.name),
+        local_path=Path(judge.name),
+        name=judge.name,
+        difficulty=1,
+        assignment_file=Path('assignment.md'),
+        judge=judge,
+        topics=Topics([], [], []),
+    )
+
+
+def wait_until_judged(exercises):
+    for _ in range(500):
+        if all(exercise.judgment is Judgment.PASS for exercise in exercises):
+            return
+        threading.Event().wait(0.01)
+    pytest.fail('Exercises were not judged in time')
+
+
+def test_concurrency_is_bounded(event_loop):
+    running = 0
+    maximum = 0
+
+    class CountingJudge(Judge):
+        def __init__(self, name):
+            self.name = name
+
+        @property
+        def identity(self):
+            return self.name
+
+        async def judge(self, fingerprint=None) -> Judgment:
+            nonlocal running, maximum
+            running += 1
+            maximum = max(maximum, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return Judgment.PASS
+
+    service = JudgingService(event_loop, worker_count=2)
+    exercises = [create_exercise(CountingJudge(f'exercise{index}')) for index in range(8)]
+    for exercise in exercises:
+        service.judge(exercise, JudgingPriority.BACKGROUND)
+
+    wait_until_judged(exercises)
+    assert maximum == 2
+    assert service.queue_depth == 0 and service.in_flight == 0
+
+
+def test_interactive_requests_go_first(event_loop):
+    log = []
+    release = threading.Event()
+    blocker = create_exercise(RecordingJudge('blocker', log, release))
+    service = JudgingService(event_loop, worker_count=1)
+
+    service.judge(blocker, JudgingPriority.BACKGROUND)
+    assert blocker.judge.started.wait(5)
+    background = [create_exercise(RecordingJudge(f'background{index}', log)) for index in range(3)]
+    for exercise in background:
+        service.judge(exercise, JudgingPriority.BACKGROUND)
+    interactive = create_exercise(RecordingJudge('interactive', log))
+    service.judge(interactive, JudgingPriority.INTERACTIVE)
+    release.set()
+
+    wait_until_judged([blocker, interactive, *background])
+    assert log == ['blocker', 'interactive', 'background0', 'background1', 'background2']
+
+
+def test_exercises_sharing_tests_are_judged_once(event_loop):
+    log = []
+    release = threading.Event()
+    service = JudgingService(event_loop, worker_count=1)
+    blocker = create_exercise(RecordingJudge('blocker', log, release))
+    service.judge(blocker)
+    assert blocker.judge.started.wait(5)
+
+    first = create_exercise(RecordingJudge('first', log, identity='tests.py'))
+    second = create_exercise(RecordingJudge('second', log, identity='tests.py'))
+    service.judge(first, JudgingPriority.BACKGROUND)
+    service.judge(second, JudgingPriority.BACKGROUND)
+    service.judge(first, JudgingPriority.BACKGROUND)
+    release.set()
+
+    wait_until_judged([blocker, first, second])
+    assert log == ['blocker', 'first']
+
+
+def test_interactive_request_supersedes_running_judgment(event_loop):
+    log = []
+    release = threading.Event()
+    service = JudgingService(event_loop, worker_count=1)
+    exercise = create_exercise(RecordingJudge('exercise', log, release))
+    service.judge(exercise, JudgingPriority.BACKGROUND)
+    assert exercise.judge.started.wait(5)
+
+    service.judge(exercise, JudgingPriority.INTERACTIVE)
+    for _ in range(500):
+        if 'cancelled exercise' in log:
+            break
+        threading.Event().wait(0.01)
+    release.set()
+
+    wait_until_judged([exercise])
+    assert log == ['exercise', 'cancelled exercise', 'exercise']
+
+
+@pytest.mark.parametrize('priority', list(JudgingPriority))
+def test_unchanged_exercise_is_not_rejudged(event_loop, priority):
+    log = []
+    unchanged = create_exercise(RecordingJudge('unchanged', log, fingerprint='same'))
+    unchanged.judgment_fingerprint = 'same'
+    unchanged.judgment = Judgment.PASS
+    changed = create_exercise(RecordingJudge('changed', log, fingerprint='new'))
+    changed.judgment_fingerprint = 'old'
+    changed.judgment = Judgment.FAIL
+    service = JudgingService(event_loop, worker_count=1)
+
+    service.judge(unchanged, priority)
+    service.judge(changed, priority)
+
+    wait_until_judged([unchanged, changed])
+    assert log == ['changed']
+    assert changed.judgment_fingerprint == 'new'
+
+
+def test_judge_receives_fingerprint_computed_before_judging(event_loop):
+    received = []
+
+    class FingerprintJudge(RecordingJudge):
+        async def judge(self, fingerprint=None) -> Judgment:
+            received.append(fingerprint)
+            return Judgment.PASS
+
+    exercise = create_exercise(FingerprintJudge('exercise', [], fingerprint='current'))
+    JudgingService(event_loop).judge(exercise)
+
+    wait_until_judged([exercise])
+    assert received == ['current']
+    assert exercise.judgment_fingerprint == 'current'
+
+
+def test_queued_jobs_are_judged_in_batches(event_loop):
+    log = []
+    batches = []
+
+    class BatchingJudge(RecordingJudge):
+        @classmethod
+        async def judge_batch(cls, judges, fingerprints=None):
+            batches.append([judge.name for judge in judges])
+            return [Judgment.PASS for _ in judges]
+
+    release = threading.Event()
+    blocker = create_exercise(RecordingJudge('blocker', log, release))
+    service = JudgingService(event_loop, worker_count=1, batch_size=3)
+    service.judge(blocker)
+    assert blocker.judge.started.wait(5)
+
+    exercises = [create_exercise(BatchingJudge(f'exercise{index}', log)) for index in range(5)]
+    for exercise in exercises:
+        service.judge(exercise, JudgingPriority.BACKGROUND)
+    release.set()
+
+    wait_until_judged([blocker, *exercises])
+    assert batches == [['exercise0', 'exercise1', 'exercise2'], ['exercise3', 'exercise4']]
+
+
+def test_superseded_batch_does_not_overwrite_newer_judgment(event_loop):
+    log = []
+    batches = []
+    release = threading.Event()
+    batch_started = threading.Event()
+
+    class StaleBatchJudge(RecordingJudge):
+        @classmethod
+        async def judge_batch(cls, judges, fingerprints=None):
+            batches.append([judge.name for judge in judges])
+            if len(batches) > 1:
+                return [Judgment.PASS for _ in judges]
+            # The first batch judges files that are about to change
+            batch_started.set()
+            await asyncio.to_thread(release.wait)
+            return [Judgment.FAIL for _ in judges]
+
+    blocker_release = threading.Event()
+    blocker = create_exercise(RecordingJudge('blocker', log, blocker_release))
+    service = JudgingService(event_loop, worker_count=1, batch_size=2)
+    service.judge(blocker)
+    assert blocker.judge.started.wait(5)
+    first = create_exercise(StaleBatchJudge('first', log))
+    second = create_exercise(StaleBatchJudge('second', log))
+    service.judge(first, JudgingPriority.BACKGROUND)
+    service.judge(second, JudgingPriority.BACKGROUND)
+    blocker_release.set()
+    assert batch_started.wait(5)
+
+    judgments = []
+    first.observe_judgment(lambda: judgments.append(first.judgment))
+    service.judge(first, JudgingPriority.INTERACTIVE)
+    threading.Event().wait(0.1)
+    # The new request waits for the batch
+    assert batches == [['first', 'second']]
+    release.set()
+
+    wait_until_judged([first])
+    assert batches == [['first', 'second'], ['first']]
+    assert Judgment.FAIL not in judgments
+    assert second.judgment is Judgment.FAIL
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from progtool.judging.judgmentstore import CacheEntry, JsonJudgmentStore, SqliteJudgmentStore
+from progtool.judging.repositorystate import RepositoryState
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def create_store(request, tmp_path):
+    stores = []
+
+    def create():
+        match request.param:
+            case 'json':
+                store = JsonJudgmentStore(tmp_path / 'cache.json')
+            case 'sqlite':
+                store = SqliteJudgmentStore(tmp_path / 'cache.sqlite')
+        stores.append(store)
+        return store
+
+    yield create
+    for store in stores:
+        store.close()
+
+
+def test_saved_entries_are_loaded(create_store):
+    store = create_store()
+    repository = RepositoryState('abc', {'basics/solution.py': '123'})
+    store.save({'basics/loops': CacheEntry('PASS', 'f1'), 'basics/variables': CacheEntry('FAIL', 'f2', False)}, [], repository)
+
+    data = create_store().load()
+
+    assert data.entries == {'basics/loops': CacheEntry('PASS', 'f1'), 'basics/variables': CacheEntry('FAIL', 'f2', False)}
+    assert data.repository == repository
+
+
+def test_save_only_touches_given_entries(create_store):
+    store = create_store()
+    store.save({'basics/loops': CacheEntry('PASS', 'f1'), 'basics/variables': CacheEntry('FAIL', 'f2')}, [], None)
+    store.save({'basics/loops': CacheEntry('FAIL', 'f3')}, ['basics/variables'], None)
+    store.save({'advanced/recursion': CacheEntry('PASS', 'f4')}, [], None)
+
+    assert create_store().load().entries == {'basics/loops': CacheEntry('FAIL', 'f3'), 'advanced/recursion': CacheEntry('PASS', 'f4')}
+
+
+def test_sqlite_keeps_history_of_changes(tmp_path):
+    store = SqliteJudgmentStore(tmp_path / 'cache.sqlite')
+    store.save({'basics/loops': CacheEntry('FAIL', 'f1')}, [], None)
+    store.save({'basics/loops': CacheEntry('FAIL', 'f2')}, [], None)
+    store.save({'basics/loops': CacheEntry('PASS', 'f3')}, [], None)
+
+    history = store.history('basics/loops')
+    store.close()
+
+    assert [entry.judgment for entry in history] == ['FAIL', 'PASS']
+    assert history[0].timestamp <= history[1].timestamp
+
+
+def test_sqlite_migrates_json_cache(tmp_path):
+    legacy_path = tmp_path / 'cache.json'
+    legacy_path.write_text(json.dumps({'judgments': {'basics/loops': {'judgment': 'PASS', 'fingerprint': 'f1'}}}))
+
+    store = SqliteJudgmentStore(tmp_path / 'cache.sqlite', legacy_path=legacy_path)
+    migrated_entries = store.load().entries
+    store.save({}, ['basics/loops'], None)
+    store.close()
+    # Migration only happens once
+    reopened = SqliteJudgmentStore(tmp_path / 'cache.sqlite', legacy_path=legacy_path)
+    reopened_entries = reopened.load().entries
+    reopened.close()
+
+    assert migrated_entries == {'basics/loops': CacheEntry('PASS', 'f1')}
+    assert reopened_entries == {}
+
+
+def test_sqlite_keeps_failed_tests(tmp_path):
+    store = SqliteJudgmentStore(tmp_path / 'cache.sqlite')
+    store.save_failed_tests({'/a/tests.py': ['test_one'], '/b/tests.py': ['test_two', 'test_three']})
+    store.save_failed_tests({'/a/tests.py': []})
+    store.close()
+
+    store = SqliteJudgmentStore(tmp_path / 'cache.sqlite')
+    assert store.load_failed_tests() == {'/b/tests.py': ['test_two', 'test_three']}
+    store.close()
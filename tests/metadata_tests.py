@@ -0,0 +1,56 @@
+import pytest
+
+from progtool.content.metadata import (MetadataSnapshot, filter_by_tags,
+                                       load_everything, load_metadata)
+from tests.conftest import exercise, write_metadata
+
+
+@pytest.mark.parametrize('link_predicate', [
+    load_everything(),
+    load_everything(force_all=True),
+    filter_by_tags(['advanced']),
+])
+def test_snapshot_yields_same_metadata(course, tmp_path, link_predicate):
+    expected = load_metadata(course, link_predicate=link_predicate)
+    snapshot_path = tmp_path / 'snapshot.pickle'
+
+    cold = load_metadata(course, link_predicate=link_predicate, snapshot=MetadataSnapshot(snapshot_path))
+    warm = load_metadata(course, link_predicate=link_predicate, snapshot=MetadataSnapshot(snapshot_path))
+
+    assert cold == expected
+    assert warm == expected
+
+
+def test_snapshot_picks_up_changes(course, tmp_path):
+    snapshot_path = tmp_path / 'snapshot.pickle'
+    load_metadata(course, link_predicate=load_everything(), snapshot=MetadataSnapshot(snapshot_path))
+
+    write_metadata(course / 'basics' / 'variables', {**exercise('variables'), 'name': 'Renamed'})
+    metadata = load_metadata(course, link_predicate=load_everything(), snapshot=MetadataSnapshot(snapshot_path))
+
+    assert metadata == load_metadata(course, link_predicate=load_everything())
+    assert 'Renamed' in repr(metadata)
+
+
+@pytest.mark.parametrize('link_predicate', [
+    load_everything(),
+    load_everything(force_all=True),
+    filter_by_tags(['advanced']),
+])
+def test_parallel_loading_yields_same_metadata(course, tmp_path, link_predicate):
+    expected = load_metadata(course, link_predicate=link_predicate)
+    snapshot_path = tmp_path / 'snapshot.pickle'
+
+    cold = load_metadata(course, link_predicate=link_predicate, mode='parallel', snapshot=MetadataSnapshot(snapshot_path))
+    warm = load_metadata(course, link_predicate=link_predicate, mode='parallel', snapshot=MetadataSnapshot(snapshot_path))
+
+    assert cold == expected
+    assert warm == expected
+
+
+def test_parallel_loading_ignores_unselected_broken_links(course):
+    write_metadata(course / 'advanced', {'type': 'section'})
+
+    metadata = load_metadata(course, link_predicate=load_everything(), mode='parallel')
+
+    assert metadata == load_metadata(course, link_predicate=load_everything())
@@ -0,0 +1,30 @@
+import pytest
+
+from progtool.content.metadata import load_everything, load_metadata
+from progtool.content.navigator import ContentNavigator
+from progtool.content.tree import ContentTreeBranch, ContentTreeLeaf, build_tree
+
+
+pytestmark = pytest.mark.usefixtures('default_settings')
+
+
+def test_navigator_agrees_with_tree(course):
+    root = build_tree(load_metadata(course, link_predicate=load_everything(force_all=True)))
+    navigator = ContentNavigator(root)
+    nodes = list(root.preorder_traversal())
+    parents = {child: node for node in nodes if isinstance(node, ContentTreeBranch) for child in node.children}
+
+    assert navigator.nodes == nodes
+    for index, node in enumerate(nodes):
+        leaves_after = [other for other in nodes[index + 1:] if isinstance(other, ContentTreeLeaf)]
+        leaves_before = [other for other in nodes[:index] if isinstance(other, ContentTreeLeaf)]
+        subtree = list(node.preorder_traversal())
+
+        assert navigator.find_successor_leaf(node) is (leaves_after[0] if leaves_after else None)
+        assert navigator.find_predecessor_leaf(node) is (leaves_before[-1] if leaves_before else None)
+        assert navigator.find_parent(node) is parents.get(node)
+        assert navigator.depth(node) == len(node.tree_path.parts)
+        assert [nodes[i] for i in navigator.subtree_range(node)] == subtree
+        for other in nodes:
+            expected = isinstance(node, ContentTreeBranch) and other is not node and other in subtree
+            assert navigator.is_ancestor(node, other) == expected
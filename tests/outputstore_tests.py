@@ -0,0 +1,33 @@
+from progtool.judging.outputstore import OutputStore
+
+
+def test_least_recently_used_output_is_evicted():
+    store = OutputStore(2)
+    store.store('first', 'a', 'first output')
+    store.store('second', 'a', 'second output')
+    store.find('first', 'a')
+    store.store('third', 'a', 'third output')
+
+    assert store.find('first', 'a') == 'first output'
+    assert store.find('second', 'a') is None
+    assert store.find('third', 'a') == 'third output'
+
+
+def test_outputs_are_kept_per_fingerprint():
+    store = OutputStore(2)
+    store.store('exercise', 'old', 'old output')
+    store.store('exercise', 'new', 'new output')
+
+    assert store.find('exercise', 'old') == 'old output'
+    assert store.find('exercise', 'new') == 'new output'
+    assert store.find('exercise', 'other') is None
+
+
+def test_evicted_outputs_are_spilled_to_disk(tmp_path):
+    store = OutputStore(1, tmp_path)
+    store.store('first', 'a', 'first output')
+    store.store('second', 'a', 'second output')
+
+    assert len(list(tmp_path.iterdir())) == 1
+    assert store.find('first', 'a') == 'first output'
+    assert store.find('second', 'a') == 'second output'
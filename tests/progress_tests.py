@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+import progtool.judging.progress
+from progtool.judging.judgment import Judgment
+from progtool.judging.progress import JudgingProgress, ProgressTracker
+from progtool.judging.pytest import PytestJudge
+
+
+pytestmark = pytest.mark.usefixtures('default_settings')
+
+
+TESTS = '''
+import time
+
+def test_first():
+    pass
+
+def test_second():
+    time.sleep(1)
+
+def test_third():
+    assert False
+
+def test_fourth():
+    pass
+'''
+
+
+@pytest.fixture
+def updates(monkeypatch):
+    tracker = ProgressTracker()
+    monkeypatch.setattr(progtool.judging.progress, '_progress_tracker', tracker)
+    updates = []
+    tracker.observe(lambda identity, progress: updates.append((identity, progress)))
+    return updates
+
+
+def test_progress_is_reported_while_judging(tmp_path, updates):
+    (tmp_path / 'tests.py').write_text(TESTS)
+    judge = PytestJudge(tmp_path / 'tests.py')
+
+    judgment = asyncio.run(judge.judge())
+
+    assert judgment is Judgment.FAIL
+    assert {identity for identity, _ in updates} == {judge.identity}
+    progress = [progress for _, progress in updates]
+    assert JudgingProgress(total=4, passed=1, current='test_second') in progress
+    assert progress[-1] is None
+
+
+def test_progress_is_reported_per_file_in_batches(tmp_path, updates):
+    judges = []
+    for name in ['first', 'second']:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / 'tests.py').write_text(TESTS)
+        judges.append(PytestJudge(tmp_path / name / 'tests.py'))
+
+    asyncio.run(PytestJudge.judge_batch(judges))
+
+    for judge in judges:
+        progress = [progress for identity, progress in updates if identity == judge.identity]
+        assert JudgingProgress(total=4, passed=1, current='test_second') in progress
+        assert progress[-1] is None
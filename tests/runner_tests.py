@@ -0,0 +1,159 @@
+import asyncio
+import signal
+import time
+
+import pytest
+
+from progtool.judging.runner import (PoolRunner, ResourceLimits, ResourceUsage, SubprocessRunner,
+                                     exceeded_cpu_time)
+
+
+TESTS = {
+    'passing': 'def test_pass():\n    assert True\n',
+    'failing': 'def test_fail():\n    assert False\n',
+    'broken': 'def test_broken(:\n',
+}
+
+
+@pytest.mark.parametrize('name', TESTS.keys())
+def test_pool_agrees_with_subprocess(tmp_path, name):
+    (tmp_path / 'tests.py').write_text(TESTS[name])
+
+    async def run_both():
+        pool = PoolRunner(1)
+        try:
+            return (
+                await SubprocessRunner().run(tmp_path, ['-x', 'tests.py']),
+                await pool.run(tmp_path, ['-x', 'tests.py']),
+            )
+        finally:
+            await pool.stop()
+
+    subprocess_result, pool_result = asyncio.run(run_both())
+
+    assert pool_result.exit_code == subprocess_result.exit_code
+    assert 'tests.py' in pool_result.output
+
+
+def test_cancelled_pool_run_kills_child(tmp_path):
+    (tmp_path / 'slow_tests.py').write_text('import time\n\ndef test_slow():\n    time.sleep(60)\n')
+    (tmp_path / 'tests.py').write_text(TESTS['passing'])
+
+    async def cancel_then_run():
+        pool = PoolRunner(1)
+        try:
+            task = asyncio.create_task(pool.run(tmp_path, ['slow_tests.py']))
+            await asyncio.sleep(2)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return await pool.run(tmp_path, ['tests.py'])
+        finally:
+            await pool.stop()
+
+    start = time.monotonic()
+    result = asyncio.run(cancel_then_run())
+
+    assert result.exit_code == 0
+    assert time.monotonic() - start < 30
+
+
+@pytest.mark.parametrize('create_runner', [SubprocessRunner, lambda: PoolRunner(1)])
+def test_cancelled_run_reports_usage_of_killed_process(tmp_path, create_runner):
+    (tmp_path / 'tests.py').write_text('def test_loop():\n    while True:\n        pass\n')
+    killed = []
+
+    async def cancel():
+        runner = create_runner()
+        try:
+            task = asyncio.create_task(runner.run(tmp_path, ['tests.py'], on_kill=killed.append))
+            await asyncio.sleep(2)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        finally:
+            if isinstance(runner, PoolRunner):
+                await runner.stop()
+
+    asyncio.run(cancel())
+
+    [usage] = killed
+    assert usage.wall_time >= 2
+    assert usage.cpu_time > 0.5
+
+
+def test_cpu_time_limit(tmp_path):
+    (tmp_path / 'tests.py').write_text('def test_loop():\n    while True:\n        pass\n')
+
+    async def run():
+        pool = PoolRunner(1)
+        try:
+            return (
+                await SubprocessRunner().run(tmp_path, ['tests.py'], ResourceLimits(cpu_time=1)),
+                await pool.run(tmp_path, ['tests.py'], ResourceLimits(cpu_time=1)),
+            )
+        finally:
+            await pool.stop()
+
+    subprocess_result, pool_result = asyncio.run(run())
+
+    assert exceeded_cpu_time(subprocess_result.exit_code, subprocess_result.usage, ResourceLimits(cpu_time=1))
+    assert exceeded_cpu_time(pool_result.exit_code, pool_result.usage, ResourceLimits(cpu_time=1))
+
+
+def test_sigkill_only_counts_as_timeout_when_cpu_time_is_used_up():
+    usage = ResourceUsage(wall_time=3, user_time=0.5, system_time=0.1, max_rss=0)
+
+    # E.g., killed by the OOM killer
+    assert not exceeded_cpu_time(-signal.SIGKILL, usage, ResourceLimits(cpu_time=1))
+    assert not exceeded_cpu_time(-signal.SIGKILL, usage, ResourceLimits())
+    assert exceeded_cpu_time(-signal.SIGKILL, usage._replace(user_time=1.0), ResourceLimits(cpu_time=1))
+    assert not exceeded_cpu_time(1, usage._replace(user_time=1.0), ResourceLimits(cpu_time=1))
+
+
+def test_resource_usage(tmp_path):
+    (tmp_path / 'tests.py').write_text(
+        'import time\n\n'
+        'def test_busy():\n'
+        '    data = bytearray(64 * 1024 * 1024)\n'
+        '    end = time.process_time() + 0.5\n'
+        '    while time.process_time() < end:\n'
+        '        pass\n'
+    )
+
+    async def run():
+        pool = PoolRunner(1)
+        try:
+            return (
+                await SubprocessRunner().run(tmp_path, ['tests.py']),
+                await pool.run(tmp_path, ['tests.py']),
+            )
+        finally:
+            await pool.stop()
+
+    for result in asyncio.run(run()):
+        assert result.exit_code == 0
+        assert result.usage.cpu_time >= 0.5
+        assert result.usage.wall_time >= 0.5
+        assert result.usage.max_rss >= 64 * 1024 * 1024
+
+
+def test_output_is_bounded(tmp_path):
+    (tmp_path / 'tests.py').write_text('def test_chatty():\n    print("x" * 100_000)\n    assert False\n')
+
+    async def run_both():
+        pool = PoolRunner(1, output_limit=1000)
+        try:
+            return (
+                await SubprocessRunner(output_limit=1000).run(tmp_path, ['-x', 'tests.py']),
+                await pool.run(tmp_path, ['-x', 'tests.py']),
+            )
+        finally:
+            await pool.stop()
+
+    for result in asyncio.run(run_both()):
+        assert len(result.output) < 1100
+        assert 'bytes of output omitted' in result.output
+        # Both the start of the session and pytest's summary are kept
+        assert result.output.startswith('=')
+        assert 'failed' in result.output.splitlines()[-1]
@@ -0,0 +1,188 @@
+import gzip
+import json
+import pickle
+
+import pytest
+
+import progtool.server
+from progtool.content.metadata import MetadataSnapshot, load_everything, load_metadata
+from progtool.content.tree import build_lazy_tree, build_tree
+from progtool.judging.judgment import Judgment
+from progtool.judging.outputstore import OutputStore
+from progtool.judging.progress import JudgingProgress, ProgressTracker
+from progtool.judging.runner import ResourceUsage
+from progtool.judging.telemetry import Telemetry
+from progtool.server.content import Content
+from progtool.server.events import JudgmentEventLog, ProgressEventLog
+
+
+pytestmark = pytest.mark.usefixtures('default_settings')
+
+
+@pytest.fixture
+def client(course, monkeypatch):
+    root = build_tree(load_metadata(course, link_predicate=load_everything(force_all=True)))
+    monkeypatch.setattr(progtool.server, '_content', Content(root))
+    return progtool.server.app.test_client()
+
+
+def test_overview(client):
+    response = client.get('/api/v1/overview', headers={'Accept-Encoding': 'identity'})
+
+    assert response.status_code == 200
+    assert response.headers.get('Content-Encoding') is None
+    overview = json.loads(response.data)
+    assert overview['tree_path'] == []
+    assert [child['tree_path'] for child in overview['children']] == [['basics'], ['advanced'], ['intro']]
+
+
+def test_gzipped_overview(client):
+    plain = client.get('/api/v1/overview', headers={'Accept-Encoding': 'identity'})
+    gzipped = client.get('/api/v1/overview', headers={'Accept-Encoding': 'gzip, deflate'})
+
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(gzipped.data) == plain.data
+    assert gzipped.headers['ETag'] != plain.headers['ETag']
+
+
+@pytest.mark.parametrize('encoding', ['identity', 'gzip'])
+def test_overview_not_modified(client, encoding):
+    first = client.get('/api/v1/overview', headers={'Accept-Encoding': encoding})
+    second = client.get('/api/v1/overview', headers={'Accept-Encoding': encoding, 'If-None-Match': first.headers['ETag']})
+
+    assert second.status_code == 304
+    assert second.data == b''
+
+
+def test_judging_statistics(client, monkeypatch):
+    telemetry = Telemetry()
+    monkeypatch.setattr(progtool.server, 'get_telemetry', lambda: telemetry)
+    exercise, *_ = progtool.server.get_content().root.exercises
+    telemetry.record(exercise.judge.identity, ResourceUsage(wall_time=2, user_time=1, system_time=0, max_rss=1000))
+    telemetry.record(exercise.judge.identity, ResourceUsage(wall_time=4, user_time=1, system_time=0, max_rss=3000))
+
+    response = client.get('/api/v1/judging-stats/')
+
+    statistics = json.loads(response.data)['exercises']
+    assert list(statistics) == [str(exercise.tree_path)]
+    assert statistics[str(exercise.tree_path)]['runs'] == 2
+    assert statistics[str(exercise.tree_path)]['timeouts'] == 0
+    assert statistics[str(exercise.tree_path)]['wall_time'] == {'last': 4, 'mean': 3, 'max': 4}
+    assert statistics[str(exercise.tree_path)]['max_rss']['max'] == 3000
+
+
+def test_markdown(client):
+    exercise, *_ = progtool.server.get_content().root.exercises
+
+    response = client.get(f'/api/v1/markdown/{exercise.tree_path}')
+
+    assert response.mimetype == 'text/markdown'
+    assert response.data == exercise.markdown.encode('utf-8')
+
+
+def test_judgment_output(client, monkeypatch):
+    store = OutputStore(10)
+    monkeypatch.setattr(progtool.server, 'get_output_store', lambda: store)
+    exercise, *_ = progtool.server.get_content().root.exercises
+    exercise.judgment_fingerprint = 'current'
+    store.store(exercise.judge.identity, 'outdated', 'old output')
+
+    assert client.get(f'/api/v1/judgment-output/{exercise.tree_path}').status_code == 404
+
+    store.store(exercise.judge.identity, 'current', 'new output')
+    response = client.get(f'/api/v1/judgment-output/{exercise.tree_path}')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert response.data == b'new output'
+
+
+def test_judgment_output_of_section(client):
+    assert client.get('/api/v1/judgment-output/basics').status_code == 400
+
+
+def read_events(response, count):
+    stream = iter(response.response)
+    messages = [next(stream) for _ in range(count)]
+    response.close()
+    return [message.decode() if isinstance(message, bytes) else message for message in messages]
+
+
+def parse_event(message):
+    fields = dict(line.split(': ', 1) for line in message.strip().split('\n'))
+    return fields['event'], json.loads(fields['data']), fields['id']
+
+
+@pytest.fixture
+def judgment_events(client, monkeypatch):
+    judgment_events = JudgmentEventLog()
+    judgment_events.observe(progtool.server.get_content().root)
+    monkeypatch.setattr(progtool.server, '_judgment_events', judgment_events)
+    return judgment_events
+
+
+def test_judgment_events_start_with_snapshot(client, judgment_events):
+    response = client.get('/api/v1/judgment-events/basics', buffered=False)
+
+    assert response.mimetype == 'text/event-stream'
+    event, data, _ = parse_event(read_events(response, 1)[0])
+    assert event == 'snapshot'
+    assert data == {'judgments': {'basics/variables': 'unknown', 'basics/loops': 'unknown'}}
+
+
+def test_judgment_events_resume(client, judgment_events):
+    root = progtool.server.get_content().root
+    response = client.get('/api/v1/judgment-events/basics', buffered=False)
+    _, _, snapshot_id = parse_event(read_events(response, 1)[0])
+    root.descend(('basics', 'loops')).judgment = Judgment.FAIL
+    root.descend(('advanced', 'recursion')).judgment = Judgment.FAIL
+    root.descend(('basics', 'variables')).judgment = Judgment.PASS
+
+    resumed = client.get('/api/v1/judgment-events/basics', headers={'Last-Event-ID': snapshot_id}, buffered=False)
+
+    events = [parse_event(message)[:2] for message in read_events(resumed, 2)]
+    assert events == [
+        ('judgment', {'path': 'basics/loops', 'judgment': 'fail'}),
+        ('judgment', {'path': 'basics/variables', 'judgment': 'pass'}),
+    ]
+
+
+def test_judgment_events_with_unknown_id_start_with_snapshot(client, judgment_events):
+    response = client.get('/api/v1/judgment-events/', headers={'Last-Event-ID': 'previous-run:5'}, buffered=False)
+
+    event, _, _ = parse_event(read_events(response, 1)[0])
+    assert event == 'snapshot'
+
+
+def test_judging_progress_events(client, monkeypatch):
+    root = progtool.server.get_content().root
+    loops = root.descend(('basics', 'loops'))
+    tracker = ProgressTracker()
+    progress_events = ProgressEventLog(tracker)
+    progress_events.observe(root)
+    monkeypatch.setattr(progtool.server, '_progress_events', progress_events)
+    tracker.update(loops.judge.identity, JudgingProgress(total=3, passed=1, current='test_foo'))
+
+    response = client.get('/api/v1/judging-progress/basics', buffered=False)
+    stream = iter(response.response)
+    snapshot = parse_event(next(stream).decode())
+    tracker.finish(loops.judge.identity)
+    finished = parse_event(next(stream).decode())
+    response.close()
+
+    assert snapshot[:2] == ('snapshot', {'progress': {'basics/loops': {'total': 3, 'passed': 1, 'failed': 0, 'skipped': 0, 'current': 'test_foo'}}})
+    assert finished[:2] == ('progress', {'path': 'basics/loops', 'progress': None})
+
+
+def test_lazy_content_saves_metadata_read_after_loading(course, tmp_path):
+    snapshot_path = tmp_path / 'snapshot.pickle'
+    snapshot = MetadataSnapshot(snapshot_path)
+    root = build_lazy_tree(course, link_predicate=load_everything(force_all=True), read_template=snapshot.read_template)
+    content = Content(root, build_index=False, snapshot=snapshot)
+
+    list(root.preorder_traversal())
+    content.close()
+
+    with snapshot_path.open('rb') as file:
+        entries = pickle.load(file)['entries']
+    assert len(entries) == len(list(course.rglob('metadata.yaml')))
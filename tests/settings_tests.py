@@ -0,0 +1,58 @@
+import pytest
+
+from progtool import settings
+from progtool.constants import IDENTIFIER_FILE, IDENTIFIER_FILE_CONTENTS
+
+
+@pytest.fixture
+def complete_settings(tmp_path):
+    (tmp_path / 'index.html').write_text('')
+    (tmp_path / 'style.scss').write_text('')
+    (tmp_path / IDENTIFIER_FILE).write_text(IDENTIFIER_FILE_CONTENTS)
+    result = settings.create_default_settings()
+    result.html_path = tmp_path / 'index.html'
+    result.style_path = tmp_path / 'style.scss'
+    result.repository_root = tmp_path
+    return result
+
+
+def test_sqlite_store_does_not_need_json_cache(complete_settings, tmp_path):
+    complete_settings.judgment_database = tmp_path / 'cache.sqlite'
+
+    settings.verify_settings(complete_settings)
+
+
+def test_sqlite_store_needs_database_directory(complete_settings, tmp_path):
+    complete_settings.judgment_database = tmp_path / 'missing' / 'cache.sqlite'
+
+    with pytest.raises(settings.MissingJudgmentDatabaseDirectory):
+        settings.verify_settings(complete_settings)
+
+
+def test_json_store_needs_json_cache(complete_settings, tmp_path):
+    complete_settings.judgment_store = 'json'
+    complete_settings.judgment_cache = tmp_path / 'cache.json'
+
+    with pytest.raises(settings.MissingJudgmentCacheFile):
+        settings.verify_settings(complete_settings)
+
+    (tmp_path / 'cache.json').write_text('{}')
+    settings.verify_settings(complete_settings)
+
+
+def test_judgment_database_does_not_depend_on_json_cache(default_settings, tmp_path):
+    settings.get_settings().judgment_cache = tmp_path / 'cache.json'
+
+    assert settings.judgment_database() == settings.default_judgment_database_path()
+
+
+def test_server_url_is_built_from_server_settings(default_settings):
+    settings.get_settings().server_port = 8080
+
+    assert settings.server_url() == 'http://127.0.0.1:8080'
+
+
+def test_server_listening_everywhere_is_reached_through_loopback(default_settings):
+    settings.get_settings().server_host = '0.0.0.0'
+
+    assert settings.server_url() == 'http://127.0.0.1:5000'
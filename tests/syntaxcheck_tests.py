@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+import progtool.judging.dependencies
+import progtool.judging.outputstore
+import progtool.judging.pytest
+from progtool.judging.dependencies import DependencyTracker
+from progtool.judging.judgment import Judgment
+from progtool.judging.outputstore import OutputStore
+from progtool.judging.pytest import PytestJudge
+from progtool.judging.syntaxcheck import check_syntax
+
+
+pytestmark = pytest.mark.usefixtures('default_settings')
+
+
+TESTS = '''
+from solution import square
+
+def test_square():
+    assert square(3) == 9
+'''
+
+
+def test_valid_code_passes(tmp_path):
+    (tmp_path / 'tests.py').write_text(TESTS)
+    (tmp_path / 'solution.py').write_text('def square(x):\n    return x * x\n')
+
+    assert check_syntax([tmp_path / 'tests.py'], [tmp_path]) is None
+
+
+def test_error_in_imported_module_is_located(tmp_path):
+    (tmp_path / 'tests.py').write_text(TESTS)
+    (tmp_path / 'solution.py').write_text('from util import helper\n')
+    (tmp_path / 'util.py').write_text('def helper(:\n    pass\n')
+
+    problem = check_syntax([tmp_path / 'tests.py'], [tmp_path])
+
+    assert problem is not None
+    assert (problem.path, problem.line) == (tmp_path / 'util.py', 1)
+    assert 'SyntaxError' in problem.details
+
+
+def test_errors_only_found_by_compiler_are_reported(tmp_path):
+    (tmp_path / 'tests.py').write_text('return 5\n')
+
+    problem = check_syntax([tmp_path / 'tests.py'], [tmp_path])
+
+    assert problem is not None and "'return' outside function" in problem.message
+
+
+def test_modules_that_are_not_imported_are_ignored(tmp_path):
+    (tmp_path / 'tests.py').write_text(TESTS)
+    (tmp_path / 'solution.py').write_text('def square(x):\n    return x * x\n')
+    (tmp_path / 'scratch.py').write_text('def broken(:\n')
+
+    assert check_syntax([tmp_path / 'tests.py'], [tmp_path]) is None
+
+
+@pytest.fixture
+def no_pytest(monkeypatch):
+    def get_runner():
+        raise AssertionError('pytest should not run')
+    monkeypatch.setattr(progtool.judging.pytest, 'get_runner', get_runner)
+
+
+@pytest.fixture
+def output_store(monkeypatch):
+    store = OutputStore(10)
+    monkeypatch.setattr(progtool.judging.outputstore, '_output_store', store)
+    return store
+
+
+def create_exercise(directory, solution):
+    directory.mkdir()
+    (directory / 'tests.py').write_text(TESTS)
+    (directory / 'solution.py').write_text(solution)
+    return PytestJudge(directory / 'tests.py')
+
+
+def test_judge_fails_without_running_pytest(tmp_path, no_pytest, output_store):
+    judge = create_exercise(tmp_path / 'exercise', 'def square(x)\n    return x * x\n')
+    fingerprint = judge.fingerprint()
+
+    assert asyncio.run(judge.judge(fingerprint)) is Judgment.FAIL
+    output = output_store.find(judge.identity, fingerprint)
+    assert output is not None and 'solution.py", line 1' in output
+
+
+def test_output_is_stored_under_given_fingerprint(tmp_path, no_pytest, output_store):
+    judge = create_exercise(tmp_path / 'exercise', 'def square(x)\n    return x * x\n')
+
+    asyncio.run(judge.judge('judged'))
+    # Fingerprints computed meanwhile (e.g., by the caching service) do not affect where the output goes
+    judge.fingerprint()
+
+    assert output_store.find(judge.identity, 'judged') is not None
+
+
+def test_batch_only_runs_pytest_for_valid_code(tmp_path, output_store):
+    broken = create_exercise(tmp_path / 'broken', 'def square(x)\n    return x * x\n')
+    valid = create_exercise(tmp_path / 'valid', 'def square(x):\n    return x * x\n')
+    other = create_exercise(tmp_path / 'other', 'def square(x):\n    return x + x\n')
+
+    judgments = asyncio.run(PytestJudge.judge_batch([broken, valid, other]))
+
+    assert judgments == [Judgment.FAIL, Judgment.PASS, Judgment.FAIL]
+    assert 'Syntax check failed' in output_store.find(broken.identity, None)
+    assert 'pytest session' in output_store.find(valid.identity, None)
+
+
+def test_modules_no_longer_imported_are_not_checked(tmp_path, output_store, monkeypatch):
+    tracker = DependencyTracker()
+    monkeypatch.setattr(progtool.judging.dependencies, '_dependency_tracker', tracker)
+    judge = create_exercise(tmp_path / 'exercise', 'def square(x):\n    return x * x\n')
+    # Imported by the previous version of the solution
+    (tmp_path / 'exercise' / 'helper.py').write_text('def helper(:\n')
+    tracker.record(judge.identity, [tmp_path / 'exercise' / 'helper.py', tmp_path / 'exercise' / 'solution.py'])
+
+    assert asyncio.run(judge.judge()) is Judgment.PASS
+    # Running pytest updated the dependencies
+    assert tmp_path / 'exercise' / 'helper.py' not in tracker.find(judge.identity)
@@ -0,0 +1,44 @@
+import pytest
+
+from progtool.content.metadata import load_everything, load_metadata
+from progtool.content.tree import (ContentError, ContentTreeBranch, Section,
+                                   build_lazy_tree, build_tree)
+
+
+pytestmark = pytest.mark.usefixtures('default_settings')
+
+
+def describe(root):
+    return [(str(node.tree_path), type(node).__name__, node.name, node.local_path) for node in root.preorder_traversal()]
+
+
+def test_lazy_tree_has_same_structure(course):
+    eager = build_tree(load_metadata(course, link_predicate=load_everything(force_all=True)))
+    lazy = build_lazy_tree(course, link_predicate=load_everything(force_all=True))
+
+    assert describe(lazy) == describe(eager)
+
+
+def test_lazy_tree_loads_on_descent(course):
+    lazy = build_lazy_tree(course, link_predicate=load_everything())
+    assert isinstance(lazy, ContentTreeBranch)
+    assert not lazy.is_loaded
+
+    basics = lazy['basics']
+    assert lazy.is_loaded
+    assert isinstance(basics, Section) and not basics.is_loaded
+
+    assert lazy.descend(('basics', 'variables')).name == 'Variables'
+    assert basics.is_loaded
+
+
+@pytest.mark.parametrize('parts', [
+    ('basics', 'nonexistent'),
+    ('basics', 'loops', 'too-deep'),
+    ('',),
+])
+def test_invalid_descent(course, parts):
+    root = build_tree(load_metadata(course, link_predicate=load_everything()))
+
+    with pytest.raises(ContentError):
+        root.descend(parts)
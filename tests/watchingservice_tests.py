@@ -0,0 +1,161 @@
+import asyncio
+import ctypes
+import errno
+import logging
+
+import pytest
+
+from progtool.content.metadata import load_everything, load_metadata
+from progtool.content.tree import build_tree
+from progtool.judging.dependencies import DependencyTracker
+from progtool.judging.exerciseindex import ExerciseIndex
+from progtool.judging.filewatcher import InotifyWatcher, PollingWatcher, create_file_watcher
+from progtool.judging.watchingservice import WatchingService
+
+
+pytestmark = pytest.mark.usefixtures('default_settings')
+
+
+class RecordingJudgingService:
+    def __init__(self):
+        self.judged = []
+
+    def judge(self, exercise, priority):
+        self.judged.append(str(exercise.tree_path))
+
+
+def create_watcher(kind, root):
+    match kind:
+        case 'inotify':
+            if not InotifyWatcher.is_supported():
+                pytest.skip('inotify is not supported')
+            return InotifyWatcher(root)
+        case 'polling':
+            return PollingWatcher(root, interval=0.1)
+
+
+@pytest.fixture
+def root(course):
+    return build_tree(load_metadata(course, link_predicate=load_everything(force_all=True)))
+
+
+def test_affected_exercises(root, course):
+    index = ExerciseIndex(root)
+
+    def affected(path):
+        return sorted(str(exercise.tree_path) for exercise in index.find_affected_exercises(path))
+
+    assert affected(course / 'basics' / 'variables' / 'solution.py') == ['basics/variables']
+    assert affected(course / 'basics' / 'solution.py') == ['basics/loops']
+    assert affected(course / 'basics' / 'variables') == ['basics/loops', 'basics/variables']
+    assert affected(course / 'intro.md') == []
+
+
+def test_affected_exercises_include_dependents(root, course):
+    dependencies = DependencyTracker()
+    recursion = root.descend(('advanced', 'recursion'))
+    dependencies.record(recursion.judge.identity, [course / 'shared' / 'helper.py'])
+    index = ExerciseIndex(root, dependencies)
+
+    def affected(path):
+        return sorted(str(exercise.tree_path) for exercise in index.find_affected_exercises(path))
+
+    assert affected(course / 'shared' / 'helper.py') == ['advanced/recursion']
+    assert affected(course / 'shared') == ['advanced/recursion']
+    assert affected(course / 'basics' / 'solution.py') == ['basics/loops']
+
+
+@pytest.mark.parametrize('kind', ['inotify', 'polling'])
+def test_burst_of_changes_is_judged_once(root, course, kind):
+    judging_service = RecordingJudgingService()
+
+    async def edit():
+        service = WatchingService(root, judging_service, asyncio.get_running_loop(), watcher=create_watcher(kind, course), delay=0.5)
+        # Gives the watcher time to take its initial snapshot
+        await asyncio.sleep(0.3)
+        for index in range(5):
+            (course / 'basics' / 'variables' / 'solution.py').write_text(f'x = {index}\n')
+            (course / 'basics' / 'variables' / '__pycache__').mkdir(exist_ok=True)
+            (course / 'basics' / 'variables' / '__pycache__' / 'solution.pyc').write_text(f'{index}')
+            await asyncio.sleep(0.15)
+        await asyncio.sleep(1)
+        service.stop()
+        await asyncio.sleep(0)
+
+    asyncio.run(edit())
+
+    assert judging_service.judged == ['basics/variables']
+
+
+class WatchLimitedLibc:
+    """
+    C library that runs out of inotify watches after the given number.
+    """
+
+    def __init__(self, libc, limit):
+        self.libc = libc
+        self.limit = limit
+
+    def __getattr__(self, name):
+        return getattr(self.libc, name)
+
+    def inotify_add_watch(self, fd, path, mask):
+        if self.limit == 0:
+            ctypes.set_errno(errno.ENOSPC)
+            return -1
+        self.limit -= 1
+        return self.libc.inotify_add_watch(fd, path, mask)
+
+
+def watch_with_limit(course, monkeypatch, limit, edit):
+    if not InotifyWatcher.is_supported():
+        pytest.skip('inotify is not supported')
+    load_library = ctypes.CDLL
+    monkeypatch.setattr(ctypes, 'CDLL', lambda *args, **kwargs: WatchLimitedLibc(load_library(*args, **kwargs), limit))
+    changes = []
+
+    async def watch():
+        watcher = create_file_watcher(course)
+        watcher.start(changes.extend)
+        await edit()
+        watcher.stop()
+
+    asyncio.run(watch())
+    return changes
+
+
+def test_watcher_falls_back_to_polling_when_tree_exceeds_watch_limit(course, monkeypatch, caplog):
+    solution = course / 'basics' / 'variables' / 'solution.py'
+
+    async def edit():
+        # Gives the polling watcher time to take its initial snapshot
+        await asyncio.sleep(0.5)
+        solution.write_text('x = 2\n')
+        await asyncio.sleep(2)
+
+    with caplog.at_level(logging.INFO):
+        changes = watch_with_limit(course, monkeypatch, 0, edit)
+
+    assert 'Falling back to polling' in caplog.text
+    assert solution in changes
+
+
+def test_watcher_falls_back_to_polling_when_new_directory_exceeds_watch_limit(course, monkeypatch, caplog):
+    directory_count = sum(1 for path in course.rglob('*') if path.is_dir() and '__pycache__' not in path.parts) + 1
+    added = course / 'basics' / 'added'
+
+    async def edit():
+        await asyncio.sleep(0.1)
+        added.mkdir()
+        await asyncio.sleep(0.5)
+        (added / 'solution.py').write_text('x = 1\n')
+        await asyncio.sleep(2)
+
+    with caplog.at_level(logging.INFO):
+        changes = watch_with_limit(course, monkeypatch, directory_count, edit)
+
+    # Only after inotify started out watching the whole tree
+    assert 'Could not use inotify' not in caplog.text
+    assert 'Falling back to polling' in caplog.text
+    assert added in changes
+    assert added / 'solution.py' in changes